@@ -0,0 +1,209 @@
+"""
+Admin Analytics
+Cross-user activity, cohort and retention metrics for the Admin tab, from
+per-user summaries refreshed only for users saved since the last run.
+"""
+
+import datetime
+import json
+import os
+import threading
+import time
+from typing import Dict, Any, List, Optional
+
+from xp_timeline import parse_date
+
+ADMIN_ANALYTICS_FILE = "admin_analytics_cache.json"
+
+# Days of per-user activity kept for DAU/WAU (9 weeks covers 8 full weeks).
+RECENT_DAYS = 63
+RETENTION_DAYS = (1, 7, 30)
+DAU_DAYS = 30
+WAU_WEEKS = 8
+
+_cache: Dict[str, Any] = {}
+_cache_lock = threading.Lock()
+
+
+def load_analytics_cache() -> Dict[str, Any]:
+    """Load cached summaries and report."""
+    if not os.path.exists(ADMIN_ANALYTICS_FILE):
+        return {}
+    try:
+        with open(ADMIN_ANALYTICS_FILE, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Error loading admin analytics cache: {e}")
+        return {}
+
+
+def save_analytics_cache(cache: Dict[str, Any]) -> None:
+    """Save cached summaries and report."""
+    try:
+        with open(ADMIN_ANALYTICS_FILE, 'w') as f:
+            json.dump(cache, f)
+    except Exception as e:
+        print(f"Error saving admin analytics cache: {e}")
+
+
+def _active_days(data: Dict[str, Any]) -> List[datetime.date]:
+    days = set()
+    for date_str, done in (data.get("completions", {}) or {}).items():
+        d = parse_date(date_str)
+        if d is not None and done:
+            days.add(d)
+    for task in data.get("tasks", []) or []:
+        if task.get("status") == "Done" and task.get("completed_at"):
+            d = parse_date(task["completed_at"])
+            if d is not None:
+                days.add(d)
+    return sorted(days)
+
+
+def summarize_user(data: Dict[str, Any], today: datetime.date) -> Dict[str, Any]:
+    """Reduce one user's data to what the aggregate report needs.
+
+    `recent` is a bitmask of active days ending at `anchor` (bit i = anchor - i
+    days), `returned` lists the retention days N the user was active on
+    first + N.
+    """
+    days = _active_days(data)
+    anchor = today.toordinal()
+    recent = 0
+    for d in days:
+        age = anchor - d.toordinal()
+        if 0 <= age < RECENT_DAYS:
+            recent |= 1 << age
+    first = days[0] if days else None
+    returned = []
+    if first is not None:
+        day_set = set(days)
+        returned = [n for n in RETENTION_DAYS if first + datetime.timedelta(days=n) in day_set]
+    return {
+        "first": first.isoformat() if first else None,
+        "anchor": anchor,
+        "recent": recent,
+        "returned": returned,
+    }
+
+
+def _recent_mask(summary: Dict[str, Any], today: datetime.date) -> int:
+    """The summary's activity mask re-based to `today`."""
+    shift = today.toordinal() - summary.get("anchor", today.toordinal())
+    if shift < 0:
+        return 0
+    return (summary.get("recent", 0) >> shift) if shift else summary.get("recent", 0)
+
+
+def build_report(summaries: Dict[str, Dict[str, Any]], drip_history: Dict[str, Dict], today: datetime.date) -> Dict[str, Any]:
+    """Aggregate per-user summaries into the Admin analytics report."""
+    dau = [0] * DAU_DAYS
+    wau = [0] * WAU_WEEKS
+    # Weeks are Monday-based, like the Signals tab
+    this_monday_age = today.weekday()
+    cohorts: Dict[str, Dict[str, int]] = {}
+    retention = {n: {"eligible": 0, "returned": 0} for n in RETENTION_DAYS}
+    ever_active = 0
+
+    for summary in summaries.values():
+        mask = _recent_mask(summary, today)
+        for age in range(DAU_DAYS):
+            if mask >> age & 1:
+                dau[age] += 1
+        for week in range(WAU_WEEKS):
+            lo = this_monday_age + 7 * (week - 1) + 1 if week else 0
+            hi = this_monday_age + 7 * week
+            if mask >> lo & ((1 << (hi - lo + 1)) - 1):
+                wau[week] += 1
+
+        first = parse_date(summary.get("first"))
+        if first is None:
+            continue
+        ever_active += 1
+        cohort_week = (first - datetime.timedelta(days=first.weekday())).isoformat()
+        cohort = cohorts.setdefault(cohort_week, {"size": 0, **{f"d{n}": 0 for n in RETENTION_DAYS}, **{f"d{n}_eligible": 0 for n in RETENTION_DAYS}})
+        cohort["size"] += 1
+        for n in RETENTION_DAYS:
+            if first + datetime.timedelta(days=n) <= today:
+                retention[n]["eligible"] += 1
+                cohort[f"d{n}_eligible"] += 1
+                if n in summary.get("returned", []):
+                    retention[n]["returned"] += 1
+                    cohort[f"d{n}"] += 1
+
+    def _rate(hit: int, eligible: int) -> Optional[float]:
+        return round(hit / eligible, 3) if eligible else None
+
+    cohort_rows = []
+    for week in sorted(cohorts):
+        c = cohorts[week]
+        row = {"week": week, "size": c["size"]}
+        for n in RETENTION_DAYS:
+            row[f"d{n}"] = _rate(c[f"d{n}"], c[f"d{n}_eligible"])
+        cohort_rows.append(row)
+
+    from drip_campaigns import DRIP_SCHEDULE
+    funnel = []
+    for days, email_type in DRIP_SCHEDULE:
+        reached = sum(1 for user_id in summaries if (drip_history.get(user_id) or {}).get(email_type))
+        funnel.append({"stage": email_type, "day": days, "users": reached})
+
+    return {
+        "computed_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "as_of": today.isoformat(),
+        "total_users": len(summaries),
+        "ever_active": ever_active,
+        "dau": [{"date": (today - datetime.timedelta(days=age)).isoformat(), "users": dau[age]} for age in reversed(range(DAU_DAYS))],
+        "wau": [
+            {"week": (today - datetime.timedelta(days=this_monday_age + 7 * week)).isoformat(), "users": wau[week]}
+            for week in reversed(range(WAU_WEEKS))
+        ],
+        "retention": {f"d{n}": _rate(r["returned"], r["eligible"]) for n, r in retention.items()},
+        "cohorts": cohort_rows,
+        "drip_funnel": funnel,
+    }
+
+
+def refresh_admin_analytics(storage=None, today: Optional[datetime.date] = None) -> Dict[str, Any]:
+    """Re-summarize the users saved since the last refresh and rebuild the report.
+
+    Only changed and new users are loaded; everyone else keeps their cached
+    summary, and users no longer listed are dropped. Returns the new report.
+    """
+    from storage import get_storage
+    from drip_campaigns import load_drip_history
+
+    storage = storage or get_storage()
+    today = today or datetime.date.today()
+    started_at = time.time()
+    cache = load_analytics_cache()
+    previous = cache.get("summaries", {})
+    since = cache.get("since")
+    user_ids = storage.list_users()
+    changed = set(storage.list_users_modified_since(since)) if since is not None else set(user_ids)
+    stale = [u for u in user_ids if u in changed or u not in previous]
+    summaries: Dict[str, Dict[str, Any]] = {u: previous[u] for u in user_ids if u in previous and u not in changed}
+    for user_id, data in storage.iter_user_data(stale):
+        summaries[user_id] = summarize_user(data, today)
+
+    report = build_report(summaries, load_drip_history(), today)
+    report["recomputed_users"] = len(stale)
+    save_analytics_cache({"since": started_at, "summaries": summaries, "report": report})
+    with _cache_lock:
+        _cache["report"] = report
+    return report
+
+
+def get_admin_analytics(storage=None, refresh: bool = False) -> Dict[str, Any]:
+    """Cached report for the Admin tab; computed on first use or when `refresh` is set."""
+    if not refresh:
+        with _cache_lock:
+            report = _cache.get("report")
+        if report is None:
+            report = load_analytics_cache().get("report")
+            if report is not None:
+                with _cache_lock:
+                    _cache["report"] = report
+        if report is not None:
+            return report
+    return refresh_admin_analytics(storage)
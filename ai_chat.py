@@ -18,6 +18,14 @@ def get_ai_response(user_message: str, context: Dict[str, Any]) -> str:
     # Construct context string
     profile = context.get('profile', {})
     stats = context.get('stats', {})
+    consistency = context.get('consistency', {})
+
+    # Rolling completion rates per active habit, e.g. "Read: 86% / 70% / 64%"
+    consistency_lines = []
+    for habit, details in context.get('habits', {}).items():
+        if details.get('active', True) and habit in consistency:
+            rates = " / ".join(f"{round(w['completion_rate'] * 100)}%" for _, w in sorted(consistency[habit].items()))
+            consistency_lines.append(f"    - {habit}: {rates}")
 
     context_str = f"""
     User Profile:
@@ -29,6 +37,9 @@ def get_ai_response(user_message: str, context: Dict[str, Any]) -> str:
     - Level: {stats.get('level', 1)}
     - Total XP: {stats.get('total_xp', 0)}
     - Active Habits: {len(context.get('habits', {}))}
+
+    Consistency (completion rate, last 7 / 30 / 90 days):
+{chr(10).join(consistency_lines) if consistency_lines else '    - No data yet'}
     """
 
     prompt = f"""
@@ -0,0 +1,214 @@
+"""
+Signals Analytics
+Long-format analytics frame and memoized weekly report for the Signals tab.
+"""
+
+import datetime
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+import pandas as pd
+
+try:
+    import plotly.express as px
+except Exception:
+    px = None
+
+from xp_timeline import get_xp_timeline, data_revision, parse_date, rolling_habit_metrics, ROLLING_WINDOWS
+
+EVENT_KINDS = ["habit", "task", "bonus"]
+FRAME_COLUMNS = ["date", "habit", "goal", "xp", "kind"]
+
+_FRAME_CACHE_SIZE = 16
+_REPORT_CACHE_SIZE = 32
+_frame_cache: "OrderedDict[tuple, pd.DataFrame]" = OrderedDict()
+_report_cache: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _cache_get(cache: OrderedDict, key: tuple):
+    with _cache_lock:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+
+def _cache_put(cache: OrderedDict, key: tuple, value: Any, size: int) -> None:
+    with _cache_lock:
+        cache[key] = value
+        if len(cache) > size:
+            cache.popitem(last=False)
+
+
+def build_analytics_frame(data: Dict[str, Any], today: Optional[datetime.date] = None) -> pd.DataFrame:
+    """One row per XP event: habit completions, dated Done tasks and perfect-day bonuses.
+
+    Habit and bonus XP come from the user's XP timeline, so the frame agrees
+    with calculate_stats (streak bonus included).
+    """
+    today = today or datetime.date.today()
+    timeline = get_xp_timeline(data, today)
+    start, end = timeline.start, timeline.end
+    dates = pd.date_range(start, periods=timeline.days, freq="D")
+
+    parts: List[pd.DataFrame] = []
+    for habit, details in (data.get("habits", {}) or {}).items():
+        done = pd.Series(timeline.daily_window("completions", start, end, habit=habit), index=dates)
+        if not done.any():
+            continue
+        xp = pd.Series(timeline.daily_window("habit", start, end, habit=habit), index=dates)
+        hit = done > 0
+        parts.append(pd.DataFrame({
+            "date": dates[hit.to_numpy()],
+            "habit": habit,
+            "goal": details.get("goal", "General"),
+            "xp": xp[hit].to_numpy(),
+            "kind": "habit",
+        }))
+
+    bonus = pd.Series(timeline.daily_window("bonus", start, end), index=dates)
+    if bonus.any():
+        hit = bonus > 0
+        parts.append(pd.DataFrame({
+            "date": dates[hit.to_numpy()],
+            "habit": None,
+            "goal": None,
+            "xp": bonus[hit].to_numpy(),
+            "kind": "bonus",
+        }))
+
+    task_rows = []
+    for task in data.get("tasks", []) or []:
+        if task.get("status") != "Done" or not task.get("completed_at"):
+            continue
+        completed_on = parse_date(task.get("completed_at"))
+        if completed_on is not None:
+            task_rows.append({
+                "date": pd.Timestamp(completed_on),
+                "habit": None,
+                "goal": task.get("goal", "General"),
+                "xp": task.get("xp", 0),
+                "kind": "task",
+            })
+    if task_rows:
+        parts.append(pd.DataFrame(task_rows))
+
+    frame = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=FRAME_COLUMNS)
+    frame["date"] = pd.to_datetime(frame["date"])
+    frame["habit"] = frame["habit"].astype("category")
+    frame["goal"] = frame["goal"].astype("category")
+    frame["xp"] = frame["xp"].astype("int64")
+    frame["kind"] = pd.Categorical(frame["kind"], categories=EVENT_KINDS)
+    return frame.sort_values("date", kind="stable").reset_index(drop=True)
+
+
+def get_analytics_frame(data: Dict[str, Any], today: Optional[datetime.date] = None) -> pd.DataFrame:
+    """Cached analytics frame for `data`, rebuilt only when its content changed."""
+    today = today or datetime.date.today()
+    key = (data_revision(data), today.isoformat())
+    frame = _cache_get(_frame_cache, key)
+    if frame is None:
+        frame = build_analytics_frame(data, today)
+        _cache_put(_frame_cache, key, frame, _FRAME_CACHE_SIZE)
+    return frame
+
+
+def _window(frame: pd.DataFrame, start: datetime.date, end: datetime.date) -> pd.DataFrame:
+    return frame[(frame["date"] >= pd.Timestamp(start)) & (frame["date"] <= pd.Timestamp(end))]
+
+
+def daily_summary(frame: pd.DataFrame, start: datetime.date, end: datetime.date) -> pd.DataFrame:
+    """XP and habit completions per day in [start, end] (every day present)."""
+    days = pd.date_range(start, end, freq="D")
+    window = _window(frame, start, end)
+    xp = window.groupby("date")["xp"].sum().reindex(days, fill_value=0)
+    done = window[window["kind"] == "habit"].groupby("date").size().reindex(days, fill_value=0)
+    return pd.DataFrame({
+        "Date": days.strftime("%Y-%m-%d"),
+        "Day": days.strftime("%a"),
+        "XP": xp.to_numpy(),
+        "Habits Completed": done.to_numpy(),
+    })
+
+
+def habit_completions(frame: pd.DataFrame, start: datetime.date, end: datetime.date, habits: List[str]) -> pd.DataFrame:
+    """Completions per habit in [start, end], in the order of `habits`."""
+    window = _window(frame, start, end)
+    counts = window[window["kind"] == "habit"].groupby("habit", observed=True).size()
+    counts = counts.reindex(habits, fill_value=0)
+    return pd.DataFrame({"Habit": habits, "Completions": counts.to_numpy()})
+
+
+def get_weekly_report(
+    data: Dict[str, Any],
+    week_offset: int,
+    start: datetime.date,
+    end: datetime.date,
+    today: Optional[datetime.date] = None,
+) -> Dict[str, Any]:
+    """Tables and figures for one Signals week, memoized per (revision, week_offset).
+
+    Returns {"daily", "total_xp", "habits", "fig_daily", "fig_habits"}; figures
+    are None when Plotly is unavailable (or there are no active habits).
+    """
+    today = today or datetime.date.today()
+    key = (data_revision(data), week_offset, today.isoformat())
+    report = _cache_get(_report_cache, key)
+    if report is not None:
+        return report
+
+    frame = get_analytics_frame(data, today)
+    daily = daily_summary(frame, start, end)
+    active_habits = [h for h, d in data.get("habits", {}).items() if d.get("active", True)]
+    habits = habit_completions(frame, start, end, active_habits)
+
+    fig_daily = fig_habits = None
+    if px is not None:
+        chart = daily.assign(Day=daily["Day"] + " " + daily["Date"].str[-2:])
+        fig_daily = px.bar(
+            chart,
+            x="Day",
+            y="XP",
+            title="Daily XP Earned",
+            color="XP",
+            color_continuous_scale="Viridis"
+        )
+        fig_daily.update_layout(height=400, showlegend=False)
+        if active_habits:
+            fig_habits = px.bar(
+                habits,
+                x="Habit",
+                y="Completions",
+                title="Habit Completion Rate (This Week)",
+                color="Completions",
+                color_continuous_scale="RdYlGn"
+            )
+            fig_habits.update_layout(height=400, showlegend=False)
+
+    report = {
+        "daily": daily,
+        "total_xp": int(daily["XP"].sum()),
+        "habits": habits,
+        "fig_daily": fig_daily,
+        "fig_habits": fig_habits,
+    }
+    _cache_put(_report_cache, key, report, _REPORT_CACHE_SIZE)
+    return report
+
+
+def consistency_table(data: Dict[str, Any], today: Optional[datetime.date] = None) -> pd.DataFrame:
+    """Rolling 7/30/90-day completion rate (%) and XP per active habit."""
+    metrics = rolling_habit_metrics(data, today)
+    rows = []
+    for habit, details in data.get("habits", {}).items():
+        if not details.get("active", True) or habit not in metrics:
+            continue
+        row = {"Habit": habit}
+        for n in ROLLING_WINDOWS:
+            row[f"{n}d Rate"] = round(metrics[habit][n]["completion_rate"] * 100)
+        for n in ROLLING_WINDOWS:
+            row[f"{n}d XP"] = metrics[habit][n]["xp"]
+        rows.append(row)
+    return pd.DataFrame(rows)
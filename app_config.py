@@ -0,0 +1,93 @@
+"""
+App Config
+Secrets and error reporting: Streamlit inside the app, `.streamlit/secrets.toml`
+and logging in a headless worker.
+"""
+
+import logging
+import os
+import sys
+import threading
+from typing import Any, Dict, Optional
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    tomllib = None
+
+logger = logging.getLogger(__name__)
+
+# Same lookup order as Streamlit: the user-wide file, overridden by the project file
+SECRETS_FILES = [os.path.join(os.path.expanduser("~"), ".streamlit", "secrets.toml"), os.path.join(".streamlit", "secrets.toml")]
+
+_file_secrets: Optional[Dict[str, Any]] = None
+_file_secrets_lock = threading.Lock()
+
+
+def _streamlit():
+    """The streamlit module if this process is the Streamlit app, else None."""
+    return sys.modules.get("streamlit")
+
+
+def _load_secret_files() -> Dict[str, Any]:
+    global _file_secrets
+    with _file_secrets_lock:
+        if _file_secrets is None:
+            secrets: Dict[str, Any] = {}
+            for path in SECRETS_FILES:
+                if tomllib is None or not os.path.exists(path):
+                    continue
+                try:
+                    with open(path, "rb") as f:
+                        secrets.update(tomllib.load(f))
+                except (OSError, tomllib.TOMLDecodeError) as e:
+                    logger.warning(f"Could not read secrets file {path}: {e}")
+            _file_secrets = secrets
+        return _file_secrets
+
+
+def get_secret(key: str, default: Any = None) -> Any:
+    """Return a top-level secret (a value or a section), or `default` if unset."""
+    st = _streamlit()
+    if st is not None:
+        # st.secrets raises when no secrets file exists at all
+        try:
+            value = st.secrets.get(key)
+        except Exception:
+            value = None
+        return default if value is None else value
+    value = _load_secret_files().get(key)
+    return default if value is None else value
+
+
+def get_setting(key: str, default: Any = None) -> Any:
+    """A setting from the environment (`key` upper-cased) if set, else from the secrets."""
+    value = os.environ.get(key.upper())
+    return value if value else get_secret(key, default)
+
+
+def get_secret_section(name: str) -> Dict[str, Any]:
+    """Return a secrets section (e.g. "smtp", "firebase") as a plain dict, {} if absent."""
+    section = get_secret(name)
+    try:
+        return dict(section) if section else {}
+    except (TypeError, ValueError):
+        return {}
+
+
+def report_error(message: str) -> None:
+    """Show an error in the app, or log it when running headless."""
+    st = _streamlit()
+    if st is not None:
+        st.error(message)
+    else:
+        logger.error(message)
+
+
+def report_warning(message: str) -> None:
+    """Show a warning in the app, or log it when running headless."""
+    st = _streamlit()
+    if st is not None:
+        st.warning(message)
+    else:
+        logger.warning(message)
@@ -0,0 +1,128 @@
+"""
+Badge Engine
+Declarative badge rules, re-checked only when the metric they watch moves.
+"""
+
+import datetime
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Callable
+
+logger = logging.getLogger(__name__)
+
+BADGES_DEF = {
+    "week_streak": {"name": "🔥 On Fire", "desc": "7 Day Streak on any habit", "icon": "🔥", "metric": "max_streak", "threshold": 7},
+    "month_streak": {"name": "⚡ Unstoppable", "desc": "30 Day Streak on any habit", "icon": "⚡", "metric": "max_streak", "threshold": 30},
+    "habit_master": {"name": "🧘 Grandmaster", "desc": "Reach Level 3 on a habit", "icon": "🧘", "metric": "max_habit_level", "threshold": 3},
+    "perfect_week": {"name": "🌟 Perfectionist", "desc": "7 Perfect Days", "icon": "🌟", "metric": "perfect_days", "threshold": 7},
+    "task_force": {"name": "📋 Task Force", "desc": "Complete 10 Missions", "icon": "📋", "metric": "tasks_done", "threshold": 10},
+    "veteran": {"name": "⚔️ Veteran", "desc": "Reach Level 10 Profile", "icon": "⚔️", "metric": "profile_level", "threshold": 10},
+}
+
+# Last metric value each rule was evaluated against, keyed by badge id.
+BADGE_STATE_KEY = "badge_state"
+
+
+def badge_metrics(
+    habit_stats: Dict[str, Dict[str, Any]],
+    perfect_days: int,
+    tasks_done: int,
+    profile_level: int,
+) -> Dict[str, int]:
+    """Aggregate inputs the badge rules are written against."""
+    return {
+        "max_streak": max((s.get("streak", 0) for s in habit_stats.values()), default=0),
+        "max_habit_level": max((s.get("level", 1) for s in habit_stats.values()), default=0),
+        "perfect_days": perfect_days,
+        "tasks_done": tasks_done,
+        "profile_level": profile_level,
+    }
+
+
+def rule_met(badge_id: str, metrics: Dict[str, int]) -> bool:
+    rule = BADGES_DEF[badge_id]
+    return metrics.get(rule["metric"], 0) >= rule["threshold"]
+
+
+def qualifying_badges(metrics: Dict[str, int]) -> List[str]:
+    """Badges whose rule holds for `metrics` right now (no persistence)."""
+    return [badge_id for badge_id, rule in BADGES_DEF.items() if rule["metric"] in metrics and rule_met(badge_id, metrics)]
+
+
+def get_earned_badges(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Persisted badges as [{"id", "earned_at"}], oldest first.
+
+    Older data stored bare badge ids; those read back with no timestamp.
+    """
+    earned = []
+    for entry in data.get("badges", []) or []:
+        if isinstance(entry, str):
+            entry = {"id": entry, "earned_at": None}
+        if isinstance(entry, dict) and entry.get("id") in BADGES_DEF:
+            earned.append(entry)
+    return earned
+
+
+def earned_badge_ids(data: Dict[str, Any]) -> List[str]:
+    return [entry["id"] for entry in get_earned_badges(data)]
+
+
+def evaluate_badges(data: Dict[str, Any], metrics: Dict[str, int], now: Optional[datetime.datetime] = None) -> List[str]:
+    """Award badges whose inputs changed and now satisfy their rule.
+
+    Mutates `data` (badges and badge_state) and returns the newly earned
+    badge ids; the caller saves the data and emits the events. The first
+    evaluation for a user backfills what they already qualify for without
+    reporting it as new, so existing users are not flooded with emails.
+    """
+    now = now or datetime.datetime.now()
+    backfill = BADGE_STATE_KEY not in data
+    state = data.setdefault(BADGE_STATE_KEY, {})
+    earned = get_earned_badges(data)
+    earned_ids = {entry["id"] for entry in earned}
+
+    new_badges = []
+    for badge_id, rule in BADGES_DEF.items():
+        if badge_id in earned_ids or rule["metric"] not in metrics:
+            continue
+        value = metrics[rule["metric"]]
+        if state.get(badge_id) == value:
+            continue
+        state[badge_id] = value
+        if rule_met(badge_id, metrics):
+            earned.append({"id": badge_id, "earned_at": now.isoformat(timespec="seconds")})
+            earned_ids.add(badge_id)
+            new_badges.append(badge_id)
+
+    data["badges"] = earned
+    return [] if backfill else new_badges
+
+
+def emit_badge_events(user_id: str, badge_ids: List[str], notify: Optional[Callable[[str, str, str], Any]] = None) -> None:
+    """Send one badge-earned notification per new badge."""
+    if notify is None:
+        from notifications import notify_badge_earned as notify
+    for badge_id in badge_ids:
+        badge = BADGES_DEF[badge_id]
+        notify(user_id, badge["name"], badge["desc"])
+
+
+def _emit_best_effort(user_id: str, badge_ids: List[str]) -> None:
+    try:
+        emit_badge_events(user_id, badge_ids)
+    except Exception as e:
+        # Notifications are best-effort
+        logger.warning(f"Could not send badge notifications to {user_id}: {e}")
+
+
+def queue_badge_events(user_id: str, badge_ids: List[str]) -> None:
+    """Send badge notifications off the render path: on the app scheduler, else a background thread."""
+    badge_ids = list(badge_ids)
+    try:
+        import scheduler_service
+        job_id = f"badge_events_{user_id}_{'_'.join(badge_ids)}"
+        if scheduler_service.run_job_now(_emit_best_effort, job_id, args=[user_id, badge_ids]):
+            return
+    except Exception as e:
+        logger.warning(f"Could not queue badge notifications on scheduler: {e}")
+    threading.Thread(target=_emit_best_effort, args=(user_id, badge_ids), daemon=True).start()
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+benchmarks.py
+
+Standalone benchmark runner for the stats, leaderboard, mission and export
+hot paths, over small / medium / huge synthetic histories.
+
+Each benchmark runs in a scratch directory against LocalStorage, with data
+from synthetic_data.py pinned to a fixed seed and date, so numbers are
+comparable between runs on the same machine. Results are printed as a table
+and written as JSON; with --baseline, medians are compared against a stored
+run and the exit code is 1 if anything regressed past --threshold.
+
+Examples:
+
+# Record a baseline before a change
+python benchmarks.py --sizes small,medium --output bench_baseline.json
+
+# After the change: compare and fail on >25% regressions
+python benchmarks.py --sizes small,medium --baseline bench_baseline.json --threshold 0.25
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+from typing import Dict, Any, List, Callable, Optional, Tuple
+
+# Pinned so the synthetic histories are identical on every run
+BENCH_TODAY = datetime.date(2025, 12, 31)
+BENCH_SEED = 1234
+
+# Per-user history shape and leaderboard population for each size
+SIZES = {
+    "small": {"years": 0.25, "habits": 3, "tasks": 20, "journal_entries": 5, "users": 10},
+    "medium": {"years": 2, "habits": 8, "tasks": 300, "journal_entries": 50, "users": 50},
+    "huge": {"years": 10, "habits": 20, "tasks": 3000, "journal_entries": 500, "users": 200},
+}
+
+
+def _clear_caches() -> None:
+    """Drop in-process caches so "cold" benchmarks measure a full computation."""
+    import xp_timeline
+    import leaderboard
+
+    with xp_timeline._timeline_cache_lock:
+        xp_timeline._timeline_cache.clear()
+    leaderboard.invalidate_standings()
+
+
+def _missions_csv(tasks: List[Dict[str, Any]]) -> str:
+    import csv
+    import io
+
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=["due_date", "title", "description", "goal", "priority", "xp", "context", "cadence", "tags"])
+    writer.writeheader()
+    for t in tasks:
+        writer.writerow({
+            "due_date": t.get("due_date") or "",
+            "title": t["title"],
+            "description": t.get("description", ""),
+            "goal": t.get("goal", "General"),
+            "priority": t.get("priority", "Medium"),
+            "xp": t.get("xp", 10),
+            "context": t.get("context", "General"),
+            "cadence": t.get("cadence", "One-Off"),
+            "tags": ",".join(t.get("tags", [])),
+        })
+    return out.getvalue()
+
+
+def build_benchmarks(size: str) -> List[Tuple[str, Callable[[], Any]]]:
+    """Prepare data for `size` in the current directory and return (name, fn) pairs.
+
+    Every date-dependent call is pinned to BENCH_TODAY, so replay spans and
+    "last week" match the synthetic data however long after it the run is.
+    """
+    import leaderboard
+    import tracker
+    import scheduler_service
+    from storage import LocalStorage
+    from synthetic_data import iter_synthetic_users, write_synthetic_users
+
+    shape = dict(SIZES[size])
+    users = shape.pop("users")
+    storage = LocalStorage()
+    write_synthetic_users(storage, users, seed=BENCH_SEED, today=BENCH_TODAY, **shape)
+    user_id, data = next(iter_synthetic_users(1, seed=BENCH_SEED, today=BENCH_TODAY, **shape))
+    csv_text = _missions_csv(data["tasks"])
+
+    def _leaderboard():
+        # No read timeout: a cold run must time the full scoring, never the partial/stale fallback
+        return leaderboard.get_leaderboard("all_time", storage, tracker.get_existing_users(), today=BENCH_TODAY, timeout=None)
+
+    def _leaderboard_cold():
+        if os.path.exists("leaderboard_index.json"):
+            os.remove("leaderboard_index.json")
+        _clear_caches()
+        return _leaderboard()
+
+    def _weekly_stats_cold():
+        _clear_caches()
+        return tracker.get_weekly_stats(data, -1, today=BENCH_TODAY)
+
+    return [
+        ("calculate_stats", lambda: tracker.calculate_stats(data, today=BENCH_TODAY)),
+        ("compute_stats", lambda: scheduler_service.compute_stats(data, today=BENCH_TODAY)),
+        ("get_weekly_stats.cold", _weekly_stats_cold),
+        ("get_weekly_stats.warm", lambda: tracker.get_weekly_stats(data, -1, today=BENCH_TODAY)),
+        ("get_leaderboard_stats.cold", _leaderboard_cold),
+        ("get_leaderboard_stats.warm", _leaderboard),
+        ("bucket_tasks_by_due_and_goal", lambda: tracker.bucket_tasks_by_due_and_goal(data["tasks"])),
+        ("parse_csv_missions", lambda: tracker.parse_csv_missions(csv_text)),
+        ("export_data_to_csv", lambda: tracker.export_data_to_csv(data)),
+        ("LocalStorage.load_data", lambda: storage.load_data(user_id)),
+        ("LocalStorage.save_data", lambda: storage.save_data(user_id, data)),
+    ]
+
+
+def time_benchmark(fn: Callable[[], Any], repeat: int, min_time: float) -> Dict[str, Any]:
+    """Time `fn` like timeit: calibrate loops per sample, then take `repeat` samples (seconds per call)."""
+    timer = timeit.Timer(fn)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time or number >= 10 ** 6:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+    samples = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "loops": number,
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.fmean(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+    }
+
+
+def run(sizes: List[str], repeat: int = 5, min_time: float = 0.05, only: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Run every benchmark for each size; returns the JSON-ready result document."""
+    results = []
+    start_dir = os.getcwd()
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    if repo_dir not in sys.path:
+        sys.path.insert(0, repo_dir)
+    for size in sizes:
+        workdir = tempfile.mkdtemp(prefix=f"xp_bench_{size}_")
+        try:
+            os.chdir(workdir)
+            for name, fn in build_benchmarks(size):
+                if only and not any(o in name for o in only):
+                    continue
+                stats = time_benchmark(fn, repeat, min_time)
+                results.append({"name": name, "size": size, **stats})
+                print(f"{size:<7} {name:<32} median {stats['median'] * 1000:10.3f} ms  (min {stats['min'] * 1000:.3f} ms, {stats['loops']} loops)", flush=True)
+        finally:
+            os.chdir(start_dir)
+            shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "meta": {
+            "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "seed": BENCH_SEED,
+            "today": BENCH_TODAY.isoformat(),
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """Median ratio current/baseline per benchmark present in both runs."""
+    base = {(r["name"], r["size"]): r for r in baseline.get("results", [])}
+    rows = []
+    for r in current.get("results", []):
+        b = base.get((r["name"], r["size"]))
+        if not b or not b.get("median"):
+            continue
+        ratio = r["median"] / b["median"]
+        rows.append({
+            "name": r["name"],
+            "size": r["size"],
+            "baseline_median": b["median"],
+            "median": r["median"],
+            "ratio": round(ratio, 3),
+            "regressed": ratio > 1 + threshold,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark XP Tracker hot paths")
+    parser.add_argument('--sizes', default='small,medium', help=f"Comma-separated sizes ({', '.join(SIZES)})")
+    parser.add_argument('--repeat', type=int, default=5, help='Samples per benchmark')
+    parser.add_argument('--min-time', type=float, default=0.05, help='Minimum seconds per sample (loops are calibrated)')
+    parser.add_argument('--only', default=None, help='Comma-separated substrings; run only matching benchmarks')
+    parser.add_argument('--output', default='bench_results.json', help='Write results JSON here')
+    parser.add_argument('--baseline', default=None, help='Compare against this results JSON')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed slowdown vs. baseline (0.25 = 25%%)')
+    args = parser.parse_args()
+
+    sizes = [s.strip() for s in args.sizes.split(',') if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        parser.error(f"Unknown size(s): {', '.join(unknown)}")
+    only = [o.strip() for o in args.only.split(',')] if args.only else None
+
+    started = time.perf_counter()
+    current = run(sizes, repeat=args.repeat, min_time=args.min_time, only=only)
+    current["meta"]["elapsed_seconds"] = round(time.perf_counter() - started, 1)
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        comparison = compare(current, baseline, args.threshold)
+        current["comparison"] = {"baseline": args.baseline, "threshold": args.threshold, "rows": comparison}
+        print(f"\nvs. {args.baseline} (threshold +{args.threshold:.0%}):")
+        for row in comparison:
+            flag = "REGRESSED" if row["regressed"] else "ok"
+            print(f"{row['size']:<7} {row['name']:<32} x{row['ratio']:<6} {flag}")
+        if any(row["regressed"] for row in comparison):
+            exit_code = 1
+
+    with open(args.output, 'w') as f:
+        json.dump(current, f, indent=2)
+    print(f"\nResults written to {args.output}")
+    sys.exit(exit_code)
+
+
+if __name__ == '__main__':
+    main()
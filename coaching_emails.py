@@ -5,7 +5,8 @@ Generates personalized, encouraging coaching emails using Gemini.
 
 import os
 import json
-import streamlit as st
+from app_config import get_secret
+import job_metrics
 from typing import Optional, Tuple
 from datetime import datetime
 
@@ -25,19 +26,14 @@ def get_gemini_status() -> Tuple[bool, str, Optional[str]]:
     api_key = None
     source = None
 
-    # Try st.secrets first - Wrap in try/except to prevent StreamlitSecretNotFoundError
-    try:
-        if hasattr(st, 'secrets'):
-            if st.secrets.get('gemini_api_key'):
-                api_key = st.secrets.get('gemini_api_key')
-                source = "st.secrets['gemini_api_key']"
-            elif st.secrets.get('gemini api key'):
-                # Support older/typo key naming
-                api_key = st.secrets.get('gemini api key')
-                source = "st.secrets['gemini api key']"
-    except Exception:
-        # Secrets file might not exist, ignore and fall back to env
-        pass
+    # Try secrets first (st.secrets in the app, .streamlit/secrets.toml when headless)
+    if get_secret('gemini_api_key'):
+        api_key = get_secret('gemini_api_key')
+        source = "secrets['gemini_api_key']"
+    elif get_secret('gemini api key'):
+        # Support older/typo key naming
+        api_key = get_secret('gemini api key')
+        source = "secrets['gemini api key']"
 
     # Fall back to environment variable
     if not api_key:
@@ -47,7 +43,7 @@ def get_gemini_status() -> Tuple[bool, str, Optional[str]]:
             source = "env GEMINI_API_KEY"
 
     if not api_key:
-        return False, "No Gemini key found (expected st.secrets['gemini_api_key'] or env GEMINI_API_KEY)", None
+        return False, "No Gemini key found (expected secrets['gemini_api_key'] or env GEMINI_API_KEY)", None
 
     return True, f"Gemini key loaded from {source}", api_key
 
@@ -103,6 +99,7 @@ Example bad: "Great job! Keep it up!" (too generic)
 Write exactly 2 sentences. No "Hi {user_id}" or signature needed."""
     
     try:
+        job_metrics.count('gemini_calls')
         response = client.generate_content(prompt)
         return response.text.strip()
     except Exception as e:
@@ -146,6 +143,7 @@ Example bad: "Don't worry, it happens! Try again tomorrow."
 Write exactly 2 sentences. No "Hi" or signature needed."""
     
     try:
+        job_metrics.count('gemini_calls')
         response = client.generate_content(prompt)
         return response.text.strip()
     except Exception as e:
@@ -192,6 +190,7 @@ Example bad: "Great job this week! Keep it up!"
 Write exactly 3 sentences. No "Hi" or signature needed."""
     
     try:
+        job_metrics.count('gemini_calls')
         response = client.generate_content(prompt)
         return response.text.strip()
     except Exception as e:
@@ -234,6 +233,7 @@ Example bad: "Keep up the great work!"
 Write exactly 3 sentences. No "Hi" or signature needed."""
     
     try:
+        job_metrics.count('gemini_calls')
         response = client.generate_content(prompt)
         return response.text.strip()
     except Exception as e:
@@ -250,7 +250,7 @@ def test_gemini_connection() -> bool:
     
     client = get_gemini_client()
     if not client:
-        print("Gemini test failed: missing API key in st.secrets['gemini_api_key'] or env GEMINI_API_KEY")
+        print("Gemini test failed: missing API key in secrets['gemini_api_key'] or env GEMINI_API_KEY")
         return False
     
     try:
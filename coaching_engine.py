@@ -9,7 +9,8 @@ import os
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 from storage import get_storage
-from onboarding import get_coaching_profile, calculate_days_since_signup
+from coaching_profile import get_coaching_profile, calculate_days_since_signup
+from xp_timeline import rolling_habit_metrics
 
 
 COACHING_INSIGHTS_FILE = "coaching_insights.json"
@@ -79,6 +80,8 @@ def analyze_user_patterns(user_id: str) -> Dict[str, Any]:
         # === PATTERN 2: CONSISTENCY ANALYSIS ===
         consistency_patterns = _analyze_consistency(habits, completions)
         insights["patterns"]["consistency"] = consistency_patterns
+        # Rolling 7/30/90-day completion rates and XP per habit
+        insights["patterns"]["rolling_consistency"] = rolling_habit_metrics(data)
         
         # === PATTERN 3: HABIT STREAKS ===
         streak_patterns = _analyze_streaks(habits, completions)
@@ -0,0 +1,43 @@
+"""
+Coaching Profile
+Read-only helpers for a user's coaching profile (set during onboarding).
+"""
+
+from typing import Dict, Any
+from storage import get_storage
+
+
+def get_coaching_profile(user_id: str) -> Dict[str, Any]:
+    """Retrieve user's coaching profile."""
+    try:
+        storage = get_storage()
+        data = storage.load_data(user_id)
+        return data.get('coaching_profile', {})
+    except Exception as e:
+        print(f"Error loading coaching profile: {e}")
+        return {}
+
+
+def has_completed_onboarding(user_id: str) -> bool:
+    """Check if user has completed onboarding."""
+    profile = get_coaching_profile(user_id)
+    return profile.get('onboarding_complete', False)
+
+
+def calculate_days_since_signup(user_id: str) -> int:
+    """Calculate days since user first created an account or first tracked."""
+    try:
+        import datetime
+        storage = get_storage()
+        data = storage.load_data(user_id)
+        completions = data.get('completions', {})
+        
+        if not completions:
+            return 0
+        
+        first_date = min(completions.keys())
+        first = datetime.datetime.fromisoformat(first_date).date()
+        today = datetime.date.today()
+        return (today - first).days
+    except:
+        return 0
@@ -9,79 +9,115 @@ Responses in style of Thug Kitchen Cookbook meets the movie Heathers, but warm u
 
 
 This replaces per-completion notifications for a cleaner experience.
+Digests go out at each user's local `digest_time` (see dispatch_due_digests).
 """
 
 import json
 import os
-from datetime import datetime, timedelta, date
-from typing import Dict, List, Optional, Any
+import threading
+from datetime import datetime, timedelta, date, time, timezone
+from typing import Dict, List, Optional, Any, Set, Tuple
 try:
     from zoneinfo import ZoneInfo
 except ImportError:
     ZoneInfo = None
 from storage import get_storage
+from job_context import JobRun, UserSnapshot, run_per_user, summarize_results
 from email_utils import send_email
-from onboarding import get_coaching_profile, calculate_days_since_signup
+import job_metrics
+from coaching_profile import get_coaching_profile, calculate_days_since_signup
 from coaching_engine import get_coaching_email_for_user
 from coaching_emails import get_gemini_client
+from xp_timeline import rolling_habit_metrics
 
 
 DIGEST_HISTORY_FILE = "daily_digest_history.json"
 
+# Digests are sent from a worker pool; serialize history read-modify-writes
+_history_lock = threading.RLock()
+
+SLOT_MINUTES = 15
+DEFAULT_DIGEST_TIME = "20:00"
+# A digest whose local send time passed less than this long ago is still sent (e.g. after a restart)
+LATE_GRACE = timedelta(hours=3)
+# The dispatch index is rebuilt from storage this often (picks up new users and profile edits)
+INDEX_MAX_AGE = timedelta(hours=6)
+
+# UTC slot start -> {user_id: local date the digest is for}
+_dispatch_index: Dict[datetime, Dict[str, str]] = {}
+_index_built_at: Optional[datetime] = None
+_dispatch_lock = threading.Lock()
+
 
 def load_digest_history() -> Dict[str, Dict]:
     """Load daily digest history."""
-    if not os.path.exists(DIGEST_HISTORY_FILE):
-        return {}
-    
-    try:
-        with open(DIGEST_HISTORY_FILE, 'r') as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"Error loading digest history: {e}")
-        return {}
+    with _history_lock:
+        if not os.path.exists(DIGEST_HISTORY_FILE):
+            return {}
+        
+        try:
+            with open(DIGEST_HISTORY_FILE, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error loading digest history: {e}")
+            return {}
 
 
 def save_digest_history(history: Dict[str, Dict]) -> None:
     """Save daily digest history."""
-    try:
-        with open(DIGEST_HISTORY_FILE, 'w') as f:
-            json.dump(history, f, indent=2)
-    except Exception as e:
-        print(f"Error saving digest history: {e}")
+    with _history_lock:
+        try:
+            with open(DIGEST_HISTORY_FILE, 'w') as f:
+                json.dump(history, f, indent=2)
+        except Exception as e:
+            print(f"Error saving digest history: {e}")
+
 
+def _user_tz(tz_name: Optional[str]):
+    """tzinfo for a profile timezone (UTC if unknown or zoneinfo is unavailable)."""
+    if ZoneInfo:
+        try:
+            return ZoneInfo(tz_name or "UTC")
+        except Exception:
+            pass
+    return timezone.utc
 
-def get_todays_date() -> str:
-    """Get today's date as ISO string."""
-    return datetime.now().date().isoformat()
 
+def get_todays_date(tz_name: Optional[str] = None) -> str:
+    """Get today's date as ISO string (server-local, or local to `tz_name`)."""
+    if tz_name is None:
+        return datetime.now().date().isoformat()
+    return datetime.now(_user_tz(tz_name)).date().isoformat()
 
-def has_digest_been_sent_today(user_id: str) -> bool:
-    """Check if digest has already been sent today."""
+
+def has_digest_been_sent_today(user_id: str, today: Optional[str] = None) -> bool:
+    """Check if digest has already been sent today (or on the given local date)."""
     history = load_digest_history()
-    today = get_todays_date()
+    today = today or get_todays_date()
     
     user_history = history.get(user_id, {})
     return today in user_history
 
 
-def record_digest_sent(user_id: str) -> None:
-    """Record that digest was sent today."""
-    history = load_digest_history()
-    today = get_todays_date()
-    
-    if user_id not in history:
-        history[user_id] = {}
-    
-    history[user_id][today] = {
-        "sent_at": datetime.now().isoformat(),
-        "status": "sent"
-    }
+def record_digest_sent(user_id: str, today: Optional[str] = None) -> None:
+    """Record that digest was sent today (or for the given local date)."""
+    today = today or get_todays_date()
     
-    save_digest_history(history)
+    with _history_lock:
+        history = load_digest_history()
+        
+        if user_id not in history:
+            history[user_id] = {}
+        
+        history[user_id][today] = {
+            "sent_at": datetime.now().isoformat(),
+            "status": "sent"
+        }
+        
+        save_digest_history(history)
 
 
-def process_daily_digests() -> int:
+def process_daily_digests(workers: Optional[int] = None) -> int:
     """
     Main entry point for daily digest job.
     Sends digest to all users who:
@@ -90,18 +126,17 @@ def process_daily_digests() -> int:
     3. Haven't received digest today
     4. Have completed onboarding
     
+    Users are swept in batches on a bounded worker pool (see job_context.JobRun.sweep).
+    
     Returns: Number of digests sent
     """
+    def _process(user: UserSnapshot) -> bool:
+        profile = user.data.get("coaching_profile") or {}
+        return _process_user_digest(user.user_id, get_todays_date(profile.get("timezone") or "UTC"))
+
     try:
-        storage = get_storage()
-        users = storage.list_users()
-        sent_count = 0
-        
-        for user_id in users:
-            if should_send_digest(user_id):
-                if send_digest_to_user(user_id):
-                    sent_count += 1
-                    record_digest_sent(user_id)
+        results = JobRun("daily_digests", get_storage()).sweep(_process, workers=workers)
+        sent_count = sum(1 for r in results if r["ok"] and r["value"])
         
         print(f"📧 Daily digest job complete. Sent {sent_count} digest(s).")
         return sent_count
@@ -111,7 +146,125 @@ def process_daily_digests() -> int:
         return 0
 
 
-def should_send_digest(user_id: str) -> bool:
+def _process_user_digest(user_id: str, today: Optional[str] = None) -> bool:
+    """Send and record one user's digest if they qualify. Returns True if sent.
+
+    `today` is the user's local date; it defaults to today in their profile timezone.
+    """
+    if today is None:
+        today = get_todays_date(get_coaching_profile(user_id).get("timezone") or "UTC")
+    if should_send_digest(user_id, today) and send_digest_to_user(user_id, today):
+        record_digest_sent(user_id, today)
+        return True
+    return False
+
+
+def _digest_clock(profile: Dict[str, Any]) -> time:
+    try:
+        hours, minutes = (profile.get("digest_time") or DEFAULT_DIGEST_TIME).split(":")[:2]
+        return time(int(hours), int(minutes))
+    except Exception:
+        return time(20, 0)
+
+
+def _slot(instant: datetime) -> datetime:
+    """Start of the SLOT_MINUTES-wide UTC slot containing `instant`."""
+    instant = instant.astimezone(timezone.utc)
+    return instant.replace(minute=instant.minute - instant.minute % SLOT_MINUTES, second=0, microsecond=0)
+
+
+def next_digest_at(profile: Dict[str, Any], now: datetime, sent_dates: Optional[Set[str]] = None) -> Tuple[datetime, str]:
+    """Next UTC instant to send this user's digest, and the local date it is for.
+
+    That is the user's `digest_time` on the earliest local day (yesterday,
+    today or tomorrow) that hasn't had a digest and whose send time isn't
+    more than LATE_GRACE in the past.
+    """
+    tz = _user_tz(profile.get("timezone"))
+    clock = _digest_clock(profile)
+    local_today = now.astimezone(tz).date()
+    sent_dates = sent_dates or set()
+    for offset in (-1, 0, 1, 2):
+        day = local_today + timedelta(days=offset)
+        instant = datetime.combine(day, clock, tzinfo=tz).astimezone(timezone.utc)
+        if day.isoformat() not in sent_dates and instant + LATE_GRACE > now:
+            return instant, day.isoformat()
+    return instant, day.isoformat()
+
+
+def _schedule_digest(user_id: str, instant: datetime, day: str) -> None:
+    with _dispatch_lock:
+        for users in _dispatch_index.values():
+            users.pop(user_id, None)
+        _dispatch_index.setdefault(_slot(instant), {})[user_id] = day
+
+
+def build_digest_index(storage=None, now: Optional[datetime] = None) -> int:
+    """Index every onboarded user by their next digest slot. Returns the number indexed."""
+    global _index_built_at
+    storage = storage or get_storage()
+    now = now or datetime.now(timezone.utc)
+    history = load_digest_history()
+    index: Dict[datetime, Dict[str, str]] = {}
+    for user_id, data in storage.iter_user_data():
+        profile = data.get("coaching_profile") or {}
+        if not profile.get("onboarding_complete"):
+            continue
+        instant, day = next_digest_at(profile, now, set(history.get(user_id, {})))
+        index.setdefault(_slot(instant), {})[user_id] = day
+    with _dispatch_lock:
+        _dispatch_index.clear()
+        _dispatch_index.update(index)
+        _index_built_at = now
+    return sum(len(users) for users in index.values())
+
+
+def dispatch_due_digests(now: Optional[datetime] = None, storage=None, workers: Optional[int] = None) -> int:
+    """Send digests for the users whose slot has come up. Returns the number sent.
+
+    Each user is processed for their own local date and rescheduled for their
+    next send instant. The index is (re)built when missing or older than
+    INDEX_MAX_AGE.
+    """
+    now = now or datetime.now(timezone.utc)
+    with _dispatch_lock:
+        stale = _index_built_at is None or now - _index_built_at > INDEX_MAX_AGE
+    if stale:
+        build_digest_index(storage, now)
+
+    current = _slot(now)
+    due: Dict[str, str] = {}
+    with _dispatch_lock:
+        for slot in sorted(s for s in _dispatch_index if s <= current):
+            due.update(_dispatch_index.pop(slot))
+    if not due:
+        return 0
+
+    history = load_digest_history()
+
+    def _handle(item: Tuple[str, str]) -> bool:
+        user_id, _ = item
+        profile = get_coaching_profile(user_id)
+        sent_dates = set(history.get(user_id, {}))
+        instant, day = next_digest_at(profile, now, sent_dates)
+        if _slot(instant) > current:
+            # Profile changed since indexing; not due yet
+            _schedule_digest(user_id, instant, day)
+            return False
+        sent = _process_user_digest(user_id, day)
+        # Whether sent or not (opted out, no email...), this day is handled
+        _schedule_digest(user_id, *next_digest_at(profile, now, sent_dates | {day}))
+        return sent
+
+    job_metrics.count("users_scanned", len(due))
+    results = run_per_user("daily_digests", list(due.items()), _handle, key=lambda item: item[0], workers=workers)
+    sent_count = sum(1 for r in results if r["ok"] and r["value"])
+    print(f"📧 Digest slot {current.strftime('%H:%M')} UTC: {len(due)} due, {sent_count} sent.")
+    print(summarize_results("daily_digests", results))
+    return sent_count
+
+
+def should_send_digest(user_id: str, today: Optional[str] = None) -> bool:
     """Check if user qualifies for daily digest."""
     try:
         storage = get_storage()
@@ -126,11 +279,11 @@ def should_send_digest(user_id: str) -> bool:
             return False
         
         # Check: already sent today
-        if has_digest_been_sent_today(user_id):
+        if has_digest_been_sent_today(user_id, today):
             return False
         
         # Check: onboarding complete
-        from onboarding import has_completed_onboarding
+        from coaching_profile import has_completed_onboarding
         if not has_completed_onboarding(user_id):
             return False
         
@@ -146,8 +299,8 @@ def should_send_digest(user_id: str) -> bool:
         return False
 
 
-def send_digest_to_user(user_id: str) -> bool:
-    """Generate and send daily digest for a user."""
+def send_digest_to_user(user_id: str, today: Optional[str] = None) -> bool:
+    """Generate and send daily digest for a user (for `today`, their local date)."""
     try:
         storage = get_storage()
         data = storage.load_data(user_id)
@@ -158,12 +311,12 @@ def send_digest_to_user(user_id: str) -> bool:
             return False
         
         # Get today's data
-        today = get_todays_date()
+        today = today or get_todays_date(profile.get("timezone") or "UTC")
         today_completions = data.get("completions", {}).get(today, [])
         habits = data.get("habits", {})
         
         # Get streaks
-        streaks = _calculate_current_streaks(data)
+        streaks = _calculate_current_streaks(data, date.fromisoformat(today))
         
         # Generate email
         subject, body = _generate_digest_content(
@@ -172,7 +325,8 @@ def send_digest_to_user(user_id: str) -> bool:
             today_completions,
             habits,
             streaks,
-            data
+            data,
+            date.fromisoformat(today),
         )
         
         # Send email
@@ -184,11 +338,11 @@ def send_digest_to_user(user_id: str) -> bool:
         return False
 
 
-def _calculate_current_streaks(data: Dict) -> Dict[str, int]:
+def _calculate_current_streaks(data: Dict, today: Optional[date] = None) -> Dict[str, int]:
     """Calculate current streak for each active habit."""
     completions = data.get("completions", {})
     habits = data.get("habits", {})
-    today = datetime.now().date()
+    today = today or datetime.now().date()
     
     streaks = {}
     
@@ -267,9 +421,13 @@ def _generate_digest_content(
     today_completions: List[str],
     habits: Dict,
     streaks: Dict,
-    data: Dict
+    data: Dict,
+    today: Optional[date] = None,
 ) -> tuple[str, str]:
-    """Generate a single, irreverent daily digest with wins, misses, and next moves."""
+    """Generate a single, irreverent daily digest with wins, misses, and next moves.
+
+    `today` is the recipient's local date (default: the server's).
+    """
     completed_count = len(today_completions)
     active_habits = {h: v for h, v in habits.items() if v.get("active", True)}
     active_habits_count = len(active_habits)
@@ -312,6 +470,17 @@ def _generate_digest_content(
     if not streak_callouts:
         streak_callouts.append("No streak drama. Keep stacking.")
 
+    # Rolling completion rates (7/30/90 days) per active habit
+    rolling = rolling_habit_metrics(data, today)
+    consistency_lines = []
+    for habit in active_habits:
+        if habit in rolling:
+            w = rolling[habit]
+            consistency_lines.append(
+                f"- {habit}: {round(w[7]['completion_rate'] * 100)}% this week, "
+                f"{round(w[30]['completion_rate'] * 100)}% this month, {round(w[90]['completion_rate'] * 100)}% this quarter"
+            )
+
     chrono = profile.get("chronotype", "flexible")
     anchor = "right after coffee" if "morning" in chrono else "right after work" if "even" in chrono else "before you crash"
     next_moves = []
@@ -333,6 +502,7 @@ You are a blunt, dark-humor coach (Thug Kitchen vibe). Write ONE short opener li
 - Tone: irreverent, encouraging, zero fluff, clear direction.
 """
         try:
+            job_metrics.count("gemini_calls")
             opener = client.generate_content(prompt).text.strip().splitlines()[0]
         except Exception:
             opener = None
@@ -362,6 +532,9 @@ You are a blunt, dark-humor coach (Thug Kitchen vibe). Write ONE short opener li
 📊 Streak Radar
 {os.linesep.join(streak_callouts)}
 
+📐 Consistency
+{os.linesep.join(consistency_lines) if consistency_lines else 'Nothing tracked yet. Day one is a fine day.'}
+
 🎯 Next Moves
 {os.linesep.join(next_moves) if next_moves else 'Pick the easiest habit and do 2 minutes right after coffee.'}
 
@@ -383,7 +556,7 @@ def get_user_digest_preference(user_id: str) -> Dict[str, Any]:
     
     return {
         "enabled": profile.get("notifications_enabled", True),
-        "send_time": profile.get("digest_time", "20:00"),  # 8 PM default
+        "send_time": profile.get("digest_time", DEFAULT_DIGEST_TIME),  # 8 PM default
         "timezone": profile.get("timezone", "UTC"),
         "email": None  # Caller should fetch
     }
@@ -8,15 +8,20 @@ Responses in style of Thug Kitchen Cookbook meets the movie Heathers, but warm u
 
 import json
 import os
+import threading
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from storage import get_storage
+from job_context import JobRun, UserSnapshot
 from email_utils import send_email
 from coaching_emails import generate_personalized_coaching
 
 
 DRIP_HISTORY_FILE = "drip_campaign_history.json"
 
+# Drip emails are sent from a worker pool; serialize history read-modify-writes
+_history_lock = threading.RLock()
+
 # Drip campaign schedule (days after signup, email template name)
 DRIP_SCHEDULE = [
     (0, "welcome"),                  # Day 0: Welcome email
@@ -33,33 +38,36 @@ DRIP_SCHEDULE = [
 
 def load_drip_history() -> Dict[str, Dict]:
     """Load drip campaign history."""
-    if not os.path.exists(DRIP_HISTORY_FILE):
-        return {}
-    
-    try:
-        with open(DRIP_HISTORY_FILE, 'r') as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"Error loading drip history: {e}")
-        return {}
+    with _history_lock:
+        if not os.path.exists(DRIP_HISTORY_FILE):
+            return {}
+        
+        try:
+            with open(DRIP_HISTORY_FILE, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error loading drip history: {e}")
+            return {}
 
 
 def save_drip_history(history: Dict[str, Dict]) -> None:
     """Save drip campaign history."""
-    try:
-        with open(DRIP_HISTORY_FILE, 'w') as f:
-            json.dump(history, f, indent=2)
-    except Exception as e:
-        print(f"Error saving drip history: {e}")
+    with _history_lock:
+        try:
+            with open(DRIP_HISTORY_FILE, 'w') as f:
+                json.dump(history, f, indent=2)
+        except Exception as e:
+            print(f"Error saving drip history: {e}")
 
 
-def get_user_signup_date(user_id: str) -> Optional[datetime]:
+def get_user_signup_date(user_id: str, data: Optional[Dict] = None) -> Optional[datetime]:
     """
     Get user signup date.
     Inferred from oldest completion date or falls back to today if new.
+    Pass `data` when the user's record is already loaded (e.g. in a sweep).
     """
-    storage = get_storage()
-    data = storage.load_data(user_id)
+    if data is None:
+        data = get_storage().load_data(user_id)
     
     if not data:
         return None
@@ -76,9 +84,9 @@ def get_user_signup_date(user_id: str) -> Optional[datetime]:
     return datetime.now()
 
 
-def get_days_since_signup(user_id: str) -> int:
+def get_days_since_signup(user_id: str, data: Optional[Dict] = None) -> int:
     """Get number of days since user signup."""
-    signup_date = get_user_signup_date(user_id)
+    signup_date = get_user_signup_date(user_id, data)
     if not signup_date:
         return 0
     
@@ -572,17 +580,21 @@ Coach 🔥
     return subject, body
 
 
-def should_send_drip_email(user_id: str, email_type: str) -> bool:
-    """Check if we should send a drip email."""
-    storage = get_storage()
+def should_send_drip_email(user_id: str, email_type: str, data: Optional[Dict] = None) -> bool:
+    """Check if we should send a drip email (from `data` when the record is already loaded)."""
+    storage = get_storage() if data is None else None
     
     # Check if user has email
-    email = storage.get_user_email(user_id)
+    email = storage.get_user_email(user_id) if data is None else data.get("email")
     if not email:
         return False
     
     # Check if notifications enabled
-    if not storage.get_notifications_enabled(user_id):
+    if data is None:
+        enabled = storage.get_notifications_enabled(user_id)
+    else:
+        enabled = (data.get("preferences") or {}).get("notifications_enabled", True)
+    if not enabled:
         return False
     
     # Check if already sent
@@ -595,9 +607,9 @@ def should_send_drip_email(user_id: str, email_type: str) -> bool:
     return True
 
 
-def get_pending_drip_emails(user_id: str) -> List[str]:
+def get_pending_drip_emails(user_id: str, data: Optional[Dict] = None) -> List[str]:
     """Get list of pending drip emails for user."""
-    days_since_signup = get_days_since_signup(user_id)
+    days_since_signup = get_days_since_signup(user_id, data)
     history = load_drip_history()
     user_history = history.get(user_id, {})
     
@@ -610,9 +622,9 @@ def get_pending_drip_emails(user_id: str) -> List[str]:
     return pending
 
 
-def send_drip_email(user_id: str, email_type: str) -> bool:
-    """Send a drip email and record it."""
-    if not should_send_drip_email(user_id, email_type):
+def send_drip_email(user_id: str, email_type: str, data: Optional[Dict] = None) -> bool:
+    """Send a drip email and record it. Pass `data` when the user's record is already loaded."""
+    if not should_send_drip_email(user_id, email_type, data):
         return False
     
     # Generate email based on type
@@ -635,8 +647,7 @@ def send_drip_email(user_id: str, email_type: str) -> bool:
     try:
         subject, body = email_generators[email_type](user_id)
         
-        storage = get_storage()
-        email = storage.get_user_email(user_id)
+        email = get_storage().get_user_email(user_id) if data is None else data.get("email")
         
         if not email:
             return False
@@ -646,16 +657,18 @@ def send_drip_email(user_id: str, email_type: str) -> bool:
         
         if success:
             # Record in history
-            history = load_drip_history()
-            if user_id not in history:
-                history[user_id] = {}
-            
-            history[user_id][email_type] = {
-                "sent_at": datetime.now().isoformat(),
-                "days_since_signup": get_days_since_signup(user_id)
-            }
-            
-            save_drip_history(history)
+            days_since_signup = get_days_since_signup(user_id, data)
+            with _history_lock:
+                history = load_drip_history()
+                if user_id not in history:
+                    history[user_id] = {}
+                
+                history[user_id][email_type] = {
+                    "sent_at": datetime.now().isoformat(),
+                    "days_since_signup": days_since_signup
+                }
+                
+                save_drip_history(history)
             print(f"✅ Sent drip email '{email_type}' to {user_id}")
             return True
         else:
@@ -667,17 +680,20 @@ def send_drip_email(user_id: str, email_type: str) -> bool:
         return False
 
 
-def process_drip_campaigns():
-    """Process all pending drip emails for all users."""
-    storage = get_storage()
-    users = storage.list_users()
-    
-    sent_count = 0
-    for user_id in users:
-        pending = get_pending_drip_emails(user_id)
-        for email_type in pending:
-            if send_drip_email(user_id, email_type):
-                sent_count += 1
+def _process_user_drips(user: UserSnapshot) -> int:
+    """Send one user's pending drip emails in schedule order. Returns the number sent."""
+    sent = 0
+    for email_type in get_pending_drip_emails(user.user_id, user.data):
+        if send_drip_email(user.user_id, email_type, user.data):
+            sent += 1
+    return sent
+
+
+def process_drip_campaigns(workers: Optional[int] = None):
+    """Process all pending drip emails for all users (a JobRun sweep on a bounded worker pool)."""
+    run = JobRun("drip_campaigns", get_storage())
+    results = run.sweep(_process_user_drips, workers=workers)
+    sent_count = sum(r["value"] for r in results if r["ok"])
     
     if sent_count > 0:
         print(f"✅ Sent {sent_count} drip campaign email(s)")
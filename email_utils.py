@@ -1,14 +1,13 @@
 import os
 import smtplib
 from email.message import EmailMessage
-import streamlit as st
+from app_config import get_secret_section, report_error
+import job_metrics
 
 def _get_smtp_config():
-    # Prefer Streamlit secrets
-    cfg = {}
-    if hasattr(st, 'secrets') and 'smtp' in st.secrets:
-        cfg = dict(st.secrets['smtp'])
-    else:
+    # Prefer the [smtp] secrets section (st.secrets in the app, secrets.toml when headless)
+    cfg = get_secret_section('smtp')
+    if not cfg:
         cfg['host'] = os.environ.get('SMTP_HOST')
         cfg['port'] = int(os.environ.get('SMTP_PORT', 0)) if os.environ.get('SMTP_PORT') else None
         cfg['user'] = os.environ.get('SMTP_USER')
@@ -27,7 +26,8 @@ def send_email(to_address: str, subject: str, body: str) -> bool:
     from_addr = cfg.get('from') or user
 
     if not host or not port:
-        st.error('SMTP not configured. Set st.secrets["smtp"] or SMTP_HOST/SMTP_PORT env vars.')
+        job_metrics.count('email_failures')
+        report_error('SMTP not configured. Set st.secrets["smtp"] or SMTP_HOST/SMTP_PORT env vars.')
         return False
 
     msg = EmailMessage()
@@ -54,7 +54,10 @@ def send_email(to_address: str, subject: str, body: str) -> bool:
                 if user and password:
                     smtp.login(user, password)
                 smtp.send_message(msg)
+        job_metrics.count('emails_sent')
+        job_metrics.notified(to_address)
         return True
     except Exception as e:
-        st.error(f"Failed to send email: {e}")
+        job_metrics.count('email_failures')
+        report_error(f"Failed to send email: {e}")
         return False
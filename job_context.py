@@ -0,0 +1,431 @@
+"""
+Job Run Context
+Per-run context for scheduler sweeps: one read per user, checkpoints,
+incremental runs and a bounded, rate-limited per-user worker pool.
+"""
+
+import contextvars
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import date, datetime
+from typing import Dict, Any, Callable, Iterable, Iterator, List, Optional, Set
+
+import job_metrics
+from storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOB_WORKERS = 8
+DEFAULT_USER_TIMEOUT_SECONDS = 120.0
+
+# Incremental runs look back this far before the watermark, so a save racing
+# the previous run's start (or another host's clock skew) isn't missed
+WATERMARK_SLACK_SECONDS = 300.0
+
+
+class UserSnapshot:
+    """One user's record as loaded at the start of their turn in a sweep."""
+
+    def __init__(self, user_id: str, data: Dict[str, Any]):
+        self.user_id = user_id
+        self.data = data
+
+    @property
+    def email(self) -> Optional[str]:
+        return self.data.get("email")
+
+    @property
+    def notifications_enabled(self) -> bool:
+        return (self.data.get("preferences") or {}).get("notifications_enabled", True)
+
+
+class JobRun:
+    """Per-run context for a scheduler job: storage handle, run clock and read counters."""
+
+    def __init__(
+        self,
+        name: str,
+        storage=None,
+        now: Optional[datetime] = None,
+        run_key: Optional[str] = None,
+        incremental: bool = False,
+    ):
+        self.name = name
+        self.storage = storage or get_storage()
+        self.now = now or datetime.now()
+        self.today = self.now.date()
+        self.started_at = time.time()
+        self.users_scanned = 0
+        self.users_skipped = 0
+        self.users_unchanged: Optional[int] = None
+        self.storage_reads = 0
+        self.users_processed = 0
+        self.users_failed = 0
+        self.total: Optional[int] = None
+        self.checkpoint = None
+        if run_key is not None:
+            from job_store import SweepCheckpoint
+            self.checkpoint = SweepCheckpoint(name, run_key)
+        self.dirty = None
+        if incremental:
+            from job_store import DirtyUsers
+            self.dirty = DirtyUsers(name)
+        self._began = time.monotonic()
+        # Guards the tallies and checkpoint/revisit writes against finish() closing the stores
+        self._state_lock = threading.RLock()
+        self._finished = False
+        self._timed_out: Set[str] = set()
+        self._cancel = threading.Event()
+
+    def changed_user_ids(self) -> Optional[List[str]]:
+        """Users an incremental run must visit: changed since the last run, or due.
+
+        None means sweep everyone (not incremental, first run, or the
+        provider query failed).
+        """
+        if self.dirty is None:
+            return None
+        since = self.dirty.since
+        if since is None:
+            logger.info(f"{self.name}: no watermark yet, sweeping all users")
+            return None
+        try:
+            changed = set(self.storage.list_users_modified_since(since - WATERMARK_SLACK_SECONDS))
+            known = set(self.storage.list_users())
+        except Exception as e:
+            logger.warning(f"{self.name}: changed-user query failed, sweeping all users: {e}")
+            return None
+        # Due revisits of users deleted since are ignored
+        selected = (changed | self.dirty.due_users(self.today)) & known
+        self.users_unchanged = len(known) - len(selected)
+        job_metrics.count("users_skipped", self.users_unchanged)
+        return sorted(selected)
+
+    def users(self, user_ids: Optional[Iterable[str]] = None) -> Iterator[UserSnapshot]:
+        """Yield a snapshot per user (all users by default), reading each record once.
+
+        With a checkpoint, users already done in this run are skipped without
+        being read, and nothing is yielded if the run already finished. An
+        incremental run defaults to the changed and due users only.
+        """
+        if self.checkpoint is not None and self.checkpoint.finished:
+            logger.info(f"{self.name}: run {self.checkpoint.run_key} already finished, skipping")
+            return
+        if user_ids is None:
+            user_ids = self.changed_user_ids()
+        if self.checkpoint is not None:
+            done = self.checkpoint.done_users()
+            if done:
+                candidates = self.storage.list_users() if user_ids is None else user_ids
+                user_ids = [u for u in candidates if u not in done]
+                self.users_skipped += len(done)
+                job_metrics.count("users_skipped", len(done))
+                logger.info(f"{self.name}: resuming run {self.checkpoint.run_key}, {len(done)} users already done")
+        if isinstance(user_ids, (list, tuple, set)):
+            self.total = len(user_ids)
+        records = iter(self.storage.iter_user_data(user_ids))
+        while True:
+            try:
+                user_id, data = next(records)
+            except StopIteration:
+                return
+            except Exception as e:
+                # A failed read ends the provider's stream; report it instead of failing the job
+                logger.error(f"{self.name}: user sweep stopped after {self.users_scanned} users: {e}")
+                return
+            self.users_scanned += 1
+            self.storage_reads += 1
+            job_metrics.count("users_scanned")
+            yield UserSnapshot(user_id, data)
+
+    def done(self, user_id: str) -> None:
+        """Checkpoint a user as finished for this run (no-op without a run key, or once the run finished)."""
+        with self._state_lock:
+            if self.checkpoint is not None and not self._finished:
+                self.checkpoint.mark_done(user_id)
+
+    def revisit(self, user_id: str, due: Optional[date]) -> None:
+        """Sweep this user again on `due` even if unchanged (None: only when changed)."""
+        with self._state_lock:
+            if self.dirty is not None and not self._finished:
+                self.dirty.revisit(user_id, due)
+
+    def failed(self, user_id: str) -> None:
+        """Retry a user whose handler failed on the next incremental run."""
+        self.revisit(user_id, self.today)
+
+    def checkpointed(self, handler: Callable[[UserSnapshot], Any]) -> Callable[[UserSnapshot], Any]:
+        """Wrap a per-user handler so users are checkpointed once it returns (and retried if it raises or times out)."""
+        def _wrapped(user: UserSnapshot) -> Any:
+            try:
+                result = handler(user)
+            except Exception:
+                with self._state_lock:
+                    if user.user_id not in self._timed_out:
+                        self.failed(user.user_id)
+                        self.users_failed += 1
+                raise
+            with self._state_lock:
+                # A user reported as timed out stays unchecked so the next run retries it
+                if not self._finished and user.user_id not in self._timed_out:
+                    self.done(user.user_id)
+                    self.users_processed += 1
+            return result
+        return _wrapped
+
+    def _timed_out_user(self, user_id: str) -> None:
+        with self._state_lock:
+            if self._finished or user_id in self._timed_out:
+                return
+            self._timed_out.add(user_id)
+            self.failed(user_id)
+            self.users_failed += 1
+
+    def sweep(
+        self,
+        handler: Callable[[UserSnapshot], Any],
+        user_ids: Optional[Iterable[str]] = None,
+        workers: Optional[int] = None,
+        rate: Optional[float] = None,
+        timeout: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """Apply `handler` to every user's snapshot on the job's pool, then finish the run.
+
+        Users come from `users(user_ids)` and each is checkpointed once its
+        handler returns. `rate` caps users started per second (default:
+        SCHEDULER_RATE[_<JOB>], unlimited if unset). A cancelled sweep lets the
+        users in flight finish and is not finished, so its checkpoint and
+        watermark stay where they were. Returns run_per_user's results.
+        """
+        with _active_lock:
+            _active_runs[self.name] = self
+        try:
+            results = run_per_user(
+                self.name,
+                self.users(user_ids),
+                self.checkpointed(handler),
+                workers=workers,
+                timeout=timeout,
+                rate=job_rate(self.name) if rate is None else rate,
+                cancel=self._cancel,
+                on_timeout=self._timed_out_user,
+            )
+        finally:
+            with _active_lock:
+                if _active_runs.get(self.name) is self:
+                    del _active_runs[self.name]
+        if self.cancelled:
+            logger.warning(f"{self.name}: cancelled after {len(results)} users; the next run picks up the rest")
+        else:
+            self.finish()
+        logger.info(self.summary())
+        logger.info(summarize_results(self.name, results))
+        return results
+
+    def cancel(self) -> None:
+        """Stop the sweep before its next user (users already started still finish)."""
+        self._cancel.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def progress(self) -> Dict[str, Any]:
+        """Counts so far: scanned (read), processed, failed, total (None when unknown up front)."""
+        elapsed = time.monotonic() - self._began
+        with self._state_lock:
+            processed, failed = self.users_processed, self.users_failed
+        return {
+            "job": self.name,
+            "scanned": self.users_scanned,
+            "processed": processed,
+            "failed": failed,
+            "total": self.total,
+            "elapsed_seconds": round(elapsed, 1),
+            "users_per_second": round((processed + failed) / elapsed, 2) if elapsed > 0 else None,
+            "cancelled": self.cancelled,
+        }
+
+    def finish(self) -> None:
+        """Mark the run finished (call once the sweep completes)."""
+        with self._state_lock:
+            if self._finished:
+                return
+            self._finished = True
+            if self.checkpoint is not None:
+                self.checkpoint.finish()
+                self.checkpoint.close()
+            if self.dirty is not None:
+                self.dirty.advance(self.started_at)
+                self.dirty.close()
+
+    def summary(self) -> str:
+        line = f"{self.name}: {self.users_scanned} users scanned, {self.storage_reads} storage reads"
+        if self.users_skipped:
+            line += f", {self.users_skipped} already done"
+        if self.users_unchanged is not None:
+            line += f", {self.users_unchanged} unchanged"
+        return line
+
+
+_active_runs: Dict[str, JobRun] = {}
+_active_lock = threading.Lock()
+
+
+def active_runs() -> List[Dict[str, Any]]:
+    """Progress of the sweeps running in this process (see JobRun.sweep)."""
+    with _active_lock:
+        runs = list(_active_runs.values())
+    return [run.progress() for run in runs]
+
+
+def cancel_runs(name: Optional[str] = None) -> int:
+    """Cancel the running sweep of job `name` (every sweep if None). Returns how many were cancelled."""
+    with _active_lock:
+        runs = [run for run in _active_runs.values() if name is None or run.name == name]
+    for run in runs:
+        run.cancel()
+    return len(runs)
+
+
+def job_workers(job_name: str) -> int:
+    """Pool size for a job: SCHEDULER_WORKERS_<JOB>, else SCHEDULER_WORKERS, else the default."""
+    raw = os.environ.get(f"SCHEDULER_WORKERS_{job_name.upper()}") or os.environ.get("SCHEDULER_WORKERS")
+    try:
+        return max(int(raw), 1) if raw else DEFAULT_JOB_WORKERS
+    except ValueError:
+        return DEFAULT_JOB_WORKERS
+
+
+def user_timeout() -> float:
+    """Seconds one user's handler may run before it is reported as timed out."""
+    try:
+        return float(os.environ.get("SCHEDULER_USER_TIMEOUT") or DEFAULT_USER_TIMEOUT_SECONDS)
+    except ValueError:
+        return DEFAULT_USER_TIMEOUT_SECONDS
+
+
+def job_rate(job_name: str) -> Optional[float]:
+    """Users per second a job may start: SCHEDULER_RATE_<JOB>, else SCHEDULER_RATE, else unlimited (None)."""
+    raw = os.environ.get(f"SCHEDULER_RATE_{job_name.upper()}") or os.environ.get("SCHEDULER_RATE")
+    try:
+        rate = float(raw) if raw else None
+    except ValueError:
+        return None
+    return rate if rate and rate > 0 else None
+
+
+def run_per_user(
+    name: str,
+    items: Iterable[Any],
+    handler: Callable[[Any], Any],
+    key: Callable[[Any], str] = lambda item: getattr(item, "user_id", item),
+    workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+    rate: Optional[float] = None,
+    cancel: Optional[threading.Event] = None,
+    on_timeout: Optional[Callable[[str], None]] = None,
+) -> List[Dict[str, Any]]:
+    """Apply `handler` to every item on a bounded pool; results come back in input order.
+
+    `items` is consumed lazily with at most two items per worker in flight, so
+    a streamed user sweep stays bounded; `key` maps an item to its user id.
+    Each result is {"user_id", "ok",
+    "value", "error", "seconds"}. A handler that raises only fails its own
+    user; one that runs past `timeout` is reported as timed out and its result
+    is discarded (the thread cannot be interrupted and frees its worker when
+    the call returns).
+
+    With `rate`, at most that many items start per second (e.g. to stay under
+    an SMTP or Gemini quota). Once `cancel` is set no further items are taken
+    from `items`; the results cover the items started before that.
+    `on_timeout(user_id)` is called as soon as a user is reported as timed out.
+    """
+    workers = workers or job_workers(name)
+    timeout = user_timeout() if timeout is None else timeout
+    results: Dict[int, Dict[str, Any]] = {}
+    started: Dict[Any, float] = {}
+    started_lock = threading.Lock()
+
+    def _call(index: int, item: Any) -> Any:
+        with started_lock:
+            started[index] = time.monotonic()
+        return handler(item)
+
+    def _record(index: int, uid: str, ok: bool, value: Any = None, error: Optional[str] = None) -> None:
+        with started_lock:
+            began = started.get(index)
+        seconds = round(time.monotonic() - began, 3) if began is not None else 0.0
+        results[index] = {"user_id": uid, "ok": ok, "value": value, "error": error, "seconds": seconds}
+        if error:
+            logger.error(f"{name}: {uid}: {error}")
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"job-{name}")
+    in_flight: Dict[Any, tuple] = {}
+    source = iter(items)
+    submitted = 0
+    exhausted = False
+    interval = 1.0 / rate if rate else 0.0
+    next_start = time.monotonic()
+    try:
+        while in_flight or not exhausted:
+            if cancel is not None and cancel.is_set():
+                exhausted = True  # take no more items; those in flight still finish
+            while not exhausted and len(in_flight) < workers * 2 and time.monotonic() >= next_start:
+                try:
+                    item = next(source)
+                except StopIteration:
+                    exhausted = True
+                    break
+                # Each task runs in a copy of the job's context so its metrics count on the job's run
+                context = contextvars.copy_context()
+                in_flight[pool.submit(context.run, _call, submitted, item)] = (submitted, key(item))
+                submitted += 1
+                if interval:
+                    next_start = max(next_start, time.monotonic()) + interval
+            if not in_flight:
+                if exhausted:
+                    break
+                # Rate limited with nothing running: wait for the next start (or a cancel)
+                delay = max(next_start - time.monotonic(), 0.0)
+                if cancel is not None:
+                    cancel.wait(delay)
+                else:
+                    time.sleep(delay)
+                continue
+            wait_for = min(timeout, 1.0)
+            if not exhausted and len(in_flight) < workers * 2:
+                wait_for = min(wait_for, max(next_start - time.monotonic(), 0.0))
+            done, _ = wait(list(in_flight), timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, uid = in_flight.pop(future)
+                try:
+                    _record(index, uid, True, value=future.result())
+                except Exception as e:
+                    _record(index, uid, False, error=f"{type(e).__name__}: {e}")
+            now = time.monotonic()
+            for future, (index, uid) in list(in_flight.items()):
+                with started_lock:
+                    began = started.get(index)
+                if began is not None and now - began > timeout:
+                    in_flight.pop(future)
+                    _record(index, uid, False, error=f"timed out after {timeout:g}s")
+                    if on_timeout is not None:
+                        on_timeout(uid)
+    finally:
+        # Don't block the job on abandoned (timed-out) handlers
+        pool.shutdown(wait=False, cancel_futures=True)
+    return [results[i] for i in sorted(results)]
+
+
+def summarize_results(name: str, results: List[Dict[str, Any]]) -> str:
+    """One log line for a fan-out: users processed, failures and the slowest user."""
+    failed = sum(1 for r in results if not r["ok"])
+    slowest = max(results, key=lambda r: r["seconds"], default=None)
+    line = f"{name}: {len(results)} users processed, {failed} failed"
+    if slowest is not None:
+        line += f", slowest {slowest['user_id']} ({slowest['seconds']:.2f}s)"
+    return line
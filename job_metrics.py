@@ -0,0 +1,168 @@
+"""
+Job Metrics
+Per-run counters for scheduler jobs (`tracked_job`) and the run history shown in Admin.
+"""
+
+import contextvars
+import functools
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = (
+    "users_scanned",
+    "users_skipped",
+    "storage_reads",
+    "emails_sent",
+    "email_failures",
+    "gemini_calls",
+    "errors",
+)
+
+_current: contextvars.ContextVar[Optional["RunMetrics"]] = contextvars.ContextVar("job_metrics_run", default=None)
+
+
+class RunMetrics:
+    """Counters of one job run (thread-safe; shared by the run's worker threads)."""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.started_at = datetime.now()
+        self.finished_at: Optional[datetime] = None
+        self.status = "ok"
+        self.error: Optional[str] = None
+        self.counts: Dict[str, int] = dict.fromkeys(COUNTERS, 0)
+        self._notified: Set[str] = set()
+        self._began = time.monotonic()
+        self._seconds = 0.0
+        self._lock = threading.Lock()
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def notified(self, recipient: str) -> None:
+        with self._lock:
+            self._notified.add(recipient)
+
+    def finish(self) -> None:
+        self.finished_at = datetime.now()
+        self._seconds = time.monotonic() - self._began
+
+    def to_record(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self.counts)
+            notified = len(self._notified)
+        return {
+            "job_id": self.job_id,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "finished_at": self.finished_at.isoformat(timespec="seconds") if self.finished_at else None,
+            "duration_seconds": round(self._seconds, 3),
+            "status": self.status,
+            "error": self.error,
+            "users_notified": notified,
+            **counts,
+        }
+
+
+def current() -> Optional[RunMetrics]:
+    """The run being measured in this context, if any."""
+    return _current.get()
+
+
+def count(name: str, n: int = 1) -> None:
+    """Add `n` to counter `name` of the current run (no-op outside a tracked job)."""
+    run = _current.get()
+    if run is not None:
+        run.count(name, n)
+
+
+def notified(recipient: str) -> None:
+    """Record a successful send to `recipient` on the current run."""
+    run = _current.get()
+    if run is not None:
+        run.notified(recipient)
+
+
+class _ErrorCounter(logging.Handler):
+    """Counts ERROR records against the run current in the emitting context."""
+
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        count("errors")
+
+
+_error_counter: Optional[_ErrorCounter] = None
+_install_lock = threading.Lock()
+
+
+def _install_error_counter() -> None:
+    # Installed on first use, not at import, so logging.basicConfig() elsewhere
+    # still sees an unconfigured root logger
+    global _error_counter
+    with _install_lock:
+        if _error_counter is None:
+            _error_counter = _ErrorCounter()
+            logging.getLogger().addHandler(_error_counter)
+
+
+def tracked_job(job_id: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Decorator: measure every call of a job function and append it to the run history."""
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current.get() is not None:
+                # Called from another tracked job: count into the outer run
+                return func(*args, **kwargs)
+            _install_error_counter()
+            run = RunMetrics(job_id)
+            token = _current.set(run)
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                run.status = "failed"
+                run.error = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                _current.reset(token)
+                run.finish()
+                record_run(run.to_record())
+        return wrapper
+    return decorator
+
+
+def record_run(record: Dict[str, Any]) -> None:
+    """Append a finished run to the history store (never raises)."""
+    try:
+        from job_store import RunHistory
+        history = RunHistory()
+        try:
+            history.append(record)
+        finally:
+            history.close()
+    except Exception as e:
+        logger.warning(f"Could not record {record.get('job_id')} run: {e}")
+
+
+def load_history(job_id: Optional[str] = None, limit: int = 200) -> List[Dict[str, Any]]:
+    """Recent runs, newest first, each with `users_per_second` throughput added."""
+    try:
+        from job_store import RunHistory
+        history = RunHistory()
+        try:
+            records = history.recent(job_id, limit)
+        finally:
+            history.close()
+    except Exception as e:
+        logger.warning(f"Could not load job run history: {e}")
+        return []
+    for record in records:
+        seconds = record.get("duration_seconds") or 0
+        record["users_per_second"] = round(record.get("users_scanned", 0) / seconds, 2) if seconds > 0 else None
+    return records
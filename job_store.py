@@ -0,0 +1,326 @@
+"""
+Job Store
+SQLite persistence for the background scheduler: APScheduler jobs, sweep
+checkpoints, incremental-sweep watermarks and run history.
+"""
+
+import json
+import pickle
+import sqlite3
+import threading
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+try:
+    from apscheduler.job import Job
+    from apscheduler.jobstores.base import BaseJobStore, ConflictingIdError, JobLookupError
+    from apscheduler.util import datetime_to_utc_timestamp, utc_timestamp_to_datetime
+except Exception:
+    Job = None
+    BaseJobStore = object
+
+JOB_STORE_FILE = "scheduler_jobs.sqlite"
+
+# Run records (and any leftover checkpoints) beyond the latest N per job are pruned
+KEEP_RUNS_PER_JOB = 10
+
+# Metrics of the latest N runs per job are kept for the Admin run history
+KEEP_RUN_HISTORY = 200
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+class SQLiteJobStore(BaseJobStore):
+    """APScheduler job store backed by a SQLite file (job state is pickled, as in the SQLAlchemy store)."""
+
+    def __init__(self, path: str = JOB_STORE_FILE, tablename: str = "apscheduler_jobs", pickle_protocol: int = pickle.HIGHEST_PROTOCOL):
+        super().__init__()
+        self.path = path
+        self.tablename = tablename
+        self.pickle_protocol = pickle_protocol
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._closed = False
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = _connect(self.path)
+        return self._conn
+
+    def start(self, scheduler, alias):
+        super().start(scheduler, alias)
+        self._closed = False
+        with self._lock, self._db:
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.tablename} "
+                "(id TEXT PRIMARY KEY, next_run_time REAL, job_state BLOB NOT NULL)"
+            )
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS ix_{self.tablename}_next_run_time ON {self.tablename} (next_run_time)")
+
+    def lookup_job(self, job_id):
+        with self._lock:
+            row = self._db.execute(f"SELECT job_state FROM {self.tablename} WHERE id = ?", (job_id,)).fetchone()
+        return self._reconstitute_job(row[0]) if row else None
+
+    def get_due_jobs(self, now):
+        # The scheduler thread polls once more after shutdown(); running (and
+        # advancing) a due job then would drop a run the next start should catch up
+        if self._closed:
+            return []
+        return self._get_jobs("WHERE next_run_time <= ?", (datetime_to_utc_timestamp(now),))
+
+    def get_next_run_time(self):
+        if self._closed:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT next_run_time FROM {self.tablename} WHERE next_run_time IS NOT NULL ORDER BY next_run_time LIMIT 1"
+            ).fetchone()
+        return utc_timestamp_to_datetime(row[0]) if row else None
+
+    def get_all_jobs(self):
+        jobs = self._get_jobs()
+        self._fix_paused_jobs_sorting(jobs)
+        return jobs
+
+    def add_job(self, job):
+        try:
+            with self._lock, self._db:
+                self._db.execute(
+                    f"INSERT INTO {self.tablename} (id, next_run_time, job_state) VALUES (?, ?, ?)",
+                    (job.id, datetime_to_utc_timestamp(job.next_run_time), pickle.dumps(job.__getstate__(), self.pickle_protocol)),
+                )
+        except sqlite3.IntegrityError:
+            raise ConflictingIdError(job.id)
+
+    def update_job(self, job):
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                f"UPDATE {self.tablename} SET next_run_time = ?, job_state = ? WHERE id = ?",
+                (datetime_to_utc_timestamp(job.next_run_time), pickle.dumps(job.__getstate__(), self.pickle_protocol), job.id),
+            )
+        if cursor.rowcount == 0:
+            raise JobLookupError(job.id)
+
+    def remove_job(self, job_id):
+        with self._lock, self._db:
+            cursor = self._db.execute(f"DELETE FROM {self.tablename} WHERE id = ?", (job_id,))
+        if cursor.rowcount == 0:
+            raise JobLookupError(job_id)
+
+    def remove_all_jobs(self):
+        with self._lock, self._db:
+            self._db.execute(f"DELETE FROM {self.tablename}")
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _reconstitute_job(self, job_state):
+        job_state = pickle.loads(job_state)
+        job_state["jobstore"] = self
+        job = Job.__new__(Job)
+        job.__setstate__(job_state)
+        job._scheduler = self._scheduler
+        job._jobstore_alias = self._alias
+        return job
+
+    def _get_jobs(self, where: str = "", params: tuple = ()) -> List:
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT id, job_state FROM {self.tablename} {where} ORDER BY next_run_time", params
+            ).fetchall()
+        jobs = []
+        failed_job_ids = []
+        for job_id, job_state in rows:
+            try:
+                jobs.append(self._reconstitute_job(job_state))
+            except BaseException:
+                self._logger.exception('Unable to restore job "%s" -- removing it', job_id)
+                failed_job_ids.append(job_id)
+        if failed_job_ids:
+            with self._lock, self._db:
+                self._db.executemany(f"DELETE FROM {self.tablename} WHERE id = ?", [(i,) for i in failed_job_ids])
+        return jobs
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} (path={self.path})>"
+
+
+def _create_sweep_tables(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS sweep_runs "
+        "(job_id TEXT, run_key TEXT, started_at TEXT, finished_at TEXT, PRIMARY KEY (job_id, run_key))"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS sweep_checkpoints "
+        "(job_id TEXT, run_key TEXT, user_id TEXT, PRIMARY KEY (job_id, run_key, user_id))"
+    )
+
+
+def unfinished_sweeps(path: str = JOB_STORE_FILE) -> List[Tuple[str, str]]:
+    """(job_id, run_key) of checkpointed runs that started but never finished, oldest first."""
+    conn = _connect(path)
+    try:
+        with conn:
+            _create_sweep_tables(conn)
+        rows = conn.execute(
+            "SELECT job_id, run_key FROM sweep_runs WHERE finished_at IS NULL ORDER BY started_at"
+        ).fetchall()
+    finally:
+        conn.close()
+    return [(job_id, run_key) for job_id, run_key in rows]
+
+
+class SweepCheckpoint:
+    """Per-user progress of one run of a sweep job, persisted as users finish."""
+
+    def __init__(self, job_id: str, run_key: str, path: str = JOB_STORE_FILE):
+        self.job_id = job_id
+        self.run_key = run_key
+        self._lock = threading.Lock()
+        self._conn = _connect(path)
+        with self._lock, self._conn:
+            _create_sweep_tables(self._conn)
+            self._conn.execute(
+                "INSERT OR IGNORE INTO sweep_runs (job_id, run_key, started_at) VALUES (?, ?, ?)",
+                (job_id, run_key, datetime.now().isoformat(timespec="seconds")),
+            )
+
+    @property
+    def finished(self) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT finished_at FROM sweep_runs WHERE job_id = ? AND run_key = ?", (self.job_id, self.run_key)
+            ).fetchone()
+        return bool(row and row[0])
+
+    def done_users(self) -> Set[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user_id FROM sweep_checkpoints WHERE job_id = ? AND run_key = ?", (self.job_id, self.run_key)
+            ).fetchall()
+        return {r[0] for r in rows}
+
+    def mark_done(self, user_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO sweep_checkpoints (job_id, run_key, user_id) VALUES (?, ?, ?)",
+                (self.job_id, self.run_key, user_id),
+            )
+
+    def finish(self) -> None:
+        """Mark the run finished and prune checkpoints of older runs of this job."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE sweep_runs SET finished_at = ? WHERE job_id = ? AND run_key = ?",
+                (datetime.now().isoformat(timespec="seconds"), self.job_id, self.run_key),
+            )
+            stale = self._conn.execute(
+                "SELECT run_key FROM sweep_runs WHERE job_id = ? ORDER BY started_at DESC LIMIT -1 OFFSET ?",
+                (self.job_id, KEEP_RUNS_PER_JOB),
+            ).fetchall()
+            for (run_key,) in stale:
+                self._conn.execute("DELETE FROM sweep_checkpoints WHERE job_id = ? AND run_key = ?", (self.job_id, run_key))
+                self._conn.execute("DELETE FROM sweep_runs WHERE job_id = ? AND run_key = ?", (self.job_id, run_key))
+            # Per-user rows of a finished run are no longer needed
+            self._conn.execute("DELETE FROM sweep_checkpoints WHERE job_id = ? AND run_key = ?", (self.job_id, self.run_key))
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class DirtyUsers:
+    """Watermark and per-user revisit dates of one incremental sweep job."""
+
+    def __init__(self, job_id: str, path: str = JOB_STORE_FILE):
+        self.job_id = job_id
+        self._lock = threading.Lock()
+        self._conn = _connect(path)
+        with self._lock, self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS sweep_watermarks (job_id TEXT PRIMARY KEY, since REAL)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sweep_revisits "
+                "(job_id TEXT, user_id TEXT, due TEXT, PRIMARY KEY (job_id, user_id))"
+            )
+
+    @property
+    def since(self) -> Optional[float]:
+        """Start time (epoch seconds) of the last successful run, None before the first."""
+        with self._lock:
+            row = self._conn.execute("SELECT since FROM sweep_watermarks WHERE job_id = ?", (self.job_id,)).fetchone()
+        return row[0] if row else None
+
+    def due_users(self, today: date) -> Set[str]:
+        """Users whose revisit date is today or earlier."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user_id FROM sweep_revisits WHERE job_id = ? AND due <= ?", (self.job_id, today.isoformat())
+            ).fetchall()
+        return {r[0] for r in rows}
+
+    def revisit(self, user_id: str, due: Optional[date]) -> None:
+        """Set (or clear, with None) the date a user must be swept again even if unchanged."""
+        with self._lock, self._conn:
+            if due is None:
+                self._conn.execute("DELETE FROM sweep_revisits WHERE job_id = ? AND user_id = ?", (self.job_id, user_id))
+            else:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO sweep_revisits (job_id, user_id, due) VALUES (?, ?, ?)",
+                    (self.job_id, user_id, due.isoformat()),
+                )
+
+    def advance(self, since: float) -> None:
+        """Record a successful run that started at `since`."""
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO sweep_watermarks (job_id, since) VALUES (?, ?)", (self.job_id, since))
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class RunHistory:
+    """Bounded history of finished job runs (one JSON metrics record per run)."""
+
+    def __init__(self, path: str = JOB_STORE_FILE):
+        self._conn = _connect(path)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS job_runs "
+                "(id INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT, started_at TEXT, record TEXT)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_job_runs_job_id ON job_runs (job_id, id)")
+
+    def append(self, record: Dict[str, Any]) -> None:
+        job_id = record["job_id"]
+        with self._conn:
+            self._conn.execute(
+                "INSERT INTO job_runs (job_id, started_at, record) VALUES (?, ?, ?)",
+                (job_id, record.get("started_at"), json.dumps(record)),
+            )
+            self._conn.execute(
+                "DELETE FROM job_runs WHERE job_id = ? AND id NOT IN "
+                "(SELECT id FROM job_runs WHERE job_id = ? ORDER BY id DESC LIMIT ?)",
+                (job_id, job_id, KEEP_RUN_HISTORY),
+            )
+
+    def recent(self, job_id: Optional[str] = None, limit: int = 200) -> List[Dict[str, Any]]:
+        """Latest runs first, of one job or of all jobs."""
+        if job_id is None:
+            rows = self._conn.execute("SELECT record FROM job_runs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        else:
+            rows = self._conn.execute(
+                "SELECT record FROM job_runs WHERE job_id = ? ORDER BY id DESC LIMIT ?", (job_id, limit)
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def close(self) -> None:
+        self._conn.close()
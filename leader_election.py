@@ -0,0 +1,143 @@
+"""
+Leader Election
+A storage lease makes exactly one process run the background scheduler.
+"""
+
+import atexit
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+LEADER_LEASE_NAME = "scheduler_leader"
+DEFAULT_LEASE_TTL_SECONDS = 60.0
+DEFAULT_HEARTBEAT_SECONDS = 15.0
+
+
+def lease_ttl() -> float:
+    """Seconds a leader's lease lasts without renewal (SCHEDULER_LEASE_TTL)."""
+    try:
+        return float(os.environ.get("SCHEDULER_LEASE_TTL") or DEFAULT_LEASE_TTL_SECONDS)
+    except ValueError:
+        return DEFAULT_LEASE_TTL_SECONDS
+
+
+def heartbeat_interval() -> float:
+    """Seconds between lease renewals / takeover attempts (SCHEDULER_HEARTBEAT)."""
+    try:
+        return float(os.environ.get("SCHEDULER_HEARTBEAT") or DEFAULT_HEARTBEAT_SECONDS)
+    except ValueError:
+        return DEFAULT_HEARTBEAT_SECONDS
+
+
+def process_id() -> str:
+    """Lease owner id for this process: host, pid and a random suffix."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class LeaderElector:
+    """Heartbeat loop that holds or contends for a storage lease.
+
+    `on_elected` runs when this process becomes leader and `on_demoted` when
+    it stops being one (lease lost or `stop()`); both run on the heartbeat
+    thread.
+    """
+
+    def __init__(
+        self,
+        storage,
+        on_elected: Callable[[], Any],
+        on_demoted: Callable[[], Any],
+        name: str = LEADER_LEASE_NAME,
+        ttl: Optional[float] = None,
+        heartbeat: Optional[float] = None,
+        owner: Optional[str] = None,
+    ):
+        self.storage = storage
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.name = name
+        self.ttl = ttl or lease_ttl()
+        self.heartbeat = heartbeat or heartbeat_interval()
+        if self.heartbeat >= self.ttl:
+            self.heartbeat = self.ttl / 3
+        self.owner = owner or process_id()
+        self.is_leader = False
+        self._renewed_at = 0.0
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> bool:
+        """Make a first attempt synchronously, then keep heartbeating in the background."""
+        self.tick()
+        self._thread = threading.Thread(target=self._run, name=f"leader-{self.name}", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+        return self.is_leader
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.heartbeat):
+            self.tick()
+
+    def tick(self) -> None:
+        """One heartbeat: renew (leader) or try to take over (passive)."""
+        with self._lock:
+            if self._stop.is_set():
+                return
+            try:
+                acquired = self.storage.acquire_lease(self.name, self.owner, self.ttl)
+            except NotImplementedError:
+                # A provider without leases can't coordinate: act as the only process
+                acquired = True
+            except Exception as e:
+                logger.warning(f"Leader lease {self.name}: heartbeat failed: {e}")
+                if self.is_leader and time.monotonic() - self._renewed_at >= self.ttl - self.heartbeat:
+                    self._demote("lease could not be renewed before expiry")
+                return
+            if acquired:
+                self._renewed_at = time.monotonic()
+                if not self.is_leader:
+                    self.is_leader = True
+                    logger.info(f"👑 {self.owner} is now the scheduler leader")
+                    self._safely(self.on_elected)
+            elif self.is_leader:
+                self._demote("lease taken over by another process")
+
+    def _demote(self, reason: str) -> None:
+        self.is_leader = False
+        logger.warning(f"{self.owner} stepped down as scheduler leader: {reason}")
+        self._safely(self.on_demoted)
+
+    def _safely(self, callback: Callable[[], Any]) -> None:
+        try:
+            callback()
+        except Exception as e:
+            logger.exception(f"Leader lease {self.name}: callback failed: {e}")
+
+    def stop(self) -> None:
+        """Stop heartbeating and release the lease so another process takes over at once."""
+        with self._lock:
+            if self._stop.is_set():
+                return
+            self._stop.set()
+            if self.is_leader:
+                self.is_leader = False
+                self._safely(self.on_demoted)
+                try:
+                    self.storage.release_lease(self.name, self.owner)
+                except Exception as e:
+                    logger.warning(f"Leader lease {self.name}: release failed: {e}")
+
+    def status(self) -> Dict[str, Any]:
+        """This process's role plus the current lease record, for the Admin page."""
+        try:
+            lease = self.storage.get_lease(self.name)
+        except Exception:
+            lease = None
+        return {"owner": self.owner, "is_leader": self.is_leader, "lease": lease}
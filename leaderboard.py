@@ -0,0 +1,430 @@
+"""
+Leaderboard Materialization
+One summary row per user (period XP, level, private flag), refreshed on save
+and reconciled by the scheduler, so the Leaderboard tab is a single index read.
+"""
+
+import datetime
+import heapq
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait
+from typing import Dict, Any, List, Optional, Iterable, Tuple, Callable
+
+from xp_timeline import get_xp_timeline, XP_PER_LEVEL
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_PERIODS = ("all_time", "week", "month", "year")
+# Bump when row fields change; older rows are treated as missing and rebuilt.
+ROW_VERSION = 2
+
+# Fan-out settings for scoring users without a stored row.
+DEFAULT_MAX_WORKERS = 8
+# Foreground reads give up on slow documents after this many seconds.
+READ_TIMEOUT_SECONDS = 10
+# Histories with at least this many tracked days are scored in a worker
+# process (when a process pool is enabled) instead of a thread.
+PROCESS_POOL_MIN_DAYS = 1000
+
+# Stale-while-revalidate cache of full standings per period (per process).
+# Older than the TTL: serve anyway and refresh in the background.
+STANDINGS_TTL_SECONDS = 60
+_standings_cache: Dict[str, Dict[str, Any]] = {}
+_standings_lock = threading.Lock()
+_refreshing: set = set()
+
+
+def leaderboard_process_workers() -> int:
+    """Process pool size for reconciliation: setting leaderboard_process_workers (0 = threads only)."""
+    from app_config import get_setting
+    try:
+        return max(int(get_setting("leaderboard_process_workers") or 0), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def period_starts(today: Optional[datetime.date] = None) -> Dict[str, datetime.date]:
+    """First day of the current week (Monday), month and year."""
+    today = today or datetime.date.today()
+    return {
+        "week": today - datetime.timedelta(days=today.weekday()),
+        "month": today.replace(day=1),
+        "year": today.replace(month=1, day=1),
+    }
+
+
+def build_leaderboard_row(data: Dict[str, Any], today: Optional[datetime.date] = None) -> Dict[str, Any]:
+    """Summarize one user's data into a leaderboard row."""
+    today = today or datetime.date.today()
+    timeline = get_xp_timeline(data, today)
+    starts = period_starts(today)
+    total_xp = timeline.total_xp
+    row = {
+        "version": ROW_VERSION,
+        "all_time": total_xp,
+        "level": 1 + (total_xp // XP_PER_LEVEL),
+        "private": bool((data.get("preferences") or {}).get("private_mode")),
+        "email": data.get("email"),
+        "period_starts": {p: d.isoformat() for p, d in starts.items()},
+        "updated_at": datetime.datetime.now().isoformat(),
+    }
+    for period, start in starts.items():
+        row[period] = timeline.period_total(start, today)
+    return row
+
+
+def row_period_xp(row: Dict[str, Any], period: str, today: Optional[datetime.date] = None) -> int:
+    """XP for `period` from a stored row, treating rows from a past period as 0."""
+    if period == "all_time":
+        return row.get("all_time", 0)
+    current_start = period_starts(today)[period].isoformat()
+    if (row.get("period_starts") or {}).get(period) != current_start:
+        return 0
+    return row.get(period, 0)
+
+
+def _load_rows(storage) -> Optional[Dict[str, Dict[str, Any]]]:
+    """Load stored rows, or None if the provider has no leaderboard index."""
+    try:
+        return storage.load_leaderboard_rows()
+    except (AttributeError, NotImplementedError):
+        return None
+    except Exception as e:
+        logger.warning(f"Leaderboard index unavailable: {e}")
+        return None
+
+
+def _save_rows(storage, rows: Dict[str, Dict[str, Any]]) -> None:
+    if not rows:
+        return
+    try:
+        storage.save_leaderboard_rows(rows)
+    except (AttributeError, NotImplementedError):
+        pass
+    except Exception as e:
+        logger.warning(f"Failed to save leaderboard rows: {e}")
+
+
+def update_leaderboard_entry(user_id: str, data: Dict[str, Any], storage) -> None:
+    """Refresh a single user's row after their data changed (never raises)."""
+    try:
+        _save_rows(storage, {user_id: build_leaderboard_row(data)})
+        invalidate_standings()
+    except Exception as e:
+        logger.warning(f"Leaderboard update failed for {user_id}: {e}")
+
+
+def remove_leaderboard_entry(user_id: str, storage) -> None:
+    try:
+        storage.delete_leaderboard_rows([user_id])
+    except (AttributeError, NotImplementedError):
+        pass
+    except Exception as e:
+        logger.warning(f"Failed to remove leaderboard row for {user_id}: {e}")
+
+
+def score_user_data(data: Dict[str, Any], today: datetime.date) -> Dict[str, Any]:
+    """Build a row from already-loaded data (module-level so process pools can pickle it)."""
+    return build_leaderboard_row(data, today)
+
+
+def compute_leaderboard_rows(
+    user_ids: Iterable[str],
+    storage,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    timeout: Optional[float] = None,
+    process_workers: int = 0,
+    fallback_rows: Optional[Dict[str, Dict[str, Any]]] = None,
+    today: Optional[datetime.date] = None,
+) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+    """Load and score users concurrently. Used for backfill and reconciliation.
+
+    Storage reads (network round-trips for Firestore) fan out over a bounded
+    thread pool. With `process_workers` > 0, large histories are scored in a
+    process pool so CPU-bound replay doesn't contend for the GIL.
+
+    Users not finished within `timeout` seconds are returned as stale: their
+    `fallback_rows` entry (marked "stale") is used if present, otherwise they
+    are left out. Returns (rows, stale_user_ids).
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return {}, []
+    today = today or datetime.date.today()
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    process_pool = ProcessPoolExecutor(max_workers=process_workers) if process_workers > 0 else None
+    pool = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(user_ids))), thread_name_prefix="leaderboard")
+
+    def _fetch_and_score(user_id: str) -> Dict[str, Any]:
+        data = storage.load_data(user_id)
+        if process_pool is not None and len(data.get("completions") or {}) >= PROCESS_POOL_MIN_DAYS:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            return process_pool.submit(score_user_data, data, today).result(timeout=remaining)
+        return score_user_data(data, today)
+
+    futures = {pool.submit(_fetch_and_score, user_id): user_id for user_id in user_ids}
+    try:
+        done, not_done = wait(futures, timeout=timeout)
+    finally:
+        # Don't block the caller on stragglers; queued work is cancelled.
+        pool.shutdown(wait=False, cancel_futures=True)
+        if process_pool is not None:
+            process_pool.shutdown(wait=False, cancel_futures=True)
+
+    rows = {}
+    for future in done:
+        user_id = futures[future]
+        try:
+            rows[user_id] = future.result()
+        except Exception as e:
+            logger.error(f"Failed to score {user_id} for leaderboard: {e}")
+
+    stale = sorted(futures[f] for f in not_done)
+    if stale:
+        logger.warning(f"Leaderboard scoring timed out for {len(stale)} user(s); serving partial results")
+        for user_id in stale:
+            if fallback_rows and user_id in fallback_rows:
+                rows[user_id] = dict(fallback_rows[user_id], stale=True)
+    return rows, stale
+
+
+def reconcile_leaderboard(
+    storage,
+    user_ids: Optional[List[str]] = None,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    process_workers: Optional[int] = None,
+) -> int:
+    """Recompute every user's row and drop rows for users that no longer exist.
+
+    `process_workers` defaults to `leaderboard_process_workers()`. Returns
+    the number of rows written.
+    """
+    if user_ids is None:
+        user_ids = storage.list_users() or []
+    if process_workers is None:
+        process_workers = leaderboard_process_workers()
+    rows, _ = compute_leaderboard_rows(user_ids, storage, max_workers=max_workers, process_workers=process_workers)
+    _save_rows(storage, rows)
+    stored = _load_rows(storage) or {}
+    orphans = [u for u in stored if u not in set(user_ids)]
+    if orphans:
+        try:
+            storage.delete_leaderboard_rows(orphans)
+        except (AttributeError, NotImplementedError):
+            pass
+    logger.info(f"Leaderboard reconciled: {len(rows)} rows, {len(orphans)} removed")
+    return len(rows)
+
+
+def load_leaderboard_rows(
+    storage,
+    user_ids: List[str],
+    timeout: Optional[float] = READ_TIMEOUT_SECONDS,
+    today: Optional[datetime.date] = None,
+) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+    """Return rows for `user_ids`, backfilling any that are missing from the index.
+
+    Backfill runs concurrently and stops waiting after `timeout` seconds;
+    returns (rows, stale_user_ids) so callers can flag partial standings.
+    """
+    stored = _load_rows(storage)
+    known = set(user_ids)
+    rows = {}
+    outdated = {}
+    for user_id, row in (stored or {}).items():
+        if user_id not in known:
+            continue
+        if row.get("version") == ROW_VERSION:
+            rows[user_id] = row
+        else:
+            outdated[user_id] = row
+    missing = [u for u in user_ids if u not in rows]
+    stale = []
+    if missing:
+        backfill, stale = compute_leaderboard_rows(missing, storage, timeout=timeout, fallback_rows=outdated, today=today)
+        if stored is not None:
+            _save_rows(storage, {u: r for u, r in backfill.items() if not r.get("stale")})
+        rows.update(backfill)
+    return rows, stale
+
+
+def _ranked_entries(period: str, rows: Dict[str, Dict[str, Any]], today: datetime.date) -> List[tuple]:
+    """(user_id, xp, row) for public users; ordering is XP desc, then user id."""
+    return [
+        (user_id, row_period_xp(row, period, today), row)
+        for user_id, row in rows.items()
+        if not row.get("private")
+    ]
+
+
+def _sort_key(entry: tuple) -> tuple:
+    return (-entry[1], entry[0])
+
+
+def _display_entry(rank: int, entry: tuple) -> Dict[str, Any]:
+    user_id, xp, row = entry
+    return {
+        "rank": rank,
+        "user_id": user_id,
+        "xp": xp,
+        "level": 1 + (xp // XP_PER_LEVEL),
+        "level_progress": (xp % XP_PER_LEVEL) / XP_PER_LEVEL,
+        "email": row.get("email"),
+        "stale": bool(row.get("stale")),
+    }
+
+
+def _page_result(
+    period: str,
+    entries: List[tuple],
+    top: List[tuple],
+    limit: Optional[int],
+    offset: int,
+    viewer_entry: Optional[Dict[str, Any]],
+    stale: List[str],
+) -> Dict[str, Any]:
+    xp_values = [e[1] for e in entries]
+    total = len(entries)
+    return {
+        "period": period,
+        "entries": [_display_entry(offset + i + 1, e) for i, e in enumerate(top[offset:])],
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "top_xp": max(xp_values, default=0),
+        "average_xp": sum(xp_values) // total if total else 0,
+        "viewer": viewer_entry,
+        # Users still being scored when the read timed out (standings may be incomplete)
+        "stale_users": stale,
+    }
+
+
+def get_leaderboard_page(
+    period: str,
+    storage,
+    user_ids: List[str],
+    limit: Optional[int] = 10,
+    offset: int = 0,
+    viewer: Optional[str] = None,
+    today: Optional[datetime.date] = None,
+    timeout: Optional[float] = READ_TIMEOUT_SECONDS,
+) -> Dict[str, Any]:
+    """Return one page of standings with display fields precomputed.
+
+    Only the top `offset + limit` entries are ordered (heap selection), so
+    rendering costs O(page size) rather than a load per user. `viewer`, if
+    given, gets their own rank even when it falls outside the page.
+    `timeout` bounds the backfill of missing rows (None: wait for all).
+    """
+    today = today or datetime.date.today()
+    rows, stale = load_leaderboard_rows(storage, user_ids, timeout=timeout, today=today)
+    entries = _ranked_entries(period, rows, today)
+    offset = max(offset, 0)
+    if limit is None:
+        top = sorted(entries, key=_sort_key)
+    else:
+        top = heapq.nsmallest(offset + limit, entries, key=_sort_key)
+
+    viewer_entry = None
+    if viewer is not None:
+        mine = next((e for e in entries if e[0] == viewer), None)
+        if mine is not None:
+            ahead = sum(1 for e in entries if _sort_key(e) < _sort_key(mine))
+            viewer_entry = _display_entry(ahead + 1, mine)
+
+    return _page_result(period, entries, top, limit, offset, viewer_entry, stale)
+
+
+def get_leaderboard(period: str, storage, user_ids: List[str], limit: Optional[int] = None, offset: int = 0, **options: Any) -> List[tuple]:
+    """Return (user_id, xp) for public users sorted by XP descending (`options` as for get_leaderboard_page)."""
+    page = get_leaderboard_page(period, storage, user_ids, limit=limit, offset=offset, **options)
+    return [(e["user_id"], e["xp"]) for e in page["entries"]]
+
+
+# --- Cached standings (stale-while-revalidate) ---
+
+def refresh_standings(period: str, storage, user_ids_fn: Callable[[], List[str]]) -> Dict[str, Any]:
+    """Recompute the full sorted standings for `period` and store them in the cache."""
+    try:
+        rows, stale = load_leaderboard_rows(storage, list(user_ids_fn()))
+        entries = sorted(_ranked_entries(period, rows, datetime.date.today()), key=_sort_key)
+        standings = {
+            "period": period,
+            "entries": entries,
+            "ranks": {e[0]: i + 1 for i, e in enumerate(entries)},
+            "stale_users": stale,
+            "computed_at": time.time(),
+        }
+        with _standings_lock:
+            _standings_cache[period] = standings
+        return standings
+    finally:
+        with _standings_lock:
+            _refreshing.discard(period)
+
+
+def _schedule_refresh(period: str, storage, user_ids_fn: Callable[[], List[str]]) -> None:
+    """Queue a background refresh on the app scheduler (thread fallback)."""
+    try:
+        import scheduler_service
+        if scheduler_service.run_job_now(refresh_standings, f"leaderboard_refresh_{period}", args=[period, storage, user_ids_fn]):
+            return
+    except Exception as e:
+        logger.warning(f"Could not queue leaderboard refresh on scheduler: {e}")
+    threading.Thread(target=refresh_standings, args=(period, storage, user_ids_fn), daemon=True).start()
+
+
+def get_cached_standings(
+    period: str,
+    storage,
+    user_ids_fn: Callable[[], List[str]],
+    ttl: float = STANDINGS_TTL_SECONDS,
+    force: bool = False,
+) -> Dict[str, Any]:
+    """Serve the last computed standings immediately; revalidate in the background when older than `ttl`.
+
+    The very first request for a period (or `force=True`) computes inline.
+    """
+    with _standings_lock:
+        cached = _standings_cache.get(period)
+        expired = cached is not None and (cached.get("stale") or time.time() - cached["computed_at"] > ttl)
+        start_refresh = expired and not force and period not in _refreshing
+        if start_refresh:
+            _refreshing.add(period)
+    if cached is None or force:
+        return refresh_standings(period, storage, user_ids_fn)
+    if start_refresh:
+        _schedule_refresh(period, storage, user_ids_fn)
+    return cached
+
+
+def invalidate_standings() -> None:
+    """Mark cached standings expired so the next read revalidates them.
+
+    `computed_at` is kept: the stale standings are still served (with their
+    real age) while the refresh runs.
+    """
+    with _standings_lock:
+        for standings in _standings_cache.values():
+            standings["stale"] = True
+
+
+def page_from_standings(
+    standings: Dict[str, Any],
+    limit: Optional[int] = 10,
+    offset: int = 0,
+    viewer: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Slice a page out of cached standings; the viewer's rank is a dict lookup."""
+    entries = standings["entries"]
+    offset = max(offset, 0)
+    top = entries if limit is None else entries[:offset + limit]
+    viewer_entry = None
+    rank = standings["ranks"].get(viewer) if viewer is not None else None
+    if rank is not None:
+        viewer_entry = _display_entry(rank, entries[rank - 1])
+    page = _page_result(standings["period"], entries, top, limit, offset, viewer_entry, standings["stale_users"])
+    page["computed_at"] = standings["computed_at"]
+    return page
@@ -7,9 +7,11 @@ Responses in style of Thug Kitchen Cookbook meets the movie Heathers, but warm u
 
 import json
 import os
+import threading
 from datetime import datetime
 from typing import Dict, List, Optional, Any
 from storage import get_storage
+from job_context import UserSnapshot
 from email_utils import send_email
 from coaching_emails import (
     generate_streak_celebration,
@@ -21,44 +23,50 @@ from coaching_emails import (
 
 NOTIFICATIONS_FILE = "notifications_history.json"
 
+# Scheduler jobs notify users from a worker pool; serialize history read-modify-writes
+_history_lock = threading.RLock()
+
 
 def load_notifications_history() -> Dict[str, List[Dict]]:
     """Load notification history."""
-    if not os.path.exists(NOTIFICATIONS_FILE):
-        return {}
-    
-    try:
-        with open(NOTIFICATIONS_FILE, 'r') as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"Error loading notifications: {e}")
-        return {}
+    with _history_lock:
+        if not os.path.exists(NOTIFICATIONS_FILE):
+            return {}
+        
+        try:
+            with open(NOTIFICATIONS_FILE, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error loading notifications: {e}")
+            return {}
 
 
 def save_notifications_history(history: Dict[str, List[Dict]]) -> None:
     """Save notification history."""
-    try:
-        with open(NOTIFICATIONS_FILE, 'w') as f:
-            json.dump(history, f, indent=2)
-    except Exception as e:
-        print(f"Error saving notifications: {e}")
+    with _history_lock:
+        try:
+            with open(NOTIFICATIONS_FILE, 'w') as f:
+                json.dump(history, f, indent=2)
+        except Exception as e:
+            print(f"Error saving notifications: {e}")
 
 
 def add_notification_record(user_id: str, notification_type: str, data: Dict) -> None:
     """Record that a notification was sent."""
-    history = load_notifications_history()
-    
-    if user_id not in history:
-        history[user_id] = []
-    
     record = {
         "type": notification_type,
         "timestamp": datetime.now().isoformat(),
         "data": data
     }
     
-    history[user_id].append(record)
-    save_notifications_history(history)
+    with _history_lock:
+        history = load_notifications_history()
+        
+        if user_id not in history:
+            history[user_id] = []
+        
+        history[user_id].append(record)
+        save_notifications_history(history)
 
 
 def has_recent_notification(user_id: str, notification_type: str, hours_back: int = 24) -> bool:
@@ -84,7 +92,7 @@ def has_recent_notification(user_id: str, notification_type: str, hours_back: in
     return False
 
 
-def send_notification_email(user_id: str, subject: str, body: str, notification_type: str = None) -> bool:
+def send_notification_email(user_id: str, subject: str, body: str, notification_type: str = None, snapshot: Optional[UserSnapshot] = None) -> bool:
     """
     Send a notification email.
     
@@ -93,18 +101,23 @@ def send_notification_email(user_id: str, subject: str, body: str, notification_
         subject: Email subject
         body: Email body
         notification_type: Type of notification (for history tracking)
+        snapshot: User record already loaded by a scheduler job (skips the storage reads)
     
     Returns:
         True if sent successfully
     """
-    storage = get_storage()
+    if snapshot is not None:
+        enabled = snapshot.notifications_enabled
+    else:
+        storage = get_storage()
+        enabled = storage.get_notifications_enabled(user_id)
     
     # Check if notifications are enabled for this user
-    if not storage.get_notifications_enabled(user_id):
+    if not enabled:
         print(f"Notifications disabled for {user_id}, skipping")
         return False
     
-    email = storage.get_user_email(user_id)
+    email = snapshot.email if snapshot is not None else storage.get_user_email(user_id)
     
     if not email:
         print(f"No email on file for {user_id}, skipping notification")
@@ -123,7 +136,7 @@ def send_notification_email(user_id: str, subject: str, body: str, notification_
     return success
 
 
-def notify_streak_milestone(user_id: str, habit_name: str, streak: int, xp_earned: int) -> bool:
+def notify_streak_milestone(user_id: str, habit_name: str, streak: int, xp_earned: int, snapshot: Optional[UserSnapshot] = None) -> bool:
     """
     Send streak milestone notification.
     
@@ -132,6 +145,7 @@ def notify_streak_milestone(user_id: str, habit_name: str, streak: int, xp_earne
         habit_name: Name of habit
         streak: Current streak
         xp_earned: XP earned
+        snapshot: User record already loaded by a scheduler job
     
     Returns:
         True if sent
@@ -157,10 +171,10 @@ Best regards,
 Your XP Tracker Coach
 """
     
-    return send_notification_email(user_id, subject, body, f"streak_{streak}")
+    return send_notification_email(user_id, subject, body, f"streak_{streak}", snapshot=snapshot)
 
 
-def notify_missed_day(user_id: str, habit_name: str, days_missed: int, last_streak: int) -> bool:
+def notify_missed_day(user_id: str, habit_name: str, days_missed: int, last_streak: int, snapshot: Optional[UserSnapshot] = None) -> bool:
     """
     Send encouragement after missed day.
     
@@ -169,6 +183,7 @@ def notify_missed_day(user_id: str, habit_name: str, days_missed: int, last_stre
         habit_name: Name of habit
         days_missed: Days missed
         last_streak: Previous streak
+        snapshot: User record already loaded by a scheduler job
     
     Returns:
         True if sent
@@ -194,10 +209,10 @@ Get back in there,
 Your XP Tracker Coach
 """
     
-    return send_notification_email(user_id, subject, body, f"missed_{habit_name}")
+    return send_notification_email(user_id, subject, body, f"missed_{habit_name}", snapshot=snapshot)
 
 
-def notify_level_up(user_id: str, new_level: int, total_xp: int) -> bool:
+def notify_level_up(user_id: str, new_level: int, total_xp: int, snapshot: Optional[UserSnapshot] = None) -> bool:
     """
     Send level up notification.
     
@@ -205,6 +220,7 @@ def notify_level_up(user_id: str, new_level: int, total_xp: int) -> bool:
         user_id: Username
         new_level: New level achieved
         total_xp: Total XP
+        snapshot: User record already loaded by a scheduler job
     
     Returns:
         True if sent
@@ -227,10 +243,10 @@ Best regards,
 Your XP Tracker Coach
 """
     
-    return send_notification_email(user_id, subject, body, f"level_{new_level}")
+    return send_notification_email(user_id, subject, body, f"level_{new_level}", snapshot=snapshot)
 
 
-def notify_badge_earned(user_id: str, badge_name: str, badge_description: str) -> bool:
+def notify_badge_earned(user_id: str, badge_name: str, badge_description: str, snapshot: Optional[UserSnapshot] = None) -> bool:
     """
     Send badge earned notification.
     
@@ -238,6 +254,7 @@ def notify_badge_earned(user_id: str, badge_name: str, badge_description: str) -
         user_id: Username
         badge_name: Name of badge
         badge_description: Description
+        snapshot: User record already loaded by a scheduler job
     
     Returns:
         True if sent
@@ -260,10 +277,10 @@ Best regards,
 Your XP Tracker Coach
 """
     
-    return send_notification_email(user_id, subject, body, f"badge_{badge_name}")
+    return send_notification_email(user_id, subject, body, f"badge_{badge_name}", snapshot=snapshot)
 
 
-def notify_weekly_summary(user_id: str, completed_count: int, total_habits: int, xp_earned: int, top_habit: str = None) -> bool:
+def notify_weekly_summary(user_id: str, completed_count: int, total_habits: int, xp_earned: int, top_habit: str = None, snapshot: Optional[UserSnapshot] = None) -> bool:
     """
     Send weekly summary notification.
     
@@ -273,6 +290,7 @@ def notify_weekly_summary(user_id: str, completed_count: int, total_habits: int,
         total_habits: Total habits
         xp_earned: XP earned this week
         top_habit: Best performing habit
+        snapshot: User record already loaded by a scheduler job
     
     Returns:
         True if sent
@@ -300,16 +318,17 @@ See you next week,
 Your XP Tracker Coach
 """
     
-    return send_notification_email(user_id, subject, body, "weekly_summary")
+    return send_notification_email(user_id, subject, body, "weekly_summary", snapshot=snapshot)
 
 
-def notify_personalized_coaching(user_id: str, context: Dict[str, Any]) -> bool:
+def notify_personalized_coaching(user_id: str, context: Dict[str, Any], snapshot: Optional[UserSnapshot] = None) -> bool:
     """
     Send fully personalized coaching email.
     
     Args:
         user_id: Username
         context: User's current data/context
+        snapshot: User record already loaded by a scheduler job
     
     Returns:
         True if sent
@@ -338,10 +357,10 @@ Best regards,
 Your XP Tracker Coach
 """
     
-    return send_notification_email(user_id, subject, body, "personalized_coaching")
+    return send_notification_email(user_id, subject, body, "personalized_coaching", snapshot=snapshot)
 
 
-def notify_habit_completed(user_id: str, habit_name: str, xp_earned: int, current_streak: int) -> bool:
+def notify_habit_completed(user_id: str, habit_name: str, xp_earned: int, current_streak: int, snapshot: Optional[UserSnapshot] = None) -> bool:
     """
     Send celebration email when habit is marked complete.
     
@@ -350,6 +369,7 @@ def notify_habit_completed(user_id: str, habit_name: str, xp_earned: int, curren
         habit_name: Name of completed habit
         xp_earned: XP earned from this completion
         current_streak: Current streak after completion
+        snapshot: User record already loaded by a scheduler job
     
     Returns:
         True if sent successfully
@@ -381,7 +401,7 @@ Best regards,
 Your XP Tracker Coach
 """
     
-    return send_notification_email(user_id, subject, body, f"habit_complete_{habit_name}")
+    return send_notification_email(user_id, subject, body, f"habit_complete_{habit_name}", snapshot=snapshot)
 
 
 def get_user_notification_history(user_id: str, limit: int = 10) -> List[Dict]:
@@ -7,6 +7,8 @@ This data is adjustable later as habits evolve.
 import streamlit as st
 from typing import Dict, Any, Optional
 from storage import get_storage
+# Re-exported: the non-UI profile helpers live in coaching_profile (no Streamlit import)
+from coaching_profile import get_coaching_profile, has_completed_onboarding, calculate_days_since_signup
 
 # Timezone choices (label, tzid)
 TIMEZONE_CHOICES = [
@@ -185,23 +187,6 @@ def save_onboarding_profile(user_id: str, responses: Dict[str, Any]) -> bool:
         return False
 
 
-def get_coaching_profile(user_id: str) -> Dict[str, Any]:
-    """Retrieve user's coaching profile."""
-    try:
-        storage = get_storage()
-        data = storage.load_data(user_id)
-        return data.get('coaching_profile', {})
-    except Exception as e:
-        print(f"Error loading coaching profile: {e}")
-        return {}
-
-
-def has_completed_onboarding(user_id: str) -> bool:
-    """Check if user has completed onboarding."""
-    profile = get_coaching_profile(user_id)
-    return profile.get('onboarding_complete', False)
-
-
 def show_profile_editor(user_id: str) -> bool:
     """Show editable coaching profile in Profile tab. Returns True if saved."""
     profile = get_coaching_profile(user_id)
@@ -341,22 +326,3 @@ def get_habit_info(user_id: str, habit_name: str) -> Optional[Dict[str, Any]]:
         return habits.get(habit_name, {})
     except:
         return None
-
-
-def calculate_days_since_signup(user_id: str) -> int:
-    """Calculate days since user first created an account or first tracked."""
-    try:
-        import datetime
-        storage = get_storage()
-        data = storage.load_data(user_id)
-        completions = data.get('completions', {})
-        
-        if not completions:
-            return 0
-        
-        first_date = min(completions.keys())
-        first = datetime.datetime.fromisoformat(first_date).date()
-        today = datetime.date.today()
-        return (today - first).days
-    except:
-        return 0
@@ -7,18 +7,27 @@ imports. It uses the storage provider to load per-user data and computes
 minimal statistics required for notifications.
 """
 
+import argparse
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, Any, Tuple, List
+import os
+import signal
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, Tuple, List, Optional
 
 try:
     from apscheduler.schedulers.background import BackgroundScheduler
     from apscheduler.triggers.cron import CronTrigger
+    from apscheduler.jobstores.memory import MemoryJobStore
 except Exception:
     BackgroundScheduler = None
     CronTrigger = None
+    MemoryJobStore = None
 
 from storage import get_storage
+from job_context import JobRun, UserSnapshot, active_runs, cancel_runs
+from job_metrics import tracked_job, load_history
+from xp_timeline import get_xp_timeline, perfect_day_flags, PERFECT_DAY_BONUS
 from notifications import (
     notify_weekly_summary,
     notify_streak_milestone,
@@ -29,15 +38,24 @@ from notifications import (
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Global scheduler instance
+# Global scheduler instance (only started in the leader process)
 _scheduler = None
+_elector = None
 
+# Recurring jobs live in a SQLite job store so their next run times survive
+# restarts; a run missed while the process was down is caught up on start if
+# it is less than this late, and several missed runs coalesce into one.
+MISFIRE_GRACE_SECONDS = 3600
 
-def compute_stats(data: Dict[str, Any]) -> Tuple[int, Dict[str, Dict[str, Any]], List[str]]:
-    """Compute lightweight stats from a user's data.
+MILESTONE_STREAKS = [5, 10, 20, 30, 50, 100]
+
+
+def compute_stats(data: Dict[str, Any], today: Optional[date] = None) -> Tuple[int, Dict[str, Dict[str, Any]], List[str]]:
+    """Compute lightweight stats from a user's data (as of `today`, default: today).
 
     Returns (global_xp, habit_stats, earned_badges)
     """
+    today = today or datetime.today().date()
     habits = data.get("habits", {})
     completions = data.get("completions", {})
 
@@ -51,8 +69,9 @@ def compute_stats(data: Dict[str, Any]) -> Tuple[int, Dict[str, Dict[str, Any]],
 
     if all_dates:
         start_date = datetime.fromisoformat(all_dates[0]).date()
-        end_date = datetime.today().date()
+        end_date = today
         delta_days = (end_date - start_date).days
+        perfect_days = perfect_day_flags(habits, completions, start_date, delta_days + 1)
         for i in range(delta_days + 1):
             d = (start_date + timedelta(days=i)).isoformat()
             days_completed = completions.get(d, [])
@@ -72,15 +91,12 @@ def compute_stats(data: Dict[str, Any]) -> Tuple[int, Dict[str, Dict[str, Any]],
                 else:
                     temp_streaks[habit] = 0
 
-            # perfect day check
-            active_habit_names = {h for h, d in habits.items() if d.get("active", True)}
-            completed_set = set(days_completed)
-            if active_habit_names and active_habit_names.issubset(completed_set):
-                global_xp += 50
+            # perfect day check (bitmask of habits active that day)
+            if perfect_days[i]:
+                global_xp += PERFECT_DAY_BONUS
                 perfect_days_count += 1
 
     # display streak calculation (backward check)
-    today = datetime.today().date()
     for habit in habits:
         streak = 0
         check_date = today
@@ -116,7 +132,12 @@ def get_scheduler():
         logger.warning("APScheduler not available. Scheduler disabled.")
         return None
     if _scheduler is None:
-        _scheduler = BackgroundScheduler()
+        from job_store import SQLiteJobStore, JOB_STORE_FILE
+        _scheduler = BackgroundScheduler(
+            # One-off jobs (run_job_now) may carry unpicklable args, so they stay in memory
+            jobstores={"default": SQLiteJobStore(JOB_STORE_FILE), "memory": MemoryJobStore()},
+            job_defaults={"coalesce": True, "misfire_grace_time": MISFIRE_GRACE_SECONDS, "max_instances": 1},
+        )
         _scheduler.start()
         logger.info("🎯 Background Scheduler Started")
     return _scheduler
@@ -126,93 +147,173 @@ def stop_scheduler():
     """Stop the background scheduler."""
     global _scheduler
     if _scheduler and _scheduler.running:
+        # Running sweeps stop between users instead of holding up shutdown; the next
+        # scheduler to start (here or on the new leader) resumes them under the same run key
+        cancel_runs()
         _scheduler.shutdown()
         _scheduler = None
         logger.info("⏹️ Background Scheduler Stopped")
 
 
-def job_weekly_summary():
-    """Send weekly summary to all users."""
+def run_job_now(func, job_id: str, args=None, kwargs=None) -> bool:
+    """Run a one-off job on the background scheduler as soon as possible.
+
+    Returns False if the scheduler is unavailable (or this process is not
+    the leader and runs no scheduler) so callers can fall back.
+    """
+    scheduler = _scheduler
+    if scheduler is None or not scheduler.running:
+        return False
+    scheduler.add_job(func, id=job_id, args=args or [], kwargs=kwargs or {}, replace_existing=True, jobstore="memory")
+    return True
+
+
+# Checkpointed jobs keyed by ISO week instead of by day
+WEEKLY_RUN_KEYS = {"weekly_summary"}
+
+
+def _last_fire_time(job_id: str, now: Optional[datetime] = None) -> Optional[datetime]:
+    """Latest scheduled fire time of a recurring job at or before `now` (None if unknown)."""
+    if CronTrigger is None:
+        return None
+    trigger = next((t for _, t, j, _ in _job_definitions() if j == job_id), None)
+    if trigger is None:
+        return None
+    now = now.astimezone(trigger.timezone) if now is not None else datetime.now(trigger.timezone)
+    # Every checkpointed job fires at least weekly
+    fire, last = trigger.get_next_fire_time(None, now - timedelta(days=8)), None
+    while fire is not None and fire <= now:
+        last, fire = fire, trigger.get_next_fire_time(fire, fire + timedelta(seconds=1))
+    return last
+
+
+def _run_key(job_id: str, now: Optional[datetime] = None) -> str:
+    """Checkpoint key of a job's current run: the day (or ISO week) of its latest scheduled fire time.
+
+    Keying on the fire time rather than the clock keeps a late run (or a
+    resumed one after midnight) on the same key as the run it belongs to.
+    """
+    fire = _last_fire_time(job_id, now)
+    day = fire.date() if fire is not None else (now or datetime.now()).date()
+    if job_id in WEEKLY_RUN_KEYS:
+        year, week, _ = day.isocalendar()
+        return f"{year}-W{week:02d}"
+    return day.isoformat()
+
+
+@tracked_job("weekly_summary")
+def job_weekly_summary(checkpoint: bool = False, run_key: Optional[str] = None):
+    """Send weekly summary to all users.
+
+    With `checkpoint` (scheduled runs), progress is saved per user so an
+    interrupted run resumes where it stopped (`run_key` picks the run to resume).
+    """
     logger.info("📊 Running weekly summary job...")
-    storage = get_storage()
-    users = storage.list_users() or []
-    if not users:
+    run = JobRun("weekly_summary", run_key=run_key or (_run_key("weekly_summary") if checkpoint else None))
+    # This week's totals come straight from the XP timeline prefix sums
+    today = run.today
+    week_start = today - timedelta(days=today.weekday())
+
+    def _summarize(user: UserSnapshot) -> bool:
+        if not user.email:
+            return False
+
+        user_data = user.data
+        global_xp, habit_stats, earned_badges = compute_stats(user_data)
+        timeline = get_xp_timeline(user_data, today)
+        week_xp = timeline.period_total(week_start, today)
+        completed_count = timeline.series_total("completions", week_start, today)
+        total_habits = len(user_data.get("habits", {}))
+        top_habit = None
+        top_habit_completions = 0
+        for h, s in habit_stats.items():
+            if s.get("completions", 0) > top_habit_completions:
+                top_habit_completions = s.get("completions", 0)
+                top_habit = h
+
+        notify_weekly_summary(user.user_id, completed_count, total_habits, week_xp, top_habit, snapshot=user)
+        logger.info(f"Weekly summary queued for {user.user_id}")
+        return True
+
+    run.sweep(_summarize)
+    if not run.users_scanned:
         logger.info("No users to notify")
-        return
 
-    for user_id in users:
-        try:
-            user_email = storage.get_user_email(user_id)
-            if not user_email:
-                continue
-
-            user_data = storage.load_data(user_id)
-            global_xp, habit_stats, earned_badges = compute_stats(user_data)
-            completed_count = sum(s.get("completions", 0) for s in habit_stats.values())
-            total_habits = len(user_data.get("habits", {}))
-            top_habit = None
-            top_habit_completions = 0
-            for h, s in habit_stats.items():
-                if s.get("completions", 0) > top_habit_completions:
-                    top_habit_completions = s.get("completions", 0)
-                    top_habit = h
-
-            notify_weekly_summary(user_id, completed_count, total_habits, global_xp, top_habit)
-            logger.info(f"Weekly summary queued for {user_id}")
-        except Exception as e:
-            logger.error(f"Error preparing weekly summary for {user_id}: {e}")
-
-
-def job_daily_reminder():
+
+@tracked_job("daily_reminder")
+def job_daily_reminder(checkpoint: bool = False, run_key: Optional[str] = None):
     """Daily reminder to users who haven't completed today's habits."""
     logger.info("⏰ Running daily reminder job...")
-    storage = get_storage()
-    users = storage.list_users() or []
-    today_str = datetime.now().date().isoformat()
-
-    for user_id in users:
-        try:
-            user_email = storage.get_user_email(user_id)
-            if not user_email:
-                continue
-
-            user_data = storage.load_data(user_id)
-            completed_today = set(user_data.get("completions", {}).get(today_str, []))
-            active_habits = {h: d for h, d in user_data.get("habits", {}).items() if d.get("active", True)}
-            incomplete_habits = [h for h in active_habits.keys() if h not in completed_today]
-            if incomplete_habits:
-                # For now, we only log; a future improvement could send reminder emails.
-                logger.info(f"User {user_id} has {len(incomplete_habits)} incomplete habits today")
-        except Exception as e:
-            logger.error(f"Error in daily reminder for {user_id}: {e}")
-
-
-def job_streak_checks():
-    """Check for streak milestones and send celebrations."""
-    logger.info("🔥 Running streak milestone checks...")
-    storage = get_storage()
-    users = storage.list_users() or []
-    milestone_streaks = [5, 10, 20, 30, 50, 100]
+    run = JobRun("daily_reminder", run_key=run_key or (_run_key("daily_reminder") if checkpoint else None))
+    today_str = run.today.isoformat()
+
+    def _remind(user: UserSnapshot) -> int:
+        if not user.email:
+            return 0
+
+        user_data = user.data
+        completed_today = set(user_data.get("completions", {}).get(today_str, []))
+        active_habits = {h: d for h, d in user_data.get("habits", {}).items() if d.get("active", True)}
+        incomplete_habits = [h for h in active_habits.keys() if h not in completed_today]
+        if incomplete_habits:
+            # For now, we only log; a future improvement could send reminder emails.
+            logger.info(f"User {user.user_id} has {len(incomplete_habits)} incomplete habits today")
+        return len(incomplete_habits)
+
+    run.sweep(_remind)
+
+
+def _check_streak_milestones(user: UserSnapshot) -> List[Tuple[str, int]]:
+    """Notify one user's streak milestones; returns (habit, streak) for each one hit."""
+    if not user.email:
+        return []
+
+    user_data = user.data
+    global_xp, habit_stats, earned_badges = compute_stats(user_data)
+    hit = []
+    for habit_name, stats in habit_stats.items():
+        current_streak = stats.get("streak", 0)
+        if current_streak in MILESTONE_STREAKS:
+            habit_xp = user_data.get("habits", {}).get(habit_name, {}).get("xp", 10)
+            notify_streak_milestone(user.user_id, habit_name, current_streak, habit_xp, snapshot=user)
+            hit.append((habit_name, current_streak))
+    return hit
+
+
+def _next_streak_rollover(data: Dict[str, Any], today: date) -> Optional[date]:
+    """First day after `today` with a check-in already recorded, if any.
+
+    Streaks count back from the run day, so with unchanged data a later run
+    can only see a streak (and a milestone) on a day that already has a
+    check-in; everyone else needs no visit until their data changes.
+    """
+    later = [d for d in data.get("completions", {}) if d > today.isoformat()]
+    return datetime.fromisoformat(min(later)).date() if later else None
+
+
+@tracked_job("streak_checks")
+def job_streak_checks(checkpoint: bool = False, incremental: bool = False, run_key: Optional[str] = None):
+    """Check for streak milestones and send celebrations.
 
-    for user_id in users:
-        try:
-            user_email = storage.get_user_email(user_id)
-            if not user_email:
-                continue
+    With `incremental` (scheduled runs), only users whose data changed since
+    the last run, or who have a check-in dated for today, are loaded.
+    """
+    logger.info("🔥 Running streak milestone checks...")
+    run_key = run_key or (_run_key("streak_checks") if checkpoint else None)
+    run = JobRun("streak_checks", run_key=run_key, incremental=incremental)
 
-            user_data = storage.load_data(user_id)
-            global_xp, habit_stats, earned_badges = compute_stats(user_data)
+    def _check(user: UserSnapshot) -> List[Tuple[str, int]]:
+        hit = _check_streak_milestones(user)
+        run.revisit(user.user_id, _next_streak_rollover(user.data, run.today))
+        return hit
 
-            for habit_name, stats in habit_stats.items():
-                current_streak = stats.get("streak", 0)
-                if current_streak in milestone_streaks:
-                    habit_xp = user_data.get("habits", {}).get(habit_name, {}).get("xp", 10)
-                    notify_streak_milestone(user_id, habit_name, current_streak, habit_xp)
-                    logger.info(f"Streak milestone: {user_id} {habit_name} -> {current_streak}")
-        except Exception as e:
-            logger.error(f"Error checking streaks for {user_id}: {e}")
+    results = run.sweep(_check)
+    for result in results:
+        for habit_name, streak in result["value"] or []:
+            logger.info(f"Streak milestone: {result['user_id']} {habit_name} -> {streak}")
 
 
+@tracked_job("drip_campaigns")
 def job_drip_campaigns():
     """Process pending drip campaign emails."""
     logger.info("📧 Running drip campaign job...")
@@ -223,44 +324,255 @@ def job_drip_campaigns():
         logger.exception(f"Error in drip campaigns job: {e}")
 
 
-def schedule_jobs():
-    """Schedule all automated notification jobs."""
-    scheduler = get_scheduler()
-    if scheduler is None:
-        return
+@tracked_job("daily_digests")
+def job_daily_digests():
+    """Send daily digests to the users whose local digest time falls in this slot."""
+    try:
+        from daily_digest import dispatch_due_digests
+        dispatch_due_digests()
+    except Exception as e:
+        logger.exception(f"Error in daily digest dispatch job: {e}")
+
 
-    # remove existing jobs
+@tracked_job("leaderboard_reconcile")
+def job_leaderboard_reconcile():
+    """Recompute every materialized leaderboard row (catches missed writes and period rollovers)."""
+    logger.info("🏆 Running leaderboard reconciliation...")
     try:
-        scheduler.remove_all_jobs()
-    except Exception:
-        pass
+        from leaderboard import reconcile_leaderboard
+        reconcile_leaderboard(get_storage())
+    except Exception as e:
+        logger.exception(f"Error in leaderboard reconciliation job: {e}")
 
-    # daily reminder at 7:00
-    if CronTrigger:
-        scheduler.add_job(job_daily_reminder, CronTrigger(hour=7, minute=0), id="daily_reminder", replace_existing=True)
+
+@tracked_job("stats_snapshots")
+def job_stats_snapshots(checkpoint: bool = False, incremental: bool = False, run_key: Optional[str] = None):
+    """Append last week's stats snapshot for every user (and rebuild any invalidated ones).
+
+    With `incremental`, users with unchanged data are only visited on Mondays,
+    when a new week's snapshot is due.
+    """
+    logger.info("📸 Running stats snapshot job...")
+    from stats_snapshots import refresh_snapshots, SNAPSHOTS_KEY
+    run_key = run_key or (_run_key("stats_snapshots") if checkpoint else None)
+    run = JobRun("stats_snapshots", run_key=run_key, incremental=incremental)
+    next_monday = run.today + timedelta(days=7 - run.today.weekday())
+
+    def _refresh(user: UserSnapshot) -> bool:
+        saved = refresh_snapshots(user.data, run.today)
+        if saved:
+            # Only the snapshots are written: the sweep's copy of the rest may be stale by now,
+            # and a derived write doesn't mark the user changed for the next incremental run
+            run.storage.save_derived(user.user_id, SNAPSHOTS_KEY, user.data[SNAPSHOTS_KEY])
+        has_activity = bool(user.data.get("completions") or user.data.get("tasks"))
+        run.revisit(user.user_id, next_monday if has_activity else None)
+        return saved
+
+    run.sweep(_refresh)
+
+
+@tracked_job("admin_analytics")
+def job_admin_analytics():
+    """Refresh the cross-user admin analytics (only changed users are re-summarized)."""
+    logger.info("📈 Refreshing admin analytics...")
+    try:
+        from admin_analytics import refresh_admin_analytics
+        report = refresh_admin_analytics(get_storage())
+        logger.info(f"Admin analytics refreshed ({report.get('recomputed_users', 0)} users recomputed)")
+    except Exception as e:
+        logger.exception(f"Error in admin analytics job: {e}")
+
+
+def _ensure_job(scheduler, func, trigger, job_id: str, kwargs=None) -> None:
+    """Add a recurring job unless the persisted one is already identical.
+
+    Re-adding would reset its next run time and lose a run missed while the
+    process was down, so unchanged jobs are left as loaded from the store.
+    """
+    existing = scheduler.get_job(job_id, jobstore="default")
+    if (
+        existing is not None
+        and existing.func_ref == f"{func.__module__}:{func.__qualname__}"
+        and str(existing.trigger) == str(trigger)
+        and existing.kwargs == (kwargs or {})
+    ):
+        return
+    scheduler.add_job(func, trigger, id=job_id, kwargs=kwargs or {}, replace_existing=True, jobstore="default")
+
+
+def _job_definitions() -> List[Tuple[Any, Any, str, Any]]:
+    """The recurring job set as (func, trigger, job_id, kwargs)."""
+    checkpointed = {"checkpoint": True}
+    # Sweeps whose per-user result only changes with the user's data (or on a known date)
+    incremental = {"checkpoint": True, "incremental": True}
+    return [
+        # daily reminder at 7:00
+        (job_daily_reminder, CronTrigger(hour=7, minute=0), "daily_reminder", checkpointed),
         # weekly summary Sunday 9:00
-        scheduler.add_job(job_weekly_summary, CronTrigger(day_of_week=6, hour=9, minute=0), id="weekly_summary", replace_existing=True)
+        (job_weekly_summary, CronTrigger(day_of_week=6, hour=9, minute=0), "weekly_summary", checkpointed),
         # streak checks 6:00
-        scheduler.add_job(job_streak_checks, CronTrigger(hour=6, minute=0), id="streak_checks", replace_existing=True)
+        (job_streak_checks, CronTrigger(hour=6, minute=0), "streak_checks", incremental),
         # drip campaigns 8:00 AM (check daily for pending emails)
-        scheduler.add_job(job_drip_campaigns, CronTrigger(hour=8, minute=0), id="drip_campaigns", replace_existing=True)
-        logger.info("Scheduled daily/weekly/streak/drip campaign jobs")
+        (job_drip_campaigns, CronTrigger(hour=8, minute=0), "drip_campaigns", None),
+        # daily digests: every 15 minutes, only users whose local digest_time falls in the slot
+        (job_daily_digests, CronTrigger(minute="*/15"), "daily_digests", None),
+        # leaderboard reconciliation just after midnight (new week/month/year starts at 0 XP)
+        (job_leaderboard_reconcile, CronTrigger(hour=0, minute=5), "leaderboard_reconcile", None),
+        # stats snapshots shortly after (a new snapshot lands each Monday)
+        (job_stats_snapshots, CronTrigger(hour=0, minute=15), "stats_snapshots", incremental),
+        # admin analytics every hour at :30
+        (job_admin_analytics, CronTrigger(minute=30), "admin_analytics", None),
+    ]
 
 
-def init_scheduler():
-    """Initialize scheduler and schedule jobs."""
+def schedule_jobs():
+    """Schedule all automated notification jobs."""
     scheduler = get_scheduler()
     if scheduler is None:
+        return
+
+    if CronTrigger:
+        jobs = _job_definitions()
+        for func, trigger, job_id, kwargs in jobs:
+            _ensure_job(scheduler, func, trigger, job_id, kwargs)
+
+        # Drop persisted jobs that are no longer part of the schedule
+        wanted = {job_id for _, _, job_id, _ in jobs}
+        for job in scheduler.get_jobs(jobstore="default"):
+            if job.id not in wanted:
+                scheduler.remove_job(job.id, jobstore="default")
+        logger.info("Scheduled daily/weekly/streak/drip campaign/digest/leaderboard/snapshot/analytics jobs")
+
+
+def resume_unfinished_sweeps() -> List[str]:
+    """Re-run checkpointed jobs whose current run was left unfinished; returns their ids.
+
+    APScheduler moves a job to its next fire time as soon as it submits it,
+    so a run cut short by a crash, shutdown or leader hand-off gets no
+    catch-up. It is resumed here under its own run key instead (users already
+    done are skipped). Runs superseded by a later fire time are left alone.
+    """
+    from job_store import unfinished_sweeps
+    checkpointed = {job_id: (func, kwargs) for func, _, job_id, kwargs in _job_definitions() if (kwargs or {}).get("checkpoint")}
+    resumed = []
+    for job_id, run_key in unfinished_sweeps():
+        if job_id not in checkpointed or run_key != _run_key(job_id):
+            continue
+        scheduled = _scheduler.get_job(job_id, jobstore="default") if _scheduler is not None else None
+        if scheduled is not None and scheduled.next_run_time is not None and scheduled.next_run_time <= datetime.now(scheduled.next_run_time.tzinfo):
+            continue  # a catch-up of the same run is already due
+        func, kwargs = checkpointed[job_id]
+        if run_job_now(func, f"{job_id}_resume", kwargs={**kwargs, "run_key": run_key}):
+            logger.info(f"Resuming unfinished {job_id} run {run_key}")
+            resumed.append(job_id)
+    return resumed
+
+
+def _on_elected():
+    if get_scheduler() is not None:
+        schedule_jobs()
+        resume_unfinished_sweeps()
+
+
+def init_scheduler():
+    """Join scheduler leader election; the scheduler runs only while this process leads.
+
+    Every app process calls this, but only the process holding the leader
+    lease starts the scheduler and runs jobs; the others stay passive and
+    take over if the leader goes away. Returns the scheduler when this
+    process is the leader, else None.
+    """
+    global _elector
+    if BackgroundScheduler is None:
+        logger.warning("APScheduler not available. Scheduler disabled.")
+        return None
+    if _elector is None:
+        from leader_election import LeaderElector
+        _elector = LeaderElector(get_storage(), on_elected=_on_elected, on_demoted=stop_scheduler)
+        if not _elector.start():
+            logger.info(f"💤 Scheduler standby: {_elector.owner} is passive")
+    return _scheduler
+
+
+def in_app_scheduler_enabled() -> bool:
+    """Whether the Streamlit app processes should join scheduler leader election.
+
+    Set SCHEDULER_IN_APP=0 (or secret scheduler_in_app = false) when jobs run
+    in a separate `python -m scheduler_service` worker, so the app never
+    takes the lease.
+    """
+    from app_config import get_secret
+    raw = os.environ.get("SCHEDULER_IN_APP")
+    if raw is None:
+        raw = get_secret("scheduler_in_app", True)
+    return str(raw).strip().lower() not in ("0", "false", "no", "off")
+
+
+def get_job_history(job_id: Optional[str] = None, limit: int = 200) -> List[Dict[str, Any]]:
+    """Recent job runs with their metrics, newest first (see job_metrics)."""
+    return load_history(job_id, limit)
+
+
+def _worker_lease():
+    """Lease held by another process (e.g. a headless worker) when this one isn't contending."""
+    try:
+        from leader_election import LEADER_LEASE_NAME
+        lease = get_storage().get_lease(LEADER_LEASE_NAME)
+    except Exception:
         return None
-    schedule_jobs()
-    return scheduler
+    return {"owner": None, "is_leader": False, "lease": lease} if lease else None
 
 
 def get_scheduler_status():
     global _scheduler
+    leader = _elector.status() if _elector is not None else _worker_lease()
     if _scheduler is None:
-        return {"status": "⏹️ Stopped", "jobs": []}
+        if leader and not leader["is_leader"]:
+            return {"status": "💤 Standby (another process is the leader)", "jobs": [], "leader": leader}
+        return {"status": "⏹️ Stopped", "jobs": [], "leader": leader}
     jobs = []
     for job in _scheduler.get_jobs():
         jobs.append({"id": job.id, "next_run": str(job.next_run_time)})
-    return {"status": "🟢 Running" if _scheduler.running else "⏹️ Stopped", "jobs": jobs}
+    return {"status": "🟢 Running" if _scheduler.running else "⏹️ Stopped", "jobs": jobs, "leader": leader, "sweeps": active_runs()}
+
+
+def main(argv=None) -> int:
+    """Headless worker: run the background jobs in their own process, without the Streamlit app."""
+    parser = argparse.ArgumentParser(description="Run the XP Tracker background jobs without the Streamlit UI.")
+    parser.add_argument("--run", metavar="JOB_ID", help="run one job now and exit (see --list)")
+    parser.add_argument("--list", action="store_true", help="list the job ids and exit")
+    args = parser.parse_args(argv)
+
+    if BackgroundScheduler is None:
+        logger.error("APScheduler not available; install it to run the worker.")
+        return 1
+    jobs = {job_id: func for func, _, job_id, _ in _job_definitions()}
+    if args.list:
+        for job_id in jobs:
+            print(job_id)
+        return 0
+    if args.run:
+        if args.run not in jobs:
+            parser.error(f"unknown job {args.run!r} (choose from {', '.join(jobs)})")
+        jobs[args.run]()
+        return 0
+
+    stopping = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stopping.set())
+    init_scheduler()
+    logger.info("Scheduler worker running (Ctrl+C to stop)")
+    stopping.wait()
+
+    # Hand the lease over right away instead of letting it expire
+    if _elector is not None:
+        _elector.stop()
+    stop_scheduler()
+    return 0
+
+
+if __name__ == "__main__":
+    # Run through the importable module so persisted job references stay
+    # "scheduler_service:..." rather than "__main__:..."
+    import scheduler_service
+    raise SystemExit(scheduler_service.main())
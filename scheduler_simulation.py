@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""
+scheduler_simulation.py
+
+Virtual-clock simulation of the background scheduler.
+
+Registers the real job set with `scheduler_service.schedule_jobs()` on a
+stand-in scheduler, then fast-forwards N days: every job fires at its
+trigger's times on a virtual clock, in order, against a MemoryStorage
+holding a synthetic population (synthetic_data.py). Emails go to a
+capturing sink and Gemini is disabled, so nothing leaves the process. Each
+simulated morning the population checks in habits (some users stay dormant)
+and new users can sign up, so streak, drip and digest paths see realistic
+activity.
+
+The clock is virtual for `datetime.now()` / `date.today()` / `time.time()`
+as seen by the app modules (like freezegun); job durations are real wall
+time, which is what the report is for. Checkpoints, run history and the
+JSON history files live in a scratch directory that is removed afterwards.
+
+The report lists emails sent per simulated day (by job), per-job run
+counts and durations, and storage operation counts per job.
+
+Examples:
+
+# Two weeks, 200 users, half of them dormant
+python scheduler_simulation.py --days 14 --users 200 --dormant 0.5
+
+# Drip campaigns for a stream of new signups, JSON report for comparison
+python scheduler_simulation.py --days 30 --users 50 --signups-per-day 5 --output sim_report.json
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, List, Optional
+
+_REAL_DATETIME = datetime.datetime
+_REAL_DATE = datetime.date
+_REAL_TIME = time.time
+_PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class VirtualClock:
+    """The simulated "now" (an aware UTC instant), moved forward by the simulation."""
+
+    def __init__(self, start: datetime.datetime):
+        self.now_utc = start.astimezone(datetime.timezone.utc)
+
+    def set(self, instant: datetime.datetime) -> None:
+        self.now_utc = instant.astimezone(datetime.timezone.utc)
+
+    def time(self) -> float:
+        return self.now_utc.timestamp()
+
+    def local_now(self) -> datetime.datetime:
+        """Naive server-local time, as `datetime.now()` returns it."""
+        return self.now_utc.astimezone().replace(tzinfo=None)
+
+
+_clock: Optional[VirtualClock] = None
+
+
+class _RealInstances(type):
+    # isinstance(real_datetime, VirtualDatetime) stays True while the classes are swapped
+    def __instancecheck__(cls, obj):
+        return isinstance(obj, cls.__mro__[1])
+
+
+class VirtualDatetime(_REAL_DATETIME, metaclass=_RealInstances):
+    @classmethod
+    def now(cls, tz=None):
+        return _clock.now_utc.astimezone(tz) if tz is not None else _clock.local_now()
+
+    @classmethod
+    def utcnow(cls):
+        return _clock.now_utc.replace(tzinfo=None)
+
+    @classmethod
+    def today(cls):
+        return _clock.local_now()
+
+
+class VirtualDate(_REAL_DATE, metaclass=_RealInstances):
+    @classmethod
+    def today(cls):
+        return _clock.local_now().date()
+
+
+def _project_modules() -> List[Any]:
+    modules = []
+    for module in list(sys.modules.values()):
+        path = getattr(module, "__file__", None) or ""
+        if module is not sys.modules.get(__name__) and os.path.dirname(os.path.abspath(path)) == _PROJECT_DIR:
+            modules.append(module)
+    return modules
+
+
+@contextlib.contextmanager
+def virtual_clock(clock: VirtualClock):
+    """Route the app modules' clock reads to `clock` until exit.
+
+    Swaps `datetime.datetime` / `datetime.date` / `time.time` (for call-time
+    lookups such as a function-level `import datetime`) and every project
+    module's own bound `datetime` / `date` names.
+    """
+    global _clock
+    swapped = []
+
+    def _swap(owner, name, value):
+        swapped.append((owner, name, getattr(owner, name)))
+        setattr(owner, name, value)
+
+    _clock = clock
+    _swap(datetime, "datetime", VirtualDatetime)
+    _swap(datetime, "date", VirtualDate)
+    _swap(time, "time", clock.time)
+    for module in _project_modules():
+        for name, value in list(vars(module).items()):
+            if value is _REAL_DATETIME:
+                _swap(module, name, VirtualDatetime)
+            elif value is _REAL_DATE:
+                _swap(module, name, VirtualDate)
+    try:
+        yield clock
+    finally:
+        for owner, name, value in reversed(swapped):
+            setattr(owner, name, value)
+        _clock = None
+
+
+class SimulatedJob:
+    """The parts of an APScheduler Job that `schedule_jobs` looks at, plus its next fire time."""
+
+    def __init__(self, job_id: str, func: Callable[..., Any], trigger, args=None, kwargs=None):
+        self.id = job_id
+        self.func = func
+        self.trigger = trigger
+        self.args = list(args or [])
+        self.kwargs = dict(kwargs or {})
+        self.func_ref = f"{func.__module__}:{func.__qualname__}"
+        self.next_run_time: Optional[datetime.datetime] = None
+
+
+class SimulatedScheduler:
+    """Stand-in for the BackgroundScheduler: `schedule_jobs` registers jobs, the simulation fires them."""
+
+    running = True
+
+    def __init__(self):
+        self.jobs: Dict[str, SimulatedJob] = {}
+
+    def get_job(self, job_id: str, jobstore: Optional[str] = None) -> Optional[SimulatedJob]:
+        return self.jobs.get(job_id)
+
+    def get_jobs(self, jobstore: Optional[str] = None) -> List[SimulatedJob]:
+        return list(self.jobs.values())
+
+    def add_job(self, func, trigger=None, id=None, args=None, kwargs=None, replace_existing=False, jobstore=None, **_):
+        self.jobs[id] = SimulatedJob(id, func, trigger, args, kwargs)
+        return self.jobs[id]
+
+    def remove_job(self, job_id: str, jobstore: Optional[str] = None) -> None:
+        self.jobs.pop(job_id, None)
+
+
+class EmailSink:
+    """Captures outgoing email instead of sending it, tagged with the simulated time and job."""
+
+    def __init__(self):
+        self.sent: List[Dict[str, Any]] = []
+
+    def send_email(self, to_address: str, subject: str, body: str) -> bool:
+        import job_metrics
+
+        run = job_metrics.current()
+        self.sent.append({
+            "at": _clock.local_now().isoformat(timespec="minutes"),
+            "job": run.job_id if run is not None else None,
+            "to": to_address,
+            "subject": subject,
+        })
+        job_metrics.count("emails_sent")
+        job_metrics.notified(to_address)
+        return True
+
+
+class Population:
+    """Synthetic users plus their simulated daily behaviour (check-ins, new signups)."""
+
+    def __init__(self, storage, users: int, seed: int, start: datetime.date, dormant: float, signups_per_day: int, years: float):
+        from synthetic_data import iter_synthetic_users
+
+        self.storage = storage
+        self.seed = seed
+        self.signups_per_day = signups_per_day
+        self.propensity: Dict[str, float] = {}
+        self.signups = 0
+        history_end = start - datetime.timedelta(days=1)
+        for user_id, data in iter_synthetic_users(users, seed=seed, today=history_end, years=years, tasks=10, journal_entries=0):
+            self._add(user_id, data, dormant)
+
+    def _add(self, user_id: str, data: Dict[str, Any], dormant: float) -> None:
+        rng = random.Random(f"{self.seed}:{user_id}")
+        data["email"] = f"{user_id}@example.test"
+        self.propensity[user_id] = 0.0 if rng.random() < dormant else min(max(rng.gauss(0.65, 0.15), 0.1), 0.95)
+        self.storage.save_data(user_id, data)
+
+    def morning(self, today: datetime.date) -> None:
+        """Today's check-ins for active users, then today's signups."""
+        from synthetic_data import generate_user_data
+
+        for user_id, p in self.propensity.items():
+            if not p:
+                continue
+            rng = random.Random(f"{self.seed}:{user_id}:{today.isoformat()}")
+            data = self.storage.load_data(user_id)
+            done = [h for h, d in data.get("habits", {}).items() if d.get("active", True) and rng.random() < p]
+            if done:
+                data.setdefault("completions", {})[today.isoformat()] = done
+                self.storage.save_data(user_id, data)
+        for _ in range(self.signups_per_day):
+            user_id = f"signup_{self.signups:05d}"
+            rng = random.Random(f"{self.seed}:{user_id}")
+            self._add(user_id, generate_user_data(rng, today, years=0, tasks=0, journal_entries=0), dormant=0.0)
+            self.signups += 1
+
+
+def simulate(
+    days: int,
+    users: int,
+    seed: int = 0,
+    start: Optional[datetime.date] = None,
+    dormant: float = 0.3,
+    signups_per_day: int = 0,
+    years: float = 0.25,
+    verbose: bool = False,
+) -> Dict[str, Any]:
+    """Fast-forward the scheduled job set over `days` simulated days and return the report."""
+    import daily_digest
+    import drip_campaigns
+    import email_utils
+    import notifications
+    import coaching_emails
+    import scheduler_service
+    import storage as storage_module
+    from storage import MemoryStorage
+
+    if scheduler_service.CronTrigger is None:
+        raise RuntimeError("APScheduler is required for the simulation (its triggers decide when jobs fire)")
+
+    start = start or _REAL_DATE.today()
+    start_instant = _REAL_DATETIME.combine(start, datetime.time(0)).astimezone()
+    end_instant = start_instant + datetime.timedelta(days=days)
+    clock = VirtualClock(start_instant)
+    memory = MemoryStorage()
+    sink = EmailSink()
+    scheduler = SimulatedScheduler()
+
+    scratch = tempfile.mkdtemp(prefix="xp_sim_")
+    cwd = os.getcwd()
+    patches = [
+        (scheduler_service, "get_scheduler", lambda: scheduler),
+        (coaching_emails, "get_gemini_client", lambda *a, **k: None),
+        (daily_digest, "get_gemini_client", lambda *a, **k: None),
+        (daily_digest, "_dispatch_index", {}),
+        (daily_digest, "_index_built_at", None),
+        (email_utils, "send_email", sink.send_email),
+        (notifications, "send_email", sink.send_email),
+        (drip_campaigns, "send_email", sink.send_email),
+        (daily_digest, "send_email", sink.send_email),
+    ]
+    originals = [(owner, name, getattr(owner, name)) for owner, name, _ in patches]
+    log_level = logging.getLogger().level
+    jobs: Dict[str, Dict[str, Any]] = defaultdict(lambda: {"runs": 0, "seconds": 0.0, "max_seconds": 0.0, "storage_ops": Counter(), "emails": 0})
+    wall_start = time.perf_counter()
+    try:
+        os.chdir(scratch)
+        for owner, name, value in patches:
+            setattr(owner, name, value)
+        storage_module.set_storage(memory)
+        if not verbose:
+            logging.getLogger().setLevel(logging.WARNING)
+
+        with virtual_clock(clock):
+            population = Population(memory, users, seed, start, dormant, signups_per_day, years)
+            memory.ops.clear()
+            scheduler_service.schedule_jobs()
+            morning = SimulatedJob("_population", population.morning, scheduler_service.CronTrigger(hour=5, minute=0))
+            timeline = list(scheduler.jobs.values()) + [morning]
+            for job in timeline:
+                job.next_run_time = job.trigger.get_next_fire_time(None, start_instant)
+
+            while True:
+                job = min((j for j in timeline if j.next_run_time is not None), key=lambda j: j.next_run_time, default=None)
+                if job is None or job.next_run_time >= end_instant:
+                    break
+                fire_time = job.next_run_time
+                clock.set(fire_time)
+                if job is morning:
+                    population.morning(clock.local_now().date())
+                else:
+                    ops_before, sent_before = Counter(memory.ops), len(sink.sent)
+                    began = time.perf_counter()
+                    output = io.StringIO()
+                    try:
+                        with contextlib.redirect_stdout(sys.stdout if verbose else output):
+                            job.func(*job.args, **job.kwargs)
+                    except Exception as e:
+                        print(f"Job {job.id} failed at {clock.local_now()}: {e}", file=sys.stderr)
+                    seconds = time.perf_counter() - began
+                    stats = jobs[job.id]
+                    stats["runs"] += 1
+                    stats["seconds"] += seconds
+                    stats["max_seconds"] = max(stats["max_seconds"], seconds)
+                    stats["storage_ops"].update(Counter(memory.ops) - ops_before)
+                    stats["emails"] += len(sink.sent) - sent_before
+                job.next_run_time = job.trigger.get_next_fire_time(fire_time, fire_time)
+    finally:
+        logging.getLogger().setLevel(log_level)
+        storage_module.set_storage(None)
+        for owner, name, value in originals:
+            setattr(owner, name, value)
+        os.chdir(cwd)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    per_day: Dict[str, Counter] = {
+        (start + datetime.timedelta(days=i)).isoformat(): Counter() for i in range(days)
+    }
+    for email in sink.sent:
+        per_day.setdefault(email["at"][:10], Counter())[email["job"] or "other"] += 1
+    return {
+        "days": days,
+        "start": start.isoformat(),
+        "users": users,
+        "signups": population.signups,
+        "wall_seconds": round(time.perf_counter() - wall_start, 3),
+        "emails_per_day": {day: dict(counts, total=sum(counts.values())) for day, counts in sorted(per_day.items())},
+        "jobs": {
+            job_id: {
+                "runs": s["runs"],
+                "total_seconds": round(s["seconds"], 3),
+                "mean_ms": round(1000 * s["seconds"] / s["runs"], 2) if s["runs"] else 0.0,
+                "max_ms": round(1000 * s["max_seconds"], 2),
+                "emails": s["emails"],
+                "storage_ops": dict(s["storage_ops"]),
+            }
+            for job_id, s in sorted(jobs.items())
+        },
+        "storage_ops": dict(memory.ops),
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(
+        f"Simulated {report['days']} days from {report['start']}: {report['users']} users"
+        f" (+{report['signups']} signups) in {report['wall_seconds']:.1f}s wall"
+    )
+    job_ids = sorted({j for counts in report["emails_per_day"].values() for j in counts if j != "total"})
+    print("\nEmails per day")
+    print(f"{'date':<12}{'total':>7}" + "".join(f"{j:>18}" for j in job_ids))
+    for day, counts in report["emails_per_day"].items():
+        print(f"{day:<12}{counts['total']:>7}" + "".join(f"{counts.get(j, 0):>18}" for j in job_ids))
+    print("\nJobs")
+    print(f"{'job':<24}{'runs':>6}{'total s':>10}{'mean ms':>10}{'max ms':>10}{'emails':>8}  storage ops")
+    for job_id, s in report["jobs"].items():
+        ops = ", ".join(f"{op} {n}" for op, n in sorted(s["storage_ops"].items()))
+        print(f"{job_id:<24}{s['runs']:>6}{s['total_seconds']:>10.2f}{s['mean_ms']:>10.1f}{s['max_ms']:>10.1f}{s['emails']:>8}  {ops}")
+    print("\nStorage ops (all jobs and simulated activity): " + ", ".join(f"{op} {n}" for op, n in sorted(report["storage_ops"].items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fast-forward the XP Tracker scheduler over simulated days")
+    parser.add_argument("--days", type=int, default=7, help="simulated days (default: 7)")
+    parser.add_argument("--users", type=int, default=50, help="synthetic users at the start (default: 50)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--start", type=_REAL_DATE.fromisoformat, default=None, help="first simulated day, YYYY-MM-DD (default: today)")
+    parser.add_argument("--dormant", type=float, default=0.3, help="fraction of users who never check in (default: 0.3)")
+    parser.add_argument("--signups-per-day", type=int, default=0, help="new users signing up each simulated day")
+    parser.add_argument("--years", type=float, default=0.25, help="years of history per synthetic user (default: 0.25)")
+    parser.add_argument("--output", help="also write the report as JSON to this path")
+    parser.add_argument("--verbose", action="store_true", help="show job logs and prints")
+    args = parser.parse_args()
+
+    report = simulate(
+        args.days,
+        args.users,
+        seed=args.seed,
+        start=args.start,
+        dormant=args.dormant,
+        signups_per_day=args.signups_per_day,
+        years=args.years,
+        verbose=args.verbose,
+    )
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
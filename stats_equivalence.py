@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+"""
+stats_equivalence.py
+
+Differential check of the fast stats engine against `calculate_stats`.
+
+The legacy path is `tracker.calculate_stats`: a day-by-day replay of the whole
+history. The fast path is what the rest of the app reads: the cached XP
+timeline for total XP and the snapshot-backed as-of replay for per-habit XP,
+completions and streaks, with badges from the same rules. Both are run on the
+same data and "today", flattened into named fields and compared; the first
+diverging field is then bisected over "today" to find the first date it
+diverges on.
+
+Inputs are random synthetic histories, property-style histories (random
+histories plus edge-case mutations: duplicate check-ins, unknown habits,
+future dates, archive/restore ranges, undated missions), a fixed set of edge
+cases, and optionally real user files, anonymized on load.
+
+`shadow_check` runs the same comparison for a sampled fraction of requests in
+production and logs divergences.
+
+Examples:
+
+# 500 random + 500 property-generated histories, pinned "today"
+python stats_equivalence.py --random 500 --property 500 --today 2025-12-31
+
+# Real user files (anonymized in memory), and keep an anonymized snapshot
+python stats_equivalence.py --files "xp_data_*.json" --snapshot-out anon_users
+"""
+
+import argparse
+import copy
+import datetime
+import glob
+import json
+import logging
+import os
+import random
+import sys
+import threading
+from typing import Dict, Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+from xp_timeline import (
+    get_xp_timeline,
+    parse_date,
+    mark_habit_active,
+    mark_habit_archived,
+    XP_PER_LEVEL,
+)
+from stats_snapshots import get_stats_as_of
+from badges import badge_metrics, qualifying_badges
+
+logger = logging.getLogger(__name__)
+
+# Habit level: one level per 30 completions (as in calculate_stats)
+HABIT_LEVEL_COMPLETIONS = 30
+HABIT_FIELDS = ("completions", "total_xp", "streak", "level")
+
+StatsFn = Callable[[Dict[str, Any], datetime.date], Dict[str, Any]]
+
+_shadow_counts = {"checked": 0, "diverged": 0, "errors": 0}
+_shadow_lock = threading.Lock()
+
+
+def flatten_stats(global_xp: int, habit_stats: Dict[str, Dict[str, Any]], badges: Iterable[str]) -> Dict[str, Any]:
+    """Named fields in comparison order: per-habit fields, then totals, then badges."""
+    fields: Dict[str, Any] = {}
+    for habit in sorted(habit_stats):
+        for key in HABIT_FIELDS:
+            fields[f"habits.{habit}.{key}"] = habit_stats[habit].get(key)
+    fields["global_xp"] = global_xp
+    fields["level"] = 1 + global_xp // XP_PER_LEVEL
+    fields["badges"] = sorted(badges)
+    return fields
+
+
+def legacy_stats(data: Dict[str, Any], today: datetime.date) -> Dict[str, Any]:
+    """Flattened result of `tracker.calculate_stats`."""
+    from tracker import calculate_stats
+
+    global_xp, habit_stats, badges = calculate_stats(data, today)
+    return flatten_stats(global_xp, habit_stats, badges)
+
+
+def fast_stats(data: Dict[str, Any], today: datetime.date) -> Dict[str, Any]:
+    """Flattened stats from the XP timeline and the as-of snapshot replay."""
+    timeline = get_xp_timeline(data, today)
+    view = get_stats_as_of(data, today)
+    habit_stats = {}
+    for habit in data.get("habits", {}) or {}:
+        completions = view["habit_completions"].get(habit, 0)
+        habit_stats[habit] = {
+            "completions": completions,
+            "total_xp": view["habit_xp"].get(habit, 0),
+            "streak": view["streaks"].get(habit, 0),
+            "level": 1 + completions // HABIT_LEVEL_COMPLETIONS,
+        }
+    global_xp = timeline.total_xp
+    tasks_done = sum(1 for t in data.get("tasks", []) or [] if t.get("status") == "Done")
+    metrics = badge_metrics(habit_stats, view["perfect_days"], tasks_done, 1 + global_xp // XP_PER_LEVEL)
+    return flatten_stats(global_xp, habit_stats, qualifying_badges(metrics))
+
+
+def first_divergence(legacy: Dict[str, Any], fast: Dict[str, Any]) -> Optional[Tuple[str, Any, Any]]:
+    """(field, legacy value, fast value) for the first field that differs, or None."""
+    for field in list(legacy) + [f for f in fast if f not in legacy]:
+        if legacy.get(field) != fast.get(field):
+            return field, legacy.get(field), fast.get(field)
+    return None
+
+
+def _history_start(data: Dict[str, Any]) -> Optional[datetime.date]:
+    days = [parse_date(k) for k in (data.get("completions", {}) or {})]
+    days += [parse_date(t.get("completed_at")) for t in data.get("tasks", []) or [] if t.get("status") == "Done" and t.get("completed_at")]
+    days = [d for d in days if d is not None]
+    return min(days) if days else None
+
+
+def first_divergent_date(
+    data: Dict[str, Any],
+    field: str,
+    today: datetime.date,
+    legacy: StatsFn = legacy_stats,
+    fast: StatsFn = fast_stats,
+) -> datetime.date:
+    """Earliest "today" on which `field` differs, bisecting from the start of the history.
+
+    Assumes a divergence persists once it appears (true for the cumulative
+    fields); otherwise this is one date on which the field diverges.
+    """
+    def differs(d: datetime.date) -> bool:
+        return legacy(data, d).get(field) != fast(data, d).get(field)
+
+    start = _history_start(data)
+    if start is None or start >= today or differs(start):
+        return min(start or today, today)
+    lo, hi = start, today  # equal at lo, differs at hi
+    while (hi - lo).days > 1:
+        mid = lo + datetime.timedelta(days=(hi - lo).days // 2)
+        if differs(mid):
+            hi = mid
+        else:
+            lo = mid
+    return hi
+
+
+def compare_stats(
+    data: Dict[str, Any],
+    today: datetime.date,
+    legacy: StatsFn = legacy_stats,
+    fast: StatsFn = fast_stats,
+) -> Optional[Dict[str, Any]]:
+    """None when both engines agree, else {"field", "legacy", "fast", "date"}."""
+    found = first_divergence(legacy(data, today), fast(data, today))
+    if found is None:
+        return None
+    field, legacy_value, fast_value = found
+    return {
+        "field": field,
+        "legacy": legacy_value,
+        "fast": fast_value,
+        "date": first_divergent_date(data, field, today, legacy, fast).isoformat(),
+    }
+
+
+# --- Inputs -----------------------------------------------------------------
+
+def random_history(rng: random.Random, today: datetime.date) -> Dict[str, Any]:
+    """A small synthetic user with randomized shape."""
+    from synthetic_data import generate_user_data
+
+    return generate_user_data(
+        rng,
+        today,
+        years=rng.choice([0.02, 0.1, 0.25, 0.5, 1.0]),
+        habits=rng.randrange(0, 7),
+        completion_prob=rng.random(),
+        tasks=rng.randrange(0, 30),
+        journal_entries=0,
+    )
+
+
+def _random_day(rng: random.Random, today: datetime.date, span: int = 120) -> datetime.date:
+    return today - datetime.timedelta(days=rng.randrange(-5, span))
+
+
+def _mutate_duplicate_checkins(rng, data, today):
+    for done in data["completions"].values():
+        if done and rng.random() < 0.3:
+            done.append(rng.choice(done))
+
+
+def _mutate_unknown_habit(rng, data, today):
+    data["completions"].setdefault(_random_day(rng, today).isoformat(), []).append("Deleted Habit")
+
+
+def _mutate_future_checkins(rng, data, today):
+    if data["habits"]:
+        d = today + datetime.timedelta(days=rng.randrange(1, 10))
+        data["completions"].setdefault(d.isoformat(), []).append(rng.choice(list(data["habits"])))
+
+
+def _mutate_archive_ranges(rng, data, today):
+    for details in data["habits"].values():
+        if rng.random() < 0.5:
+            archived_on = _random_day(rng, today)
+            mark_habit_archived(details, archived_on)
+            if rng.random() < 0.5:
+                mark_habit_active(details, archived_on + datetime.timedelta(days=rng.randrange(1, 30)))
+
+
+def _mutate_undated_tasks(rng, data, today):
+    for task in data["tasks"]:
+        if task["status"] == "Done" and rng.random() < 0.3:
+            task.pop("completed_at", None)
+
+
+def _mutate_streak_to_today(rng, data, today):
+    if data["habits"]:
+        habit = rng.choice(list(data["habits"]))
+        for i in range(rng.randrange(1, 45)):
+            done = data["completions"].setdefault((today - datetime.timedelta(days=i + rng.randrange(2))).isoformat(), [])
+            if habit not in done:
+                done.append(habit)
+
+
+def _mutate_empty_days(rng, data, today):
+    for _ in range(rng.randrange(1, 4)):
+        data["completions"].setdefault(_random_day(rng, today, 400).isoformat(), [])
+
+
+MUTATIONS = [
+    _mutate_duplicate_checkins,
+    _mutate_unknown_habit,
+    _mutate_future_checkins,
+    _mutate_archive_ranges,
+    _mutate_undated_tasks,
+    _mutate_streak_to_today,
+    _mutate_empty_days,
+]
+
+
+def property_history(rng: random.Random, today: datetime.date) -> Dict[str, Any]:
+    """A random history with one to three edge-case mutations applied."""
+    data = random_history(rng, today)
+    for mutate in rng.sample(MUTATIONS, rng.randrange(1, 4)):
+        mutate(rng, data, today)
+    return data
+
+
+def edge_case_histories(today: datetime.date) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Hand-picked boundary cases: empty users, today-only streaks, perfect weeks, badges."""
+    from storage import DEFAULT_DATA
+
+    def user(habits=None, completions=None, tasks=None) -> Dict[str, Any]:
+        data = copy.deepcopy(DEFAULT_DATA)
+        data["habits"] = habits or {}
+        data["completions"] = completions or {}
+        data["tasks"] = tasks or []
+        return data
+
+    def day(offset: int) -> str:
+        return (today - datetime.timedelta(days=offset)).isoformat()
+
+    def habit(xp: int = 10, active: bool = True) -> Dict[str, Any]:
+        return {"xp": xp, "active": active, "goal": "General"}
+
+    yield "empty", user()
+    yield "habits_without_checkins", user({"Read": habit(), "Run": habit(20)})
+    yield "checked_in_today_only", user({"Read": habit()}, {day(0): ["Read"]})
+    yield "streak_alive_from_yesterday", user({"Read": habit()}, {day(i): ["Read"] for i in range(1, 8)})
+    yield "streak_broken_two_days_ago", user({"Read": habit()}, {day(i): ["Read"] for i in range(2, 9)})
+    yield "month_streak", user({"Read": habit(15)}, {day(i): ["Read"] for i in range(31)})
+    yield "perfect_week", user({"Read": habit(), "Run": habit(5)}, {day(i): ["Read", "Run"] for i in range(7)})
+    yield "archived_habit_ignored_for_perfect_days", user(
+        {"Read": habit(), "Old": habit(5, active=False)}, {day(i): ["Read"] for i in range(10)}
+    )
+    yield "all_habits_archived", user({"Read": habit(active=False)}, {day(3): ["Read"]})
+    yield "future_checkins_only", user({"Read": habit()}, {(today + datetime.timedelta(days=2)).isoformat(): ["Read"]})
+    yield "duplicate_checkins", user({"Read": habit()}, {day(1): ["Read", "Read"], day(0): ["Read", "Read", "Read"]})
+    yield "unknown_habit_checkins", user({"Read": habit()}, {day(1): ["Gone"], day(0): ["Read", "Gone"]})
+    yield "empty_first_day", user({"Read": habit()}, {day(20): [], day(0): ["Read"]})
+    yield "habit_level_three", user({"Read": habit(1)}, {day(2 * i): ["Read"] for i in range(60)})
+    done = [{"id": str(i), "title": f"M{i}", "xp": 10, "status": "Done"} for i in range(10)]
+    for i, task in enumerate(done[:5]):
+        task["completed_at"] = f"{day(i)}T09:00:00"
+    done.append({"id": "future", "title": "Future", "xp": 30, "status": "Done", "completed_at": f"{(today + datetime.timedelta(days=3)).isoformat()}T09:00:00"})
+    done.append({"id": "todo", "title": "Open", "xp": 50, "status": "Todo"})
+    yield "task_force_mixed_dates", user({"Read": habit()}, {day(0): ["Read"]}, done)
+    ranged = {"Read": habit(), "Run": habit()}
+    mark_habit_active(ranged["Run"], today - datetime.timedelta(days=10))
+    mark_habit_archived(ranged["Run"], today - datetime.timedelta(days=5))
+    mark_habit_active(ranged["Run"], today - datetime.timedelta(days=2))
+    yield "archive_and_restore_ranges", user(ranged, {day(i): ["Read"] + (["Run"] if i % 2 else []) for i in range(15)})
+
+
+def anonymize_user_data(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Keep only what stats depend on; habit names become "habit_N", missions lose their text."""
+    habits = data.get("habits", {}) or {}
+    names = {name: f"habit_{i}" for i, name in enumerate(sorted(habits))}
+    anon_habits = {}
+    for name, details in habits.items():
+        anon_habits[names[name]] = {k: copy.deepcopy(v) for k, v in details.items() if k in ("xp", "active", "active_ranges")}
+    completions = {}
+    for date_str, done in (data.get("completions", {}) or {}).items():
+        completions[date_str] = [names.get(h, "unknown_habit") for h in done]
+    tasks = [
+        {k: t[k] for k in ("status", "xp", "completed_at") if k in t}
+        for t in data.get("tasks", []) or []
+    ]
+    return {"habits": anon_habits, "completions": completions, "tasks": tasks}
+
+
+def load_user_files(pattern: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yield (file name, anonymized data) for each user file matching `pattern`."""
+    for path in sorted(glob.glob(pattern)):
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Skipping {path}: {e}")
+            continue
+        yield os.path.basename(path), anonymize_user_data(data)
+
+
+def run_harness(
+    cases: Iterable[Tuple[str, Dict[str, Any]]],
+    today: datetime.date,
+    legacy: StatsFn = legacy_stats,
+    fast: StatsFn = fast_stats,
+) -> Dict[str, Any]:
+    """Compare every case; returns {"checked", "divergences", "errors"}."""
+    checked = 0
+    divergences = []
+    errors = []
+    for label, data in cases:
+        checked += 1
+        try:
+            diff = compare_stats(data, today, legacy, fast)
+        except Exception as e:
+            errors.append({"case": label, "error": f"{type(e).__name__}: {e}"})
+            continue
+        if diff is not None:
+            divergences.append({"case": label, **diff})
+    return {"checked": checked, "divergences": divergences, "errors": errors}
+
+
+# --- Production shadow mode -------------------------------------------------
+
+def shadow_check(
+    data: Dict[str, Any],
+    legacy_result: Tuple[int, Dict[str, Dict[str, Any]], List[str]],
+    sample_rate: float,
+    today: Optional[datetime.date] = None,
+    background: bool = True,
+) -> bool:
+    """For a `sample_rate` fraction of calls, compare a served calculate_stats
+    result with the fast engine and log any divergence. Returns True if sampled.
+
+    Runs on a daemon thread by default so the request never waits on it.
+    """
+    if sample_rate <= 0 or random.random() >= sample_rate:
+        return False
+    today = today or datetime.date.today()
+    snapshot = copy.deepcopy({k: data.get(k) for k in ("habits", "completions", "tasks")})
+    served = flatten_stats(*legacy_result)
+
+    def _run():
+        try:
+            found = first_divergence(served, fast_stats(snapshot, today))
+        except Exception as e:
+            with _shadow_lock:
+                _shadow_counts["errors"] += 1
+            logger.error(f"Stats shadow check failed: {e}")
+            return
+        with _shadow_lock:
+            _shadow_counts["checked"] += 1
+            if found is not None:
+                _shadow_counts["diverged"] += 1
+        if found is not None:
+            field, legacy_value, fast_value = found
+            diverged_on = first_divergent_date(snapshot, field, today)
+            logger.warning(
+                f"Stats divergence on {field} (first on {diverged_on.isoformat()}): "
+                f"calculate_stats={legacy_value!r} fast={fast_value!r}"
+            )
+
+    if background:
+        threading.Thread(target=_run, name="stats-shadow", daemon=True).start()
+    else:
+        _run()
+    return True
+
+
+def get_shadow_counts() -> Dict[str, int]:
+    """Shadow checks completed, diverged and failed in this process."""
+    with _shadow_lock:
+        return dict(_shadow_counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare calculate_stats with the fast stats engine")
+    parser.add_argument('--random', type=int, default=200, help='Random synthetic histories to check')
+    parser.add_argument('--property', type=int, default=200, help='Random histories with edge-case mutations to check')
+    parser.add_argument('--no-edge-cases', action='store_true', help='Skip the built-in edge cases')
+    parser.add_argument('--files', default=None, help='Glob of real user files (anonymized on load), e.g. "xp_data_*.json"')
+    parser.add_argument('--snapshot-out', default=None, help='Also write the anonymized user files into this directory')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    parser.add_argument('--today', type=datetime.date.fromisoformat, default=None, help='Pin "today" (YYYY-MM-DD)')
+    parser.add_argument('--output', default=None, help='Write the JSON report here')
+    args = parser.parse_args()
+
+    today = args.today or datetime.date.today()
+    rng = random.Random(args.seed)
+
+    def cases() -> Iterator[Tuple[str, Dict[str, Any]]]:
+        if not args.no_edge_cases:
+            for label, data in edge_case_histories(today):
+                yield f"edge:{label}", data
+        for i in range(args.random):
+            yield f"random:{args.seed}:{i}", random_history(rng, today)
+        for i in range(args.property):
+            yield f"property:{args.seed}:{i}", property_history(rng, today)
+        if args.files:
+            if args.snapshot_out:
+                os.makedirs(args.snapshot_out, exist_ok=True)
+            for i, (name, data) in enumerate(load_user_files(args.files)):
+                if args.snapshot_out:
+                    with open(os.path.join(args.snapshot_out, f"xp_data_anon_{i:05d}.json"), 'w') as f:
+                        json.dump(data, f)
+                yield f"file:{name}", data
+
+    report = run_harness(cases(), today)
+    print(f"Checked {report['checked']} histories as of {today.isoformat()}: "
+          f"{len(report['divergences'])} divergence(s), {len(report['errors'])} error(s)")
+    for d in report["divergences"]:
+        print(f"  {d['case']}: {d['field']} first differs on {d['date']} (legacy={d['legacy']!r}, fast={d['fast']!r})")
+    for e in report["errors"]:
+        print(f"  {e['case']}: {e['error']}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"today": today.isoformat(), "seed": args.seed, **report}, f, indent=2)
+    sys.exit(1 if report["divergences"] else 0)
+
+
+if __name__ == '__main__':
+    main()
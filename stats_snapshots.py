@@ -0,0 +1,261 @@
+"""
+Stats Snapshots
+Weekly point-in-time stats per user, so "as of" views only replay the days
+since the latest snapshot. Editing history invalidates snapshots from the
+edited week on.
+"""
+
+import copy
+import datetime
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from xp_timeline import (
+    parse_date,
+    streak_xp,
+    perfect_day_flags,
+    data_revision,
+    XP_PER_LEVEL,
+    PERFECT_DAY_BONUS,
+)
+
+SNAPSHOTS_KEY = "stats_snapshots"
+
+_AS_OF_CACHE_SIZE = 128
+_as_of_cache: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+_as_of_cache_lock = threading.Lock()
+
+
+def _empty_state() -> Dict[str, Any]:
+    return {
+        "date": None,
+        "basis": "",
+        "total_xp": 0,
+        "completions": 0,
+        "perfect_days": 0,
+        "habit_xp": {},
+        "habit_completions": {},
+        "streaks": {},
+        "last_done": {},
+    }
+
+
+def _habit_basis(habits: Dict[str, Any]) -> List[Any]:
+    """The habit fields that change past XP or perfect days."""
+    return [
+        [name, details.get("xp", 0), details.get("active", True), details.get("active_ranges")]
+        for name, details in sorted(habits.items())
+    ]
+
+
+def _dated_inputs(data: Dict[str, Any]) -> Tuple[List[Tuple[datetime.date, str]], List[Tuple[datetime.date, int]]]:
+    """Canonical completion days and dated Done missions, both sorted by date."""
+    days = []
+    for date_str in data.get("completions", {}) or {}:
+        d = parse_date(date_str)
+        if d is not None and d.isoformat() == date_str:
+            days.append((d, date_str))
+    days.sort()
+    tasks = []
+    for task in data.get("tasks", []) or []:
+        if task.get("status") != "Done" or not task.get("completed_at"):
+            continue
+        d = parse_date(task.get("completed_at"))
+        if d is not None:
+            tasks.append((d, task.get("xp", 0)))
+    tasks.sort()
+    return days, tasks
+
+
+def _chain(data: Dict[str, Any], ends: List[datetime.date]) -> List[str]:
+    """Basis hash for each snapshot end date (ascending), chained over the days each covers."""
+    completions = data.get("completions", {}) or {}
+    habit_basis = json.dumps(_habit_basis(data.get("habits", {}) or {}), sort_keys=True, default=str)
+    days, tasks = _dated_inputs(data)
+    out = []
+    basis = ""
+    di = ti = 0
+    for end in ends:
+        chunk_days = []
+        while di < len(days) and days[di][0] <= end:
+            chunk_days.append([days[di][1], sorted(completions[days[di][1]])])
+            di += 1
+        chunk_tasks = []
+        while ti < len(tasks) and tasks[ti][0] <= end:
+            chunk_tasks.append([tasks[ti][0].isoformat(), tasks[ti][1]])
+            ti += 1
+        payload = json.dumps([basis, habit_basis, chunk_days, chunk_tasks], sort_keys=True, default=str)
+        basis = hashlib.sha1(payload.encode("utf-8")).hexdigest()
+        out.append(basis)
+    return out
+
+
+def valid_snapshots(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Persisted snapshots (oldest first) up to the first one whose inputs changed."""
+    snapshots = data.get(SNAPSHOTS_KEY, []) or []
+    ends = [parse_date(s.get("date")) for s in snapshots]
+    if any(e is None for e in ends) or ends != sorted(ends):
+        return []
+    valid = []
+    for snapshot, basis in zip(snapshots, _chain(data, ends)):
+        if snapshot.get("basis") != basis:
+            break
+        valid.append(snapshot)
+    return valid
+
+
+def _replay(data: Dict[str, Any], state: Dict[str, Any], end: datetime.date, checkpoints: Optional[List[datetime.date]] = None) -> List[Dict[str, Any]]:
+    """Advance `state` day by day through `end` (inclusive), following calculate_stats.
+
+    Returns copies of the state at each checkpoint date reached.
+    """
+    habits = data.get("habits", {}) or {}
+    completions = data.get("completions", {}) or {}
+    days, tasks = _dated_inputs(data)
+    if state["date"] is not None:
+        start = parse_date(state["date"]) + datetime.timedelta(days=1)
+    else:
+        anchors = [d for d, _ in days[:1]] + [d for d, _ in tasks[:1]]
+        start = min(anchors) if anchors else end + datetime.timedelta(days=1)
+    n = (end - start).days + 1
+    checkpoints = sorted(c for c in (checkpoints or []) if start <= c <= end)
+    if n <= 0:
+        return []
+
+    perfect = perfect_day_flags(habits, completions, start, n)
+    task_xp: Dict[datetime.date, int] = {}
+    for d, xp in tasks:
+        if start <= d <= end:
+            task_xp[d] = task_xp.get(d, 0) + xp
+
+    taken = []
+    ci = 0
+    for i in range(n):
+        d = start + datetime.timedelta(days=i)
+        yesterday = (d - datetime.timedelta(days=1)).isoformat()
+        for habit in set(completions.get(d.isoformat(), [])):
+            details = habits.get(habit)
+            if details is None:
+                continue
+            streak = state["streaks"].get(habit, 0) + 1 if state["last_done"].get(habit) == yesterday else 1
+            earned = streak_xp(details.get("xp", 0), streak)
+            state["streaks"][habit] = streak
+            state["last_done"][habit] = d.isoformat()
+            state["habit_xp"][habit] = state["habit_xp"].get(habit, 0) + earned
+            state["habit_completions"][habit] = state["habit_completions"].get(habit, 0) + 1
+            state["total_xp"] += earned
+            state["completions"] += 1
+        if perfect[i]:
+            state["total_xp"] += PERFECT_DAY_BONUS
+            state["perfect_days"] += 1
+        state["total_xp"] += task_xp.get(d, 0)
+        state["date"] = d.isoformat()
+        if ci < len(checkpoints) and checkpoints[ci] == d:
+            taken.append(copy.deepcopy(state))
+            ci += 1
+    return taken
+
+
+def _week_ends(first: datetime.date, before: datetime.date) -> List[datetime.date]:
+    """Every Sunday on/after `first` and strictly before `before`."""
+    sunday = first + datetime.timedelta(days=6 - first.weekday())
+    ends = []
+    while sunday < before:
+        ends.append(sunday)
+        sunday += datetime.timedelta(weeks=1)
+    return ends
+
+
+def refresh_snapshots(data: Dict[str, Any], today: Optional[datetime.date] = None) -> bool:
+    """Bring the user's weekly snapshots up to the last completed week.
+
+    Keeps the valid prefix, replays forward from it and appends one snapshot
+    per Sunday before `today`. Returns True when `data` changed (caller saves).
+    """
+    today = today or datetime.date.today()
+    stored = data.get(SNAPSHOTS_KEY, []) or []
+    snapshots = valid_snapshots(data)
+    days, tasks = _dated_inputs(data)
+    anchors = [d for d, _ in days[:1]] + [d for d, _ in tasks[:1]]
+    if not anchors:
+        if stored:
+            data[SNAPSHOTS_KEY] = []
+            return True
+        return False
+
+    state = copy.deepcopy(snapshots[-1]) if snapshots else _empty_state()
+    first = parse_date(state["date"]) + datetime.timedelta(days=1) if state["date"] else min(anchors)
+    ends = _week_ends(first, today)
+    if not ends:
+        if len(snapshots) != len(stored):
+            data[SNAPSHOTS_KEY] = snapshots
+            return True
+        return False
+
+    new = _replay(data, state, ends[-1], ends)
+    all_ends = [parse_date(s["date"]) for s in snapshots] + ends
+    bases = _chain(data, all_ends)[len(snapshots):]
+    for snapshot, basis in zip(new, bases):
+        snapshot["basis"] = basis
+    data[SNAPSHOTS_KEY] = snapshots + new
+    return True
+
+
+def _as_of_view(state: Dict[str, Any], as_of: datetime.date) -> Dict[str, Any]:
+    """Public stats from a replay state; streaks count like the Hero Log (today may still be open)."""
+    alive = {as_of.isoformat(), (as_of - datetime.timedelta(days=1)).isoformat()}
+    total_xp = state["total_xp"]
+    return {
+        "date": as_of.isoformat(),
+        "total_xp": total_xp,
+        "level": 1 + total_xp // XP_PER_LEVEL,
+        "completions": state["completions"],
+        "perfect_days": state["perfect_days"],
+        "habit_xp": dict(state["habit_xp"]),
+        "habit_completions": dict(state["habit_completions"]),
+        "streaks": {h: s for h, s in state["streaks"].items() if state["last_done"].get(h) in alive},
+    }
+
+
+def get_stats_as_of(data: Dict[str, Any], as_of: datetime.date) -> Dict[str, Any]:
+    """Stats as of the end of `as_of`: latest valid snapshot plus a short delta replay.
+
+    Returns {"date", "total_xp", "level", "completions", "perfect_days",
+    "habit_xp", "habit_completions", "streaks"}. Done missions without a
+    completion date are not counted (they have no point in time).
+    """
+    key = (data_revision(data), _snapshot_marker(data), as_of.isoformat())
+    with _as_of_cache_lock:
+        cached = _as_of_cache.get(key)
+        if cached is not None:
+            _as_of_cache.move_to_end(key)
+            return cached
+
+    base = None
+    for snapshot in valid_snapshots(data):
+        if parse_date(snapshot["date"]) > as_of:
+            break
+        base = snapshot
+    state = copy.deepcopy(base) if base else _empty_state()
+    _replay(data, state, as_of)
+    result = _as_of_view(state, as_of)
+
+    with _as_of_cache_lock:
+        _as_of_cache[key] = result
+        if len(_as_of_cache) > _AS_OF_CACHE_SIZE:
+            _as_of_cache.popitem(last=False)
+    return result
+
+
+def _snapshot_marker(data: Dict[str, Any]) -> Tuple[int, Optional[str]]:
+    snapshots = data.get(SNAPSHOTS_KEY, []) or []
+    return len(snapshots), snapshots[-1].get("basis") if snapshots else None
+
+
+def xp_between(data: Dict[str, Any], start: datetime.date, end: datetime.date) -> int:
+    """Dated XP earned in [start, end], from two as-of lookups (past-period leaderboards)."""
+    before = get_stats_as_of(data, start - datetime.timedelta(days=1))["total_xp"]
+    return get_stats_as_of(data, end)["total_xp"] - before
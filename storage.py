@@ -2,15 +2,33 @@ import json
 import os
 import copy
 import re
-import streamlit as st
 import datetime
 import hashlib
 import secrets
 import binascii
-from typing import Dict, Any, Optional
+import itertools
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Iterable, Iterator, List, Tuple
+
+from app_config import get_secret_section, report_error, report_warning
+import job_metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: lease file updates are not locked across processes
+    fcntl = None
 
 # Constants
 DATA_FILE = "xp_data.json"
+LEADERBOARD_FILE = "leaderboard_index.json"
+LEASE_FILE = "scheduler_lease.json"
+# Firestore user documents carry their last save time (stripped on load)
+MODIFIED_AT_FIELD = "_modified_at"
+# Users read per batch in sweeps (StorageProvider.iter_user_data)
+USER_BATCH_SIZE = 200
 DEFAULT_DATA = {
     "goals": ["General"],
     "archived_goals": [],
@@ -19,7 +37,7 @@ DEFAULT_DATA = {
     "completions": {},
     "journal_sections": [],
     "journal_entries": {},
-    "badges": [],  # New
+    "badges": [],  # [{"id", "earned_at"}], see badges.py
     "auth": {},
     "email": None,
     # Coaching profile (onboarding questionnaire)
@@ -108,6 +126,88 @@ class StorageProvider:
         """Return a list of user ids known to the storage provider."""
         raise NotImplementedError
 
+    def list_users_modified_since(self, since: float) -> list[str]:
+        """Return ids of users whose data was saved at or after `since` (epoch seconds).
+
+        Lets sweeps skip users that haven't changed since their last run.
+        Providers that don't track modification times return every user, so
+        callers stay correct (just not incremental).
+        """
+        return self.list_users()
+
+    def load_users(self, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Read several users' data at once, keyed by user id.
+
+        Providers with batch reads override this; by default each user is
+        loaded on its own.
+        """
+        return {user_id: self.load_data(user_id) for user_id in user_ids}
+
+    def iter_user_data(self, user_ids: Optional[Iterable[str]] = None, page_size: int = USER_BATCH_SIZE) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yield (user_id, data) for every user (or `user_ids`), for sweeps.
+
+        Ids are taken `page_size` at a time and each chunk is prefetched with
+        one `load_users` call, so at most one chunk of documents is held
+        however many users there are. Providers may override this to page reads.
+        """
+        ids = iter(self.list_users() if user_ids is None else user_ids)
+        while True:
+            chunk = list(itertools.islice(ids, page_size))
+            if not chunk:
+                return
+            batch = self.load_users(chunk)
+            for user_id in chunk:
+                if user_id in batch:
+                    yield user_id, batch[user_id]
+
+    def save_derived(self, user_id: str, key: str, value: Any) -> None:
+        """Write one derived field of a user's document (e.g. cached stats snapshots).
+
+        Only `key` is written, so edits saved since the caller read the user
+        are kept, and providers that can don't count it as a data change for
+        `list_users_modified_since`. By default the user is reloaded and saved.
+        """
+        data = self.load_data(user_id)
+        data[key] = value
+        self.save_data(user_id, data)
+
+    # Materialized leaderboard (one summary row per user)
+    def load_leaderboard_rows(self) -> Dict[str, Dict[str, Any]]:
+        """Return all leaderboard rows keyed by user id."""
+        raise NotImplementedError
+
+    def save_leaderboard_rows(self, rows: Dict[str, Dict[str, Any]]) -> None:
+        """Upsert leaderboard rows keyed by user id."""
+        raise NotImplementedError
+
+    def delete_leaderboard_rows(self, user_ids: list[str]) -> None:
+        raise NotImplementedError
+
+    # Named leases (e.g. which process runs the background scheduler)
+    def acquire_lease(self, name: str, owner: str, ttl_seconds: float) -> bool:
+        """Take or renew lease `name` for `owner`; False while another owner holds an unexpired lease.
+
+        The check and the write are atomic across processes, so of several
+        contenders exactly one gets the lease.
+        """
+        raise NotImplementedError
+
+    def release_lease(self, name: str, owner: str) -> None:
+        """Give up lease `name` if `owner` holds it."""
+        raise NotImplementedError
+
+    def get_lease(self, name: str) -> Optional[Dict[str, Any]]:
+        """Return the lease record ({owner, acquired_at, renewed_at, expires_at}) or None."""
+        raise NotImplementedError
+
+
+def _take_lease(lease: Optional[Dict[str, Any]], owner: str, ttl_seconds: float, now: float) -> Optional[Dict[str, Any]]:
+    """The renewed/new lease record for `owner`, or None if someone else holds it."""
+    if lease and lease.get("owner") != owner and lease.get("expires_at", 0) > now:
+        return None
+    acquired_at = lease.get("acquired_at", now) if lease and lease.get("owner") == owner else now
+    return {"owner": owner, "acquired_at": acquired_at, "renewed_at": now, "expires_at": now + ttl_seconds}
+
 def validate_email(email: str) -> tuple[bool, str]:
     """
     Validate email format.
@@ -175,11 +275,12 @@ class LocalStorage(StorageProvider):
             return new_data
 
         try:
+            job_metrics.count("storage_reads")
             with open(filename, "r") as f:
                 data = json.load(f)
                 return self._ensure_schema(data)
         except (json.JSONDecodeError, IOError):
-            st.error(f"Error reading data file {filename}. Using default.")
+            report_error(f"Error reading data file {filename}. Using default.")
             return copy.deepcopy(DEFAULT_DATA)
 
     def save_data(self, user_id: str, data: Dict[str, Any]) -> None:
@@ -188,11 +289,22 @@ class LocalStorage(StorageProvider):
             with open(filename, "w") as f:
                 json.dump(data, f, indent=4)
         except IOError as e:
-            st.error(f"Failed to save data: {e}")
+            report_error(f"Failed to save data: {e}")
 
     def _ensure_schema(self, data: Dict[str, Any]) -> Dict[str, Any]:
         return ensure_data_schema(data)
 
+    def save_derived(self, user_id: str, key: str, value: Any) -> None:
+        filename = self._get_filename(user_id)
+        if not os.path.exists(filename):
+            return
+        stat = os.stat(filename)
+        data = self.load_data(user_id)
+        data[key] = value
+        self.save_data(user_id, data)
+        # The mtime is the user's change watermark (and their leaderboard row's source version)
+        os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
     # Auth helpers
     def user_exists(self, user_id: str) -> bool:
         filename = self._get_filename(user_id)
@@ -216,6 +328,103 @@ class LocalStorage(StorageProvider):
                     users.add(user)
         return list(users)
 
+    def list_users_modified_since(self, since: float) -> list[str]:
+        # The data file's mtime is the watermark: a stat per user, no reads
+        return [u for u in self.list_users() if os.path.getmtime(self._get_filename(u)) >= since]
+
+    # Leaderboard index helpers
+    def _read_leaderboard_file(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(LEADERBOARD_FILE):
+            return {}
+        try:
+            with open(LEADERBOARD_FILE, "r") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, IOError):
+            return {}
+
+    def load_leaderboard_rows(self) -> Dict[str, Dict[str, Any]]:
+        """Return index rows whose user file still exists and is unchanged.
+
+        Rows record the data file's mtime when written, so edits made outside
+        the app (or deleted users) drop out and get recomputed by the caller.
+        """
+        rows = {}
+        for user_id, row in self._read_leaderboard_file().items():
+            filename = self._get_filename(user_id)
+            if not os.path.exists(filename):
+                continue
+            if row.get("source_mtime") != os.path.getmtime(filename):
+                continue
+            rows[user_id] = row
+        return rows
+
+    def save_leaderboard_rows(self, rows: Dict[str, Dict[str, Any]]) -> None:
+        try:
+            with self._locked_json(LEADERBOARD_FILE) as index:
+                # Prune rows for users whose data file is gone while rewriting the index
+                for user_id in [u for u in index if not os.path.exists(self._get_filename(u))]:
+                    del index[user_id]
+                for user_id, row in rows.items():
+                    filename = self._get_filename(user_id)
+                    row = dict(row)
+                    row["source_mtime"] = os.path.getmtime(filename) if os.path.exists(filename) else None
+                    index[user_id] = row
+        except IOError as e:
+            report_error(f"Failed to save leaderboard index: {e}")
+
+    def delete_leaderboard_rows(self, user_ids: list[str]) -> None:
+        try:
+            with self._locked_json(LEADERBOARD_FILE) as index:
+                for user_id in user_ids:
+                    index.pop(user_id, None)
+        except IOError as e:
+            report_error(f"Failed to save leaderboard index: {e}")
+
+    # Shared JSON files (leaderboard index, leases): read-modify-written under an
+    # exclusive file lock and replaced atomically, so concurrent writers don't drop each other's entries
+    @contextmanager
+    def _locked_json(self, path: str):
+        with open(path + ".lock", "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                content = {}
+                if os.path.exists(path):
+                    try:
+                        with open(path, "r") as f:
+                            content = json.load(f)
+                    except (json.JSONDecodeError, IOError):
+                        content = {}
+                before = copy.deepcopy(content)
+                yield content
+                if content != before:
+                    tmp = path + ".tmp"
+                    with open(tmp, "w") as f:
+                        json.dump(content, f, indent=2)
+                    os.replace(tmp, path)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _locked_leases(self):
+        return self._locked_json(LEASE_FILE)
+
+    def acquire_lease(self, name: str, owner: str, ttl_seconds: float) -> bool:
+        with self._locked_leases() as leases:
+            lease = _take_lease(leases.get(name), owner, ttl_seconds, time.time())
+            if lease is None:
+                return False
+            leases[name] = lease
+            return True
+
+    def release_lease(self, name: str, owner: str) -> None:
+        with self._locked_leases() as leases:
+            if (leases.get(name) or {}).get("owner") == owner:
+                del leases[name]
+
+    def get_lease(self, name: str) -> Optional[Dict[str, Any]]:
+        with self._locked_leases() as leases:
+            return leases.get(name)
 
     def set_user_password(self, user_id: str, password: str) -> None:
         # Load or create data, then set salted pbkdf2 hash
@@ -389,6 +598,94 @@ class LocalStorage(StorageProvider):
         data['auth'] = auth
         self.save_data(user_id, data)
 
+class MemoryStorage(LocalStorage):
+    """Keeps every user in a dict (simulations and tests); the auth helpers are LocalStorage's.
+
+    `ops` counts calls per storage operation, so a simulation can report how
+    much storage traffic each job generates.
+    """
+
+    def __init__(self, users: Optional[Dict[str, Dict[str, Any]]] = None):
+        self._lock = threading.RLock()
+        self._users: Dict[str, Dict[str, Any]] = {}
+        self._modified: Dict[str, float] = {}
+        self._leaderboard: Dict[str, Dict[str, Any]] = {}
+        self._leases: Dict[str, Dict[str, Any]] = {}
+        self.ops: Counter = Counter()
+        for user_id, data in (users or {}).items():
+            self.save_data(user_id, data)
+        self.ops.clear()
+
+    def load_data(self, user_id: str = "default") -> Dict[str, Any]:
+        with self._lock:
+            self.ops["load_data"] += 1
+            job_metrics.count("storage_reads")
+            data = self._users.get(user_id)
+            if data is None:
+                data = copy.deepcopy(DEFAULT_DATA)
+                self.save_data(user_id, data)
+            return self._ensure_schema(copy.deepcopy(data))
+
+    def save_data(self, user_id: str, data: Dict[str, Any]) -> None:
+        with self._lock:
+            self.ops["save_data"] += 1
+            self._users[user_id] = copy.deepcopy(data)
+            self._modified[user_id] = time.time()
+
+    def save_derived(self, user_id: str, key: str, value: Any) -> None:
+        with self._lock:
+            self.ops["save_derived"] += 1
+            if user_id in self._users:
+                self._users[user_id][key] = copy.deepcopy(value)
+
+    def user_exists(self, user_id: str) -> bool:
+        self.ops["user_exists"] += 1
+        return user_id in self._users
+
+    def list_users(self) -> list[str]:
+        self.ops["list_users"] += 1
+        with self._lock:
+            return list(self._users)
+
+    def list_users_modified_since(self, since: float) -> list[str]:
+        self.ops["list_users_modified_since"] += 1
+        with self._lock:
+            return [u for u, t in self._modified.items() if t >= since]
+
+    def load_leaderboard_rows(self) -> Dict[str, Dict[str, Any]]:
+        self.ops["load_leaderboard_rows"] += 1
+        with self._lock:
+            return {u: dict(r) for u, r in self._leaderboard.items() if u in self._users}
+
+    def save_leaderboard_rows(self, rows: Dict[str, Dict[str, Any]]) -> None:
+        self.ops["save_leaderboard_rows"] += 1
+        with self._lock:
+            self._leaderboard.update({u: dict(r) for u, r in rows.items()})
+
+    def delete_leaderboard_rows(self, user_ids: list[str]) -> None:
+        self.ops["delete_leaderboard_rows"] += 1
+        with self._lock:
+            for user_id in user_ids:
+                self._leaderboard.pop(user_id, None)
+
+    def acquire_lease(self, name: str, owner: str, ttl_seconds: float) -> bool:
+        with self._lock:
+            lease = _take_lease(self._leases.get(name), owner, ttl_seconds, time.time())
+            if lease is None:
+                return False
+            self._leases[name] = lease
+            return True
+
+    def release_lease(self, name: str, owner: str) -> None:
+        with self._lock:
+            if (self._leases.get(name) or {}).get("owner") == owner:
+                del self._leases[name]
+
+    def get_lease(self, name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._leases.get(name)
+
+
 class FirebaseStorage(StorageProvider):
     """Stores data in Firebase Firestore."""
 
@@ -400,9 +697,8 @@ class FirebaseStorage(StorageProvider):
             # Check if already initialized
             if not firebase_admin._apps:
                 # 1. Try Streamlit Secrets (Best for Cloud)
-                if hasattr(st, "secrets") and "firebase" in st.secrets:
-                    # Convert AttrDict to standard dict
-                    cred_dict = dict(st.secrets["firebase"])
+                cred_dict = get_secret_section("firebase")
+                if cred_dict:
                     cred = credentials.Certificate(cred_dict)
                     firebase_admin.initialize_app(cred)
 
@@ -413,15 +709,15 @@ class FirebaseStorage(StorageProvider):
                         cred = credentials.Certificate(cred_path)
                         firebase_admin.initialize_app(cred)
                     else:
-                        st.warning("Firebase credentials not found. Set 'firebase' in st.secrets or provide 'firebase_credentials.json'.")
+                        report_warning("Firebase credentials not found. Set 'firebase' in st.secrets or provide 'firebase_credentials.json'.")
                         self.db = None
                         return
 
             self.db = firestore.client()
         except ImportError:
-            st.error("firebase-admin package not installed.")
+            report_error("firebase-admin package not installed.")
         except Exception as e:
-            st.error(f"Failed to initialize Firebase: {e}")
+            report_error(f"Failed to initialize Firebase: {e}")
             self.db = None
 
     def load_data(self, user_id: str) -> Dict[str, Any]:
@@ -430,6 +726,7 @@ class FirebaseStorage(StorageProvider):
 
         safe_id = sanitize_user_id(user_id)
         doc_ref = self.db.collection("users").document(safe_id)
+        job_metrics.count("storage_reads")
         doc = doc_ref.get()
 
         if doc.exists:
@@ -447,9 +744,16 @@ class FirebaseStorage(StorageProvider):
 
         safe_id = sanitize_user_id(user_id)
         doc_ref = self.db.collection("users").document(safe_id)
-        doc_ref.set(data)
+        doc_ref.set({**data, MODIFIED_AT_FIELD: time.time()})
+
+    def save_derived(self, user_id: str, key: str, value: Any) -> None:
+        if not self.db:
+            return
+        # A field update leaves the rest of the document and its MODIFIED_AT_FIELD alone
+        self.db.collection("users").document(sanitize_user_id(user_id)).update({key: value})
 
     def _ensure_schema(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        data.pop(MODIFIED_AT_FIELD, None)
         return ensure_data_schema(data)
 
     def set_notifications_enabled(self, user_id: str, enabled: bool) -> None:
@@ -494,6 +798,109 @@ class FirebaseStorage(StorageProvider):
         except Exception:
             return []
 
+    def list_users_modified_since(self, since: float) -> list[str]:
+        # Documents last written before the watermark field existed never match;
+        # they are unchanged since, which is what callers ask about
+        if not self.db:
+            return []
+        query = self.db.collection("users").where(MODIFIED_AT_FIELD, ">=", since).select([])
+        return [doc.id for doc in query.stream()]
+
+    def load_users(self, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch a batch of user documents in one round trip (Client.get_all)."""
+        if not self.db:
+            return {}
+        by_doc_id = {sanitize_user_id(user_id): user_id for user_id in user_ids}
+        refs = [self.db.collection("users").document(doc_id) for doc_id in by_doc_id]
+        docs = list(self.db.get_all(refs))
+        job_metrics.count("storage_reads", len(docs))
+        found = {by_doc_id[doc.id]: self._ensure_schema(doc.to_dict() or {}) for doc in docs if doc.exists}
+        # Missing documents are created with defaults, as load_data does
+        for user_id in user_ids:
+            if user_id not in found:
+                found[user_id] = self.load_data(user_id)
+        return found
+
+    def iter_user_data(self, user_ids: Optional[Iterable[str]] = None, page_size: int = USER_BATCH_SIZE) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Stream user documents in pages of `page_size` (ordered by id)."""
+        if not self.db:
+            return
+        if user_ids is not None:
+            yield from super().iter_user_data(user_ids, page_size)
+            return
+
+        last = None
+        while True:
+            query = self.db.collection("users").order_by("__name__").limit(page_size)
+            if last is not None:
+                query = query.start_after(last)
+            docs = list(query.stream())
+            job_metrics.count("storage_reads", len(docs))
+            for doc in docs:
+                yield doc.id, self._ensure_schema(doc.to_dict() or {})
+            if len(docs) < page_size:
+                return
+            last = docs[-1]
+
+    def load_leaderboard_rows(self) -> Dict[str, Dict[str, Any]]:
+        if not self.db:
+            return {}
+        return {doc.id: doc.to_dict() for doc in self.db.collection("leaderboard").stream()}
+
+    def save_leaderboard_rows(self, rows: Dict[str, Dict[str, Any]]) -> None:
+        if not self.db:
+            return
+        items = list(rows.items())
+        # Firestore batches are capped at 500 writes
+        for i in range(0, len(items), 500):
+            batch = self.db.batch()
+            for user_id, row in items[i:i + 500]:
+                batch.set(self.db.collection("leaderboard").document(sanitize_user_id(user_id)), row)
+            batch.commit()
+
+    def delete_leaderboard_rows(self, user_ids: list[str]) -> None:
+        if not self.db:
+            return
+        for user_id in user_ids:
+            self.db.collection("leaderboard").document(sanitize_user_id(user_id)).delete()
+
+    def acquire_lease(self, name: str, owner: str, ttl_seconds: float) -> bool:
+        if not self.db:
+            return False
+        from firebase_admin import firestore
+        ref = self.db.collection("leases").document(name)
+
+        @firestore.transactional
+        def _acquire(transaction) -> bool:
+            snapshot = ref.get(transaction=transaction)
+            lease = _take_lease(snapshot.to_dict() if snapshot.exists else None, owner, ttl_seconds, time.time())
+            if lease is None:
+                return False
+            transaction.set(ref, lease)
+            return True
+
+        return _acquire(self.db.transaction())
+
+    def release_lease(self, name: str, owner: str) -> None:
+        if not self.db:
+            return
+        from firebase_admin import firestore
+        ref = self.db.collection("leases").document(name)
+
+        @firestore.transactional
+        def _release(transaction) -> None:
+            snapshot = ref.get(transaction=transaction)
+            if snapshot.exists and (snapshot.to_dict() or {}).get("owner") == owner:
+                transaction.delete(ref)
+
+        _release(self.db.transaction())
+
+    def get_lease(self, name: str) -> Optional[Dict[str, Any]]:
+        if not self.db:
+            return None
+        doc = self.db.collection("leases").document(name).get()
+        return doc.to_dict() if doc.exists else None
+
     def set_user_password(self, user_id: str, password: str) -> None:
         data = self.load_data(user_id)
         if not password:
@@ -701,22 +1108,33 @@ def ensure_data_schema(data: Dict[str, Any]) -> Dict[str, Any]:
 
     return data
 
+_storage_override: Optional[StorageProvider] = None
+
+
+def set_storage(provider: Optional[StorageProvider]) -> None:
+    """Make `get_storage()` return `provider` (e.g. a MemoryStorage in a simulation); None restores the default."""
+    global _storage_override
+    _storage_override = provider
+
+
 def get_storage() -> StorageProvider:
     """Factory to get the configured storage provider.
 
     Prefer `LocalStorage` unless Firebase appears to be configured and fully initialized.
     If Firebase is configured but fails to initialize (no DB), fall back to `LocalStorage`.
     """
+    if _storage_override is not None:
+        return _storage_override
     try:
         import firebase_admin  # type: ignore
-        cfg_present = (hasattr(st, "secrets") and st.secrets.get("firebase")) or os.path.exists(os.getenv("FIREBASE_CREDENTIALS", "firebase_credentials.json"))
+        cfg_present = get_secret_section("firebase") or os.path.exists(os.getenv("FIREBASE_CREDENTIALS", "firebase_credentials.json"))
         if cfg_present:
             fb = FirebaseStorage()
             # Use Firebase only if DB client was successfully created
             if getattr(fb, "db", None):
                 return fb
             else:
-                st.warning("Firebase configured but not usable; falling back to LocalStorage.")
+                report_warning("Firebase configured but not usable; falling back to LocalStorage.")
     except Exception:
         # firebase-admin not installed or some other import-time error
         pass
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+synthetic_data.py
+
+Deterministic synthetic users for load and scale testing.
+
+Generates N users with configurable years of history, habit counts,
+completion probabilities, mission volumes and journal sizes, and writes them
+through any StorageProvider one user at a time. Every user is derived from
+(seed, user index), so user 42 is identical whether you generate 10 or 100k
+users, and any benchmark can be reproduced from its command line.
+
+Examples:
+
+# 1k users with two years of history into ./bench_data (LocalStorage)
+python synthetic_data.py --users 1000 --years 2 --data-dir bench_data
+
+# Same data again, pinned to a fixed "today" for reproducible numbers
+python synthetic_data.py --users 1000 --years 2 --today 2025-12-31 --seed 7
+"""
+
+import argparse
+import copy
+import datetime
+import os
+import random
+import sys
+import uuid
+from typing import Dict, Any, Iterator, Optional, Tuple
+
+GOALS = ["Health", "Career", "Mind", "Relationships", "Finance", "General"]
+HABIT_NAMES = [
+    "Read", "Run", "Meditate", "Stretch", "Journal", "Walk", "Code", "Guitar",
+    "Spanish", "Cold Shower", "Pushups", "Plank", "Floss", "No Sugar", "Sleep by 11",
+    "Water", "Yoga", "Call Family", "Budget Review", "Inbox Zero",
+]
+PRIORITIES = ["High", "Medium", "Low"]
+# User ids are zero-padded to a fixed width so user i has the same id in datasets of any size
+USER_ID_WIDTH = 5
+TIMEZONES = ["UTC", "America/New_York", "America/Los_Angeles", "Europe/London", "Europe/Berlin", "Asia/Tokyo", "Australia/Sydney"]
+WORDS = (
+    "today felt slow but I showed up anyway and that counts more than the result "
+    "tomorrow I want to start earlier and keep the streak alive no excuses just reps"
+).split()
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def generate_user_data(
+    rng: random.Random,
+    today: datetime.date,
+    years: float = 1.0,
+    habits: int = 5,
+    completion_prob: float = 0.6,
+    tasks: int = 50,
+    journal_entries: int = 20,
+    journal_words: int = 60,
+) -> Dict[str, Any]:
+    """One user's data document (same schema the app writes)."""
+    from storage import DEFAULT_DATA, ensure_data_schema
+
+    data = copy.deepcopy(DEFAULT_DATA)
+    history_days = max(int(years * 365), 1)
+    start = today - datetime.timedelta(days=history_days - 1)
+
+    names = rng.sample(HABIT_NAMES, min(habits, len(HABIT_NAMES)))
+    names += [f"Habit {i}" for i in range(len(names), habits)]
+    probs = {}
+    for name in names:
+        data["habits"][name] = {
+            "xp": rng.choice([5, 10, 10, 15, 20, 25]),
+            "active": rng.random() > 0.1,
+            "goal": rng.choice(GOALS),
+            "description": "",
+            "context": "General",
+            "cadence": "Daily",
+        }
+        probs[name] = min(max(rng.gauss(completion_prob, 0.15), 0.02), 0.98)
+    data["goals"] = sorted({h["goal"] for h in data["habits"].values()} | {"General"})
+
+    # Habit check-ins: a streaky Bernoulli walk per habit
+    done_yesterday = {name: False for name in names}
+    for i in range(history_days):
+        d = (start + datetime.timedelta(days=i)).isoformat()
+        done = []
+        for name in names:
+            p = probs[name] + (0.1 if done_yesterday[name] else -0.05)
+            done_yesterday[name] = rng.random() < p
+            if done_yesterday[name]:
+                done.append(name)
+        if done:
+            data["completions"][d] = done
+
+    for _ in range(tasks):
+        created = start + datetime.timedelta(days=rng.randrange(history_days))
+        task = {
+            "id": _uuid(rng),
+            "title": f"Mission {rng.randrange(10 ** 6)}",
+            "description": "",
+            "xp": rng.choice([10, 20, 30, 50]),
+            "goal": rng.choice(data["goals"]),
+            "priority": rng.choice(PRIORITIES),
+            "due_date": (created + datetime.timedelta(days=rng.randrange(1, 30))).isoformat() if rng.random() < 0.7 else None,
+            "status": "Todo",
+            "created_at": datetime.datetime.combine(created, datetime.time(9)).isoformat(),
+            "context": "General",
+            "cadence": "One-Off",
+            "tags": rng.sample(["deep-work", "admin", "home", "health", "q1"], rng.randrange(3)),
+        }
+        completed = created + datetime.timedelta(days=rng.randrange(0, 14))
+        if completed <= today and rng.random() < 0.7:
+            task["status"] = "Done"
+            task["completed_at"] = datetime.datetime.combine(completed, datetime.time(rng.randrange(7, 23))).isoformat()
+        data["tasks"].append(task)
+
+    if journal_entries:
+        data["journal_sections"] = ["Reflections"]
+        data["journal_entries"]["Reflections"] = [
+            {
+                "id": _uuid(rng),
+                "date": datetime.datetime.combine(start + datetime.timedelta(days=rng.randrange(history_days)), datetime.time(21)).isoformat(),
+                "text": " ".join(rng.choice(WORDS) for _ in range(journal_words)),
+            }
+            for _ in range(journal_entries)
+        ]
+
+    profile = data["coaching_profile"]
+    profile["timezone"] = rng.choice(TIMEZONES)
+    profile["digest_time"] = f"{rng.randrange(6, 23):02d}:{rng.choice(['00', '30'])}"
+    profile["main_habit"] = names[0] if names else ""
+    profile["onboarding_complete"] = True
+    return ensure_data_schema(data)
+
+
+def iter_synthetic_users(
+    users: int,
+    seed: int = 0,
+    prefix: str = "synth_",
+    today: Optional[datetime.date] = None,
+    **options: Any,
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yield (user_id, data) for `users` users; user i depends only on (seed, i)."""
+    today = today or datetime.date.today()
+    for i in range(users):
+        rng = random.Random(f"{seed}:{i}")
+        yield f"{prefix}{i:0{USER_ID_WIDTH}d}", generate_user_data(rng, today, **options)
+
+
+def write_synthetic_users(storage, users: int, **kwargs: Any) -> int:
+    """Generate users and save them through `storage` one at a time. Returns the count."""
+    written = 0
+    for user_id, data in iter_synthetic_users(users, **kwargs):
+        storage.save_data(user_id, data)
+        written += 1
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate deterministic synthetic XP Tracker users")
+    parser.add_argument('--users', type=int, default=10, help='Number of users to generate')
+    parser.add_argument('--years', type=float, default=1.0, help='Years of history per user')
+    parser.add_argument('--habits', type=int, default=5, help='Habits per user')
+    parser.add_argument('--completion-prob', type=float, default=0.6, help='Mean daily completion probability per habit')
+    parser.add_argument('--tasks', type=int, default=50, help='Missions per user')
+    parser.add_argument('--journal-entries', type=int, default=20, help='Journal entries per user')
+    parser.add_argument('--journal-words', type=int, default=60, help='Words per journal entry')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    parser.add_argument('--prefix', default='synth_', help='User id prefix')
+    parser.add_argument('--today', type=datetime.date.fromisoformat, default=None, help='Pin "today" (YYYY-MM-DD) for reproducible data')
+    parser.add_argument('--data-dir', default=None, help='Write LocalStorage files into this directory instead of the configured storage')
+    args = parser.parse_args()
+
+    if args.data_dir:
+        from storage import LocalStorage
+        os.makedirs(args.data_dir, exist_ok=True)
+        os.chdir(args.data_dir)
+        storage = LocalStorage()
+    else:
+        from storage import get_storage
+        storage = get_storage()
+
+    count = write_synthetic_users(
+        storage,
+        args.users,
+        seed=args.seed,
+        prefix=args.prefix,
+        today=args.today,
+        years=args.years,
+        habits=args.habits,
+        completion_prob=args.completion_prob,
+        tasks=args.tasks,
+        journal_entries=args.journal_entries,
+        journal_words=args.journal_words,
+    )
+    print(f"Wrote {count} synthetic user(s) via {type(storage).__name__}")
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+import datetime
+
+import admin_analytics
+from storage import MemoryStorage
+
+
+TODAY = datetime.date(2025, 12, 10)  # a Wednesday
+
+
+def _days(*offsets):
+    return {(TODAY - datetime.timedelta(days=o)).isoformat(): ["Read"] for o in offsets}
+
+
+def test_report_counts_active_users_cohorts_and_retention():
+    summaries = {
+        # first active 40 days ago, back on D1 and D30, active today
+        "a": admin_analytics.summarize_user({"completions": _days(40, 39, 10, 0)}, TODAY),
+        # first active 8 days ago, back on D7 only
+        "b": admin_analytics.summarize_user({"completions": _days(8, 1)}, TODAY),
+        # never active
+        "c": admin_analytics.summarize_user({"completions": {}}, TODAY),
+    }
+    drip = {"a": {"welcome": {"sent_at": "x"}, "getting_started": {"sent_at": "x"}}, "b": {"welcome": {"sent_at": "x"}}}
+    report = admin_analytics.build_report(summaries, drip, TODAY)
+
+    assert report["total_users"] == 3 and report["ever_active"] == 2
+    assert report["dau"][-1] == {"date": TODAY.isoformat(), "users": 1}
+    assert report["dau"][-2]["users"] == 1
+    # This week (Mon 12-08 ..) has both; last week only "b" (12-02), "a" was on Sun 11-30
+    assert report["wau"][-1] == {"week": "2025-12-08", "users": 2}
+    assert report["wau"][-2]["users"] == 1
+    assert report["wau"][-3]["users"] == 1
+    assert report["retention"] == {"d1": 0.5, "d7": 0.5, "d30": 1.0}
+    assert [c["week"] for c in report["cohorts"]] == ["2025-10-27", "2025-12-01"]
+    assert report["drip_funnel"][:2] == [
+        {"stage": "welcome", "day": 0, "users": 2},
+        {"stage": "getting_started", "day": 1, "users": 1},
+    ]
+
+
+def test_refresh_only_loads_users_saved_since_the_last_refresh(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    storage = MemoryStorage({"a": {"completions": _days(3)}, "b": {"completions": _days(2)}})
+    assert admin_analytics.refresh_admin_analytics(storage, TODAY)["recomputed_users"] == 2
+    assert storage.ops["load_data"] == 2
+
+    storage.ops.clear()
+    assert admin_analytics.refresh_admin_analytics(storage, TODAY)["recomputed_users"] == 0
+    assert storage.ops["load_data"] == 0
+
+    storage.save_data("b", {"completions": {**_days(2), **_days(0)}})
+    report = admin_analytics.refresh_admin_analytics(storage, TODAY)
+    assert report["recomputed_users"] == 1 and storage.ops["load_data"] == 1
+    assert report["dau"][-1]["users"] == 1
+    storage._users.pop("a")
+    assert admin_analytics.get_admin_analytics(storage, refresh=True)["total_users"] == 1
@@ -0,0 +1,49 @@
+import datetime
+
+import analytics
+from xp_timeline import build_xp_timeline
+
+
+TODAY = datetime.date(2025, 12, 10)
+WEEK = (datetime.date(2025, 12, 1), datetime.date(2025, 12, 7))
+
+
+def _sample_data():
+    return {
+        "habits": {
+            "Read": {"xp": 10, "active": True, "goal": "Mind"},
+            "Run": {"xp": 20, "active": True, "goal": "Health"},
+            "Old": {"xp": 5, "active": False, "goal": "Health"},
+        },
+        "completions": {
+            "2025-12-01": ["Read", "Run"],
+            "2025-12-02": ["Read"],
+            "2025-12-03": ["Read", "Old"],
+            "2025-12-05": ["Read", "Run"],
+        },
+        "tasks": [
+            {"title": "a", "status": "Done", "completed_at": "2025-12-02T10:00:00", "xp": 30, "goal": "Mind"},
+            {"title": "b", "status": "Todo", "xp": 99},
+        ],
+    }
+
+
+def test_frame_is_typed_long_format():
+    frame = analytics.build_analytics_frame(_sample_data(), TODAY)
+    assert list(frame.columns) == analytics.FRAME_COLUMNS
+    assert str(frame["kind"].dtype) == "category" and str(frame["habit"].dtype) == "category"
+    assert frame.groupby("kind", observed=False)["xp"].sum().to_dict() == {"habit": 10 + 20 + 11 + 12 + 5 + 10 + 20, "task": 30, "bonus": 100}
+    assert frame[frame["kind"] == "habit"].groupby("goal", observed=True).size().to_dict() == {"Health": 3, "Mind": 4}
+
+
+def test_weekly_report_matches_timeline_and_is_memoized():
+    data = _sample_data()
+    report = analytics.get_weekly_report(data, -1, *WEEK, today=TODAY)
+    timeline = build_xp_timeline(data, TODAY)
+    assert report["total_xp"] == timeline.period_total(*WEEK)
+    assert report["daily"]["XP"].tolist() == timeline.daily_window("xp", *WEEK)
+    assert report["daily"]["Habits Completed"].tolist() == [2, 1, 2, 0, 2, 0, 0]
+    assert report["habits"].set_index("Habit")["Completions"].to_dict() == {"Read": 4, "Run": 2}
+    assert analytics.get_weekly_report(data, -1, *WEEK, today=TODAY) is report
+    data["completions"]["2025-12-06"] = ["Run"]
+    assert analytics.get_weekly_report(data, -1, *WEEK, today=TODAY) is not report
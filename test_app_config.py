@@ -0,0 +1,40 @@
+import subprocess
+import sys
+
+import app_config
+import email_utils
+
+
+def test_headless_secrets_come_from_secrets_toml(tmp_path, monkeypatch):
+    secrets = tmp_path / "secrets.toml"
+    secrets.write_text('gemini_api_key = "abc"\n\n[smtp]\nhost = "smtp.example.com"\nport = 587\n')
+    monkeypatch.setattr(app_config, "_streamlit", lambda: None)
+    monkeypatch.setattr(app_config, "SECRETS_FILES", [str(tmp_path / "missing.toml"), str(secrets)])
+    monkeypatch.setattr(app_config, "_file_secrets", None)
+
+    assert app_config.get_secret("gemini_api_key") == "abc"
+    assert app_config.get_secret("nope", "default") == "default"
+    assert email_utils._get_smtp_config() == {"host": "smtp.example.com", "port": 587}
+
+
+def test_worker_imports_no_streamlit():
+    code = (
+        "import sys, scheduler_service, drip_campaigns, daily_digest, leaderboard, stats_snapshots, admin_analytics\n"
+        "sys.exit('streamlit' in sys.modules)\n"
+    )
+    assert subprocess.run([sys.executable, "-c", code], capture_output=True).returncode == 0
+
+
+def test_settings_prefer_the_environment_then_secrets(tmp_path, monkeypatch):
+    import tracker
+
+    secrets = tmp_path / "secrets.toml"
+    secrets.write_text("stats_shadow_sample_rate = 0.25\n")
+    monkeypatch.setattr(app_config, "_streamlit", lambda: None)
+    monkeypatch.setattr(app_config, "SECRETS_FILES", [str(secrets)])
+    monkeypatch.setattr(app_config, "_file_secrets", None)
+    monkeypatch.delenv("STATS_SHADOW_SAMPLE_RATE", raising=False)
+
+    assert tracker.get_stats_shadow_sample_rate() == 0.25
+    monkeypatch.setenv("STATS_SHADOW_SAMPLE_RATE", "0.5")
+    assert tracker.get_stats_shadow_sample_rate() == 0.5
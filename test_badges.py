@@ -0,0 +1,48 @@
+import datetime
+import threading
+
+import badges
+from badges import badge_metrics, evaluate_badges, earned_badge_ids, emit_badge_events, get_earned_badges
+
+
+NOW = datetime.datetime(2025, 12, 10, 9, 30)
+
+
+def _metrics(streak=0, perfect=0, tasks=0, level=1):
+    return badge_metrics({"Read": {"streak": streak, "level": 1}}, perfect, tasks, level)
+
+
+def test_first_evaluation_backfills_silently():
+    data = {"badges": ["week_streak"]}
+    assert evaluate_badges(data, _metrics(streak=8, tasks=12), NOW) == []
+    assert earned_badge_ids(data) == ["week_streak", "task_force"]
+    assert get_earned_badges(data)[0]["earned_at"] is None
+
+
+def test_new_badges_are_persisted_with_timestamp_and_emitted():
+    data = {}
+    evaluate_badges(data, _metrics(), NOW)
+    assert evaluate_badges(data, _metrics(streak=3), NOW) == []
+    assert evaluate_badges(data, _metrics(streak=7, level=10), NOW) == ["week_streak", "veteran"]
+    assert get_earned_badges(data)[0] == {"id": "week_streak", "earned_at": "2025-12-10T09:30:00"}
+    # Earned badges stay earned after the streak breaks
+    assert evaluate_badges(data, _metrics(streak=0, level=10), NOW) == []
+    assert earned_badge_ids(data) == ["week_streak", "veteran"]
+
+    sent = []
+    emit_badge_events("alice", ["veteran"], notify=lambda *args: sent.append(args))
+    assert sent == [("alice", "⚔️ Veteran", "Reach Level 10 Profile")]
+
+
+def test_queued_badge_events_are_sent_off_the_calling_thread(monkeypatch):
+    sent = threading.Event()
+    callers = []
+
+    def fake_emit(user_id, badge_ids):
+        callers.append((user_id, badge_ids, threading.current_thread() is threading.main_thread()))
+        sent.set()
+
+    monkeypatch.setattr(badges, "emit_badge_events", fake_emit)
+    badges.queue_badge_events("alice", ["veteran"])  # no scheduler running: background thread
+    assert sent.wait(5)
+    assert callers == [("alice", ["veteran"], False)]
@@ -0,0 +1,70 @@
+from datetime import date, datetime, timedelta, timezone
+
+import daily_digest
+from daily_digest import dispatch_due_digests, next_digest_at
+
+
+def _utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+NEW_YORK = {"timezone": "America/New_York", "digest_time": "20:00", "onboarding_complete": True}
+TOKYO = {"timezone": "Asia/Tokyo", "digest_time": "07:30", "onboarding_complete": True}
+
+
+def test_next_digest_at_uses_local_time_date_and_grace():
+    # 19:00 EDT: tonight's 20:00 digest, for the local date
+    assert next_digest_at(NEW_YORK, _utc(2025, 6, 10, 23, 0)) == (_utc(2025, 6, 11, 0, 0), "2025-06-10")
+    # Already sent today -> tomorrow
+    assert next_digest_at(NEW_YORK, _utc(2025, 6, 10, 23, 0), {"2025-06-10"}) == (_utc(2025, 6, 12, 0, 0), "2025-06-11")
+    # 22:30 local, missed by 2.5h: still within grace
+    assert next_digest_at(NEW_YORK, _utc(2025, 6, 11, 2, 30))[1] == "2025-06-10"
+    # 00:30 local next day, missed by 4.5h: skip to the new day
+    assert next_digest_at(NEW_YORK, _utc(2025, 6, 11, 4, 30))[1] == "2025-06-11"
+
+
+class FakeStorage:
+    def __init__(self, users):
+        self.users = users
+
+    def iter_user_data(self, user_ids=None):
+        for user_id, data in self.users.items():
+            yield user_id, data
+
+
+def test_dispatch_processes_only_users_due_in_the_slot(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    users = {
+        "ny": {"coaching_profile": NEW_YORK},
+        "tokyo": {"coaching_profile": TOKYO},
+        "new": {"coaching_profile": {"onboarding_complete": False}},
+    }
+    storage = FakeStorage(users)
+    processed = []
+    monkeypatch.setattr(daily_digest, "_index_built_at", None)
+    monkeypatch.setattr(daily_digest, "_dispatch_index", {})
+    monkeypatch.setattr(daily_digest, "get_coaching_profile", lambda user_id: users[user_id]["coaching_profile"])
+    monkeypatch.setattr(daily_digest, "_process_user_digest", lambda user_id, day: processed.append((user_id, day)) or True)
+
+    # 22:20 UTC = 07:20 JST on June 11: nobody due yet
+    assert dispatch_due_digests(_utc(2025, 6, 10, 22, 20), storage, workers=2) == 0
+    # 22:30 UTC = 07:30 JST: Tokyo's digest, for Tokyo's June 11
+    assert dispatch_due_digests(_utc(2025, 6, 10, 22, 31), storage, workers=2) == 1
+    assert processed == [("tokyo", "2025-06-11")]
+    # 00:00 UTC = 20:00 EDT June 10: New York's turn, for New York's June 10
+    assert dispatch_due_digests(_utc(2025, 6, 11, 0, 5), storage, workers=2) == 1
+    assert processed[-1] == ("ny", "2025-06-10")
+    # Both are rescheduled for their next local day, not re-sent this slot
+    assert dispatch_due_digests(_utc(2025, 6, 11, 0, 10), storage, workers=2) == 0
+
+
+def test_digest_consistency_window_ends_on_the_recipients_local_date(monkeypatch):
+    monkeypatch.setattr(daily_digest, "get_gemini_client", lambda: None)
+    monkeypatch.setattr(daily_digest, "calculate_days_since_signup", lambda user_id: 3)
+    tokyo_today = date(2025, 6, 11)
+    data = {
+        "habits": {"Read": {"xp": 10, "active": True}},
+        "completions": {(tokyo_today - timedelta(days=i)).isoformat(): ["Read"] for i in range(7)},
+    }
+    _, body = daily_digest._generate_digest_content("tokyo", TOKYO, ["Read"], data["habits"], {"Read": 7}, data, tokyo_today)
+    assert "- Read: 100% this week" in body
@@ -0,0 +1,22 @@
+import drip_campaigns
+from job_context import UserSnapshot
+
+
+class NoReadStorage:
+    def __getattr__(self, name):
+        raise AssertionError(f"unexpected storage call: {name}")
+
+
+def test_sweep_sends_drips_from_the_snapshot_without_rereading(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    sent = []
+    monkeypatch.setattr(drip_campaigns, "get_storage", lambda: NoReadStorage())
+    monkeypatch.setattr(drip_campaigns, "generate_welcome_email", lambda user_id: ("Welcome", "Hi"))
+    monkeypatch.setattr(drip_campaigns, "send_email", lambda to, subject, body: sent.append((to, subject)) or True)
+    user = UserSnapshot("ana", {"email": "ana@example.com", "completions": {}, "habits": {}})
+
+    assert drip_campaigns._process_user_drips(user) == 1
+    assert sent == [("ana@example.com", "Welcome")]
+    assert drip_campaigns.load_drip_history()["ana"]["welcome"]["days_since_signup"] == 0
+    # Already sent: nothing pending the second time
+    assert drip_campaigns._process_user_drips(user) == 0
@@ -0,0 +1,238 @@
+import datetime
+import threading
+import time
+
+import email_utils
+import job_context
+import notifications
+import scheduler_service
+from storage import StorageProvider
+
+
+class CountingStorage(StorageProvider):
+    def __init__(self, users):
+        self.users = users
+        self.calls = []
+
+    def list_users(self):
+        self.calls.append("list_users")
+        return list(self.users)
+
+    def load_data(self, user_id):
+        self.calls.append(f"load_data:{user_id}")
+        return self.users[user_id]
+
+    def user_exists(self, user_id):
+        self.calls.append(f"user_exists:{user_id}")
+        return user_id in self.users
+
+    def get_user_email(self, user_id):
+        self.calls.append(f"get_user_email:{user_id}")
+        return self.users[user_id].get("email")
+
+    def get_notifications_enabled(self, user_id):
+        self.calls.append(f"get_notifications_enabled:{user_id}")
+        return True
+
+
+def _user(email, streak_days, notifications_enabled=True):
+    today = datetime.date.today()
+    return {
+        "email": email,
+        "preferences": {"notifications_enabled": notifications_enabled},
+        "habits": {"Read": {"xp": 10, "active": True}},
+        "completions": {(today - datetime.timedelta(days=i)).isoformat(): ["Read"] for i in range(streak_days)},
+        "tasks": [],
+    }
+
+
+def test_streak_checks_read_each_user_once_and_notify_from_snapshot(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    storage = CountingStorage({
+        "ana": _user("ana@example.com", 5),
+        "bo": _user("bo@example.com", 5, notifications_enabled=False),
+        "cy": _user(None, 10),
+        "di": _user("di@example.com", 3),
+    })
+    sent = []
+    monkeypatch.setattr(job_context, "get_storage", lambda: storage)
+    monkeypatch.setattr(notifications, "get_storage", lambda: storage)
+    monkeypatch.setattr(notifications, "generate_streak_celebration", lambda *a: None)
+    monkeypatch.setattr(notifications, "send_email", lambda to, subject, body: sent.append(to) or True)
+
+    scheduler_service.job_streak_checks()
+
+    assert sent == ["ana@example.com"]
+    assert sorted(storage.calls) == ["list_users", "load_data:ana", "load_data:bo", "load_data:cy", "load_data:di"]
+
+
+def test_send_notification_email_without_snapshot_still_reads_storage(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    storage = CountingStorage({"ana": _user("ana@example.com", 1)})
+    monkeypatch.setattr(notifications, "get_storage", lambda: storage)
+    monkeypatch.setattr(notifications, "send_email", lambda to, subject, body: True)
+
+    assert notifications.send_notification_email("ana", "Hi", "Body", "test")
+    assert storage.calls == ["get_notifications_enabled:ana", "get_user_email:ana"]
+
+
+def test_run_per_user_keeps_order_and_isolates_errors_and_timeouts():
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def handler(user_id):
+        with lock:
+            running.append(user_id)
+            peak.append(len(running))
+        try:
+            if user_id == "u3":
+                raise ValueError("bad data")
+            if user_id == "u5":
+                time.sleep(0.5)
+            else:
+                time.sleep(0.01)
+            return user_id.upper()
+        finally:
+            with lock:
+                running.remove(user_id)
+
+    users = [f"u{i}" for i in range(12)]
+    results = job_context.run_per_user("test", iter(users), handler, workers=3, timeout=0.2)
+
+    assert [r["user_id"] for r in results] == users
+    assert max(peak) <= 3
+    by_user = {r["user_id"]: r for r in results}
+    assert by_user["u0"]["ok"] and by_user["u0"]["value"] == "U0"
+    assert not by_user["u3"]["ok"] and "ValueError: bad data" in by_user["u3"]["error"]
+    assert not by_user["u5"]["ok"] and "timed out" in by_user["u5"]["error"]
+    assert sum(r["ok"] for r in results) == 10
+
+
+def test_incremental_streak_checks_only_load_changed_and_due_users(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    tomorrow = (datetime.date.today() + datetime.timedelta(days=1)).isoformat()
+    users = {"ana": _user("ana@example.com", 2), "bo": _user("bo@example.com", 2), "cy": _user("cy@example.com", 0)}
+    users["cy"]["completions"][tomorrow] = ["Read"]  # logged ahead: streak state rolls over tomorrow
+    storage = CountingStorage(users)
+    modified = {}
+    storage.list_users_modified_since = lambda since: [u for u, t in modified.items() if t >= since]
+    monkeypatch.setattr(job_context, "get_storage", lambda: storage)
+    monkeypatch.setattr(notifications, "send_email", lambda to, subject, body: True)
+
+    scheduler_service.job_streak_checks(incremental=True)  # no watermark yet: everyone
+    assert sorted(c for c in storage.calls if c.startswith("load_data")) == ["load_data:ana", "load_data:bo", "load_data:cy"]
+
+    storage.calls.clear()
+    modified["bo"] = time.time()
+    scheduler_service.job_streak_checks(incremental=True)
+    assert sorted(c for c in storage.calls if c.startswith("load_data")) == ["load_data:bo"]
+
+    # Tomorrow, cy's pre-logged check-in makes them due without any change
+    storage.calls.clear()
+    modified.clear()
+    later = datetime.datetime.now() + datetime.timedelta(days=1)
+    run = job_context.JobRun("streak_checks", now=later, incremental=True)
+    assert [u.user_id for u in run.users()] == ["cy"]
+    assert run.users_unchanged == 2
+
+
+class FakeSMTP:
+    def __init__(self, host, port):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def ehlo(self):
+        pass
+
+    def starttls(self):
+        pass
+
+    def send_message(self, msg):
+        pass
+
+
+def test_tracked_job_records_run_metrics_from_worker_threads(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    broken = _user("bo@example.com", 1)
+    broken["completions"] = {"not-a-date": ["Read"]}
+    storage = CountingStorage({"ana": _user("ana@example.com", 5), "bo": broken, "cy": _user(None, 5)})
+    monkeypatch.setattr(job_context, "get_storage", lambda: storage)
+    monkeypatch.setattr(notifications, "generate_streak_celebration", lambda *a: None)
+    monkeypatch.setattr(email_utils, "_get_smtp_config", lambda: {"host": "smtp.test", "port": 2525})
+    monkeypatch.setattr(email_utils.smtplib, "SMTP", FakeSMTP)
+
+    scheduler_service.job_streak_checks()
+
+    [run] = scheduler_service.get_job_history("streak_checks")
+    assert run["status"] == "ok" and run["finished_at"] is not None
+    assert (run["users_scanned"], run["emails_sent"], run["users_notified"], run["errors"]) == (3, 1, 1, 1)
+
+
+class BatchStorage(CountingStorage):
+    def load_users(self, user_ids):
+        self.calls.append(f"load_users:{len(user_ids)}")
+        return {user_id: self.users[user_id] for user_id in user_ids}
+
+
+def test_sweep_prefetches_in_batches_reports_progress_and_resumes_after_cancel(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    storage = BatchStorage({f"u{i}": _user(None, 1) for i in range(10)})
+    assert [u for u, _ in storage.iter_user_data(page_size=4)] == [f"u{i}" for i in range(10)]
+    assert storage.calls == ["list_users", "load_users:4", "load_users:4", "load_users:2"]
+
+    seen = []
+
+    def handler(user):
+        seen.append(user.user_id)
+        if len(seen) == 3:
+            [progress] = job_context.active_runs()
+            assert progress["job"] == "sweep_test" and progress["processed"] == 2
+            assert job_context.cancel_runs("sweep_test") == 1
+        return True
+
+    first = job_context.JobRun("sweep_test", storage, run_key="2025-06-10")
+    results = first.sweep(handler, workers=1)
+    assert first.cancelled and len(results) < 10
+    assert job_context.active_runs() == []
+
+    resumed = job_context.JobRun("sweep_test", storage, run_key="2025-06-10")
+    resumed.sweep(handler, workers=1)
+    assert sorted(seen) == sorted(storage.users)
+    assert resumed.progress()["processed"] == 10 - len(results)
+
+
+def test_run_per_user_rate_limit_spaces_out_starts():
+    starts = []
+    began = time.monotonic()
+    results = job_context.run_per_user("test", range(5), lambda i: starts.append(time.monotonic() - began), key=str, workers=5, rate=20)
+    assert all(r["ok"] for r in results)
+    assert starts[-1] >= 0.18
+
+
+def test_sweep_retries_users_that_time_out_instead_of_checkpointing_them(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    storage = BatchStorage({f"u{i}": _user(None, 1) for i in range(4)})
+    storage.list_users_modified_since = lambda since: []
+    returned = threading.Event()
+
+    def handler(user):
+        if user.user_id == "u1":
+            time.sleep(0.5)  # outlives the timeout and the run's finish()
+            returned.set()
+        return True
+
+    run = job_context.JobRun("timeout_test", storage, run_key="2025-06-10", incremental=True)
+    results = run.sweep(handler, workers=2, timeout=0.1)
+    assert [r["user_id"] for r in results if not r["ok"]] == ["u1"]
+    assert returned.wait(2)
+    time.sleep(0.1)
+    assert run.progress()["processed"] == 3 and run.progress()["failed"] == 1
+
+    retry = job_context.JobRun("timeout_test", storage, incremental=True)
+    assert [u.user_id for u in retry.users()] == ["u1"]
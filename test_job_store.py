@@ -0,0 +1,120 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+from apscheduler.schedulers.background import BackgroundScheduler
+
+import scheduler_service
+import storage as storage_module
+from job_context import JobRun, cancel_runs
+from job_store import SQLiteJobStore, unfinished_sweeps
+from storage import MemoryStorage
+
+
+calls = []
+
+
+def _tick():
+    calls.append(datetime.now(timezone.utc))
+
+
+def _scheduler(path):
+    return BackgroundScheduler(
+        jobstores={"default": SQLiteJobStore(path)},
+        job_defaults={"coalesce": True, "misfire_grace_time": 3600},
+    )
+
+
+def test_missed_runs_are_caught_up_once_after_restart(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    first = _scheduler(path)
+    first.start(paused=True)
+    # Three 10-minute runs came due while "down"
+    first.add_job(_tick, "interval", minutes=10, id="tick", next_run_time=datetime.now(timezone.utc) - timedelta(minutes=25))
+    first.shutdown(wait=False)
+
+    calls.clear()
+    second = _scheduler(path)
+    second.start()
+    try:
+        deadline = time.time() + 5
+        while not calls and time.time() < deadline:
+            time.sleep(0.05)
+        time.sleep(0.2)
+        assert len(calls) == 1
+        assert second.get_job("tick").next_run_time > datetime.now(timezone.utc)
+    finally:
+        second.shutdown(wait=False)
+
+
+class FakeStorage:
+    def __init__(self, users):
+        self.users = users
+        self.loaded = []
+
+    def list_users(self):
+        return list(self.users)
+
+    def iter_user_data(self, user_ids=None):
+        for user_id in (self.users if user_ids is None else user_ids):
+            self.loaded.append(user_id)
+            yield user_id, self.users[user_id]
+
+
+def test_interrupted_sweep_resumes_with_users_not_yet_done(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    storage = FakeStorage({f"u{i}": {} for i in range(5)})
+
+    run = JobRun("nightly", storage, run_key="2025-06-10")
+    for user in run.users():
+        if user.user_id == "u3":
+            break  # process dies mid-sweep
+        run.done(user.user_id)
+
+    storage.loaded.clear()
+    resumed = JobRun("nightly", storage, run_key="2025-06-10")
+    assert [u.user_id for u in resumed.users()] == ["u3", "u4"]
+    assert storage.loaded == ["u3", "u4"]
+    assert resumed.users_skipped == 3
+    resumed.finish()
+
+    # A duplicate trigger for a finished run does nothing; the next run starts fresh
+    assert list(JobRun("nightly", storage, run_key="2025-06-10").users()) == []
+    assert len(list(JobRun("nightly", storage, run_key="2025-06-11").users())) == 5
+
+
+def test_run_keys_follow_the_scheduled_fire_time():
+    # A late run after midnight still belongs to yesterday's 07:00 run
+    assert scheduler_service._run_key("daily_reminder", datetime(2025, 6, 11, 0, 30)) == "2025-06-10"
+    assert scheduler_service._run_key("daily_reminder", datetime(2025, 6, 11, 7, 0)) == "2025-06-11"
+    # Monday morning is still Sunday's weekly summary
+    assert scheduler_service._run_key("weekly_summary", datetime(2025, 6, 16, 8, 0)) == "2025-W24"
+
+
+def test_scheduled_sweep_killed_mid_run_resumes_when_the_scheduler_starts(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("SCHEDULER_WORKERS", "1")
+    users = {f"u{i}": {"email": f"u{i}@example.com", "habits": {}, "completions": {}} for i in range(5)}
+    storage_module.set_storage(MemoryStorage(users))
+    sent = []
+
+    def _notify(user_id, *args, **kwargs):
+        sent.append(user_id)
+        if len(sent) == 2:
+            cancel_runs("weekly_summary")  # the leader goes away mid-sweep
+
+    monkeypatch.setattr(scheduler_service, "notify_weekly_summary", _notify)
+    try:
+        scheduler_service.job_weekly_summary(checkpoint=True)
+        assert 0 < len(sent) < 5
+        assert unfinished_sweeps() == [("weekly_summary", scheduler_service._run_key("weekly_summary"))]
+
+        # The next leader starts its scheduler: the stored next run time is next week, the sweep resumes now
+        scheduler_service._on_elected()
+        deadline = time.time() + 10
+        while unfinished_sweeps() and time.time() < deadline:
+            time.sleep(0.05)
+    finally:
+        scheduler_service.stop_scheduler()
+        storage_module.set_storage(None)
+    assert unfinished_sweeps() == []
+    assert sorted(sent) == sorted(users)
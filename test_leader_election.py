@@ -0,0 +1,48 @@
+import time
+
+from leader_election import LeaderElector
+from storage import LocalStorage
+
+
+def _elector(storage, events, owner, ttl=60.0):
+    return LeaderElector(
+        storage,
+        on_elected=lambda: events.append((owner, "elected")),
+        on_demoted=lambda: events.append((owner, "demoted")),
+        ttl=ttl,
+        heartbeat=ttl / 4,
+        owner=owner,
+    )
+
+
+def test_one_leader_and_takeover_on_release(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    storage = LocalStorage()
+    events = []
+    a, b = _elector(storage, events, "a"), _elector(storage, events, "b")
+
+    a.tick()
+    b.tick()
+    a.tick()  # renewal keeps the lease
+    assert (a.is_leader, b.is_leader) == (True, False)
+    assert events == [("a", "elected")]
+    assert storage.get_lease("scheduler_leader")["owner"] == "a"
+
+    a.stop()
+    b.tick()
+    assert b.is_leader
+    assert events == [("a", "elected"), ("a", "demoted"), ("b", "elected")]
+
+
+def test_expired_lease_is_taken_over_and_old_leader_steps_down(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    storage = LocalStorage()
+    events = []
+    a, b = _elector(storage, events, "a", ttl=0.2), _elector(storage, events, "b", ttl=0.2)
+
+    a.tick()
+    time.sleep(0.25)  # "a" stalls past its TTL
+    b.tick()
+    a.tick()
+    assert (a.is_leader, b.is_leader) == (False, True)
+    assert events == [("a", "elected"), ("b", "elected"), ("a", "demoted")]
@@ -1,6 +1,7 @@
 import os
 import json
 from tracker import get_leaderboard_stats
+from storage import LEADERBOARD_FILE
 
 
 def test_leaderboard_local_files():
@@ -18,6 +19,7 @@ def test_leaderboard_local_files():
 
     alice_file = "xp_data_alice.json"
     bob_file = "xp_data_bob.json"
+    index_existed = os.path.exists(LEADERBOARD_FILE)
     backup_default = None
     if os.path.exists("xp_data.json"):
         backup_default = "xp_data_backup.json"
@@ -36,6 +38,8 @@ def test_leaderboard_local_files():
     finally:
         os.remove(alice_file)
         os.remove(bob_file)
+        if not index_existed and os.path.exists(LEADERBOARD_FILE):
+            os.remove(LEADERBOARD_FILE)
         if backup_default:
             os.rename(backup_default, "xp_data.json")
 
@@ -65,3 +69,115 @@ def test_leaderboard_with_storage_list_users():
     finally:
         tracker.get_storage = orig_get_storage
 
+
+
+def test_materialized_rows_roll_over_periods():
+    """A row written in an earlier week counts as 0 XP for the current week."""
+    import datetime
+    from leaderboard import build_leaderboard_row, row_period_xp
+
+    today = datetime.date(2025, 12, 10)
+    data = {"habits": {}, "completions": {}, "tasks": [{"title": "t", "status": "Done", "completed_at": "2025-12-09T00:00:00", "xp": 40}]}
+    row = build_leaderboard_row(data, today)
+    assert row_period_xp(row, "week", today) == 40
+    assert row_period_xp(row, "month", today) == 40
+    next_week = today + datetime.timedelta(days=7)
+    assert row_period_xp(row, "week", next_week) == 0
+    assert row_period_xp(row, "month", next_week) == 40
+    assert row_period_xp(row, "all_time", next_week) == 40
+
+
+def test_leaderboard_page_and_viewer_rank():
+    """Pages come from a top-K selection; the viewer's rank is reported even off-page."""
+    from leaderboard import get_leaderboard_page
+
+    class FakeStorage:
+        def __init__(self):
+            self._data = {
+                f"user{i}": {"habits": {}, "completions": {}, "email": f"user{i}@example.com",
+                             "tasks": [{"title": "t", "status": "Done", "completed_at": "2025-12-01T00:00:00", "xp": 10 * i}]}
+                for i in range(1, 8)
+            }
+            self._data["user7"]["preferences"] = {"private_mode": True}
+        def list_users(self):
+            return list(self._data)
+        def load_data(self, user_id):
+            return self._data[user_id]
+
+    storage = FakeStorage()
+    page = get_leaderboard_page("all_time", storage, storage.list_users(), limit=2, offset=2, viewer="user1")
+    assert page["total"] == 6
+    assert [(e["rank"], e["user_id"], e["xp"]) for e in page["entries"]] == [(3, "user4", 40), (4, "user3", 30)]
+    assert page["entries"][0]["email"] == "user4@example.com"
+    assert page["viewer"]["rank"] == 6
+    assert page["top_xp"] == 60
+    hidden = get_leaderboard_page("all_time", storage, storage.list_users(), viewer="user7")
+    assert hidden["viewer"] is None
+
+
+def test_invalidated_standings_keep_their_age_while_revalidating(monkeypatch):
+    """An invalidation triggers a refresh but the stale page still reports when it was computed."""
+    import leaderboard
+
+    class FakeStorage:
+        def list_users(self):
+            return ["ana"]
+        def load_data(self, user_id):
+            return {"habits": {}, "completions": {}, "tasks": []}
+
+    storage = FakeStorage()
+    refreshes = []
+    monkeypatch.setattr(leaderboard, "_standings_cache", {})
+    monkeypatch.setattr(leaderboard, "_refreshing", set())
+    monkeypatch.setattr(leaderboard, "_schedule_refresh", lambda period, *args: refreshes.append(period))
+
+    computed_at = leaderboard.get_cached_standings("all_time", storage, storage.list_users, force=True)["computed_at"]
+    leaderboard.invalidate_standings()
+    page = leaderboard.page_from_standings(leaderboard.get_cached_standings("all_time", storage, storage.list_users))
+    assert page["computed_at"] == computed_at
+    assert refreshes == ["all_time"]
+
+
+def test_reconcile_reads_the_process_pool_size_from_settings(monkeypatch):
+    import leaderboard
+    from storage import MemoryStorage
+
+    calls = []
+
+    def _compute(user_ids, storage, **kwargs):
+        calls.append(kwargs["process_workers"])
+        return {}, []
+
+    monkeypatch.setattr(leaderboard, "compute_leaderboard_rows", _compute)
+    monkeypatch.delenv("LEADERBOARD_PROCESS_WORKERS", raising=False)
+    storage = MemoryStorage()
+    leaderboard.reconcile_leaderboard(storage, user_ids=[])
+    monkeypatch.setenv("LEADERBOARD_PROCESS_WORKERS", "4")
+    leaderboard.reconcile_leaderboard(storage, user_ids=[])
+    monkeypatch.setenv("LEADERBOARD_PROCESS_WORKERS", "many")
+    leaderboard.reconcile_leaderboard(storage, user_ids=[])
+    assert calls == [0, 4, 0]
+
+
+def test_concurrent_local_row_saves_keep_every_row(tmp_path, monkeypatch):
+    import threading
+
+    from storage import LocalStorage
+
+    monkeypatch.chdir(tmp_path)
+    storage = LocalStorage()
+    users = [f"u{i}" for i in range(16)]
+    for user_id in users:
+        storage.save_data(user_id, {"habits": {}, "completions": {}})
+    start = threading.Barrier(len(users))
+
+    def _save(user_id):
+        start.wait()
+        storage.save_leaderboard_rows({user_id: {"total_xp": 1}})
+
+    threads = [threading.Thread(target=_save, args=(u,)) for u in users]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(storage.load_leaderboard_rows()) == sorted(users)
@@ -0,0 +1,29 @@
+import datetime
+import time
+from datetime import date
+
+import scheduler_simulation
+import storage
+
+
+def test_simulation_fast_forwards_jobs_and_restores_the_clock(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # 2025-06-07 is a Saturday: the weekly summary fires once, on the Sunday
+    report = scheduler_simulation.simulate(2, 8, seed=1, start=date(2025, 6, 7), signups_per_day=1)
+
+    assert list(report["emails_per_day"]) == ["2025-06-07", "2025-06-08"]
+    assert report["signups"] == 2
+    jobs = report["jobs"]
+    assert jobs["daily_digests"]["runs"] == 2 * 96
+    assert jobs["streak_checks"]["runs"] == 2
+    assert jobs["weekly_summary"]["runs"] == 1
+    assert jobs["weekly_summary"]["emails"] == report["emails_per_day"]["2025-06-08"]["weekly_summary"] > 0
+    assert jobs["admin_analytics"]["storage_ops"]["load_data"] > 0
+    again = scheduler_simulation.simulate(2, 8, seed=1, start=date(2025, 6, 7), signups_per_day=1)
+    assert again["emails_per_day"] == report["emails_per_day"]
+    assert again["storage_ops"] == report["storage_ops"]
+
+    assert datetime.datetime is scheduler_simulation._REAL_DATETIME
+    assert abs(time.time() - scheduler_simulation._REAL_TIME()) < 1
+    assert not isinstance(storage.get_storage(), storage.MemoryStorage)
+    assert list(tmp_path.iterdir()) == []
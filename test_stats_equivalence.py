@@ -0,0 +1,61 @@
+import datetime
+import logging
+import random
+
+import stats_equivalence
+from stats_equivalence import (
+    edge_case_histories,
+    fast_stats,
+    legacy_stats,
+    property_history,
+    random_history,
+    run_harness,
+    shadow_check,
+)
+
+
+TODAY = datetime.date(2025, 12, 31)
+
+
+def test_engines_agree_on_edge_random_and_property_histories():
+    rng = random.Random(11)
+    cases = list(edge_case_histories(TODAY))
+    cases += [(f"random:{i}", random_history(rng, TODAY)) for i in range(25)]
+    cases += [(f"property:{i}", property_history(rng, TODAY)) for i in range(25)]
+    report = run_harness(cases, TODAY)
+    assert report["checked"] == len(cases)
+    assert report["errors"] == [] and report["divergences"] == []
+
+
+def test_reports_first_diverging_field_and_date():
+    data = dict(edge_case_histories(TODAY))["streak_alive_from_yesterday"]
+    # An engine that loses one XP point on check-ins from Dec 27 on
+    def off_by_one(d, today):
+        stats = fast_stats(d, today)
+        if today >= datetime.date(2025, 12, 27):
+            stats["habits.Read.total_xp"] -= 1
+        return stats
+
+    report = run_harness([("streak", data)], TODAY, legacy_stats, off_by_one)
+    [divergence] = report["divergences"]
+    assert divergence["field"] == "habits.Read.total_xp"
+    assert divergence["fast"] == divergence["legacy"] - 1
+    assert divergence["date"] == "2025-12-27"
+
+
+def test_shadow_check_samples_and_logs_divergence(caplog):
+    data = dict(edge_case_histories(TODAY))["perfect_week"]
+    xp, habit_stats, badges = 0, {}, []
+    assert not shadow_check(data, (xp, habit_stats, badges), sample_rate=0, today=TODAY)
+
+    from tracker import calculate_stats
+    served = calculate_stats(data, TODAY)
+    before = stats_equivalence.get_shadow_counts()
+    assert shadow_check(data, served, sample_rate=1, today=TODAY, background=False)
+    after = stats_equivalence.get_shadow_counts()
+    assert after["checked"] == before["checked"] + 1 and after["diverged"] == before["diverged"]
+
+    wrong = (served[0] + 1, served[1], served[2])
+    with caplog.at_level(logging.WARNING, logger="stats_equivalence"):
+        shadow_check(data, wrong, sample_rate=1, today=TODAY, background=False)
+    assert "Stats divergence on global_xp" in caplog.text
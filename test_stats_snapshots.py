@@ -0,0 +1,102 @@
+import datetime
+
+import stats_snapshots
+from xp_timeline import build_xp_timeline
+
+
+TODAY = datetime.date(2025, 12, 24)
+
+
+def _sample_data():
+    completions = {}
+    for i in range(30):
+        d = datetime.date(2025, 11, 20) + datetime.timedelta(days=i)
+        completions[d.isoformat()] = ["Read", "Run"] if i % 3 else ["Read"]
+    return {
+        "habits": {"Read": {"xp": 10, "active": True}, "Run": {"xp": 20, "active": True}},
+        "completions": completions,
+        "tasks": [{"title": "a", "status": "Done", "completed_at": "2025-12-02T10:00:00", "xp": 30}],
+    }
+
+
+def test_snapshots_match_full_replay():
+    data = _sample_data()
+    assert stats_snapshots.refresh_snapshots(data, TODAY)
+    # Sundays 11-23 .. 12-21
+    assert [s["date"] for s in data["stats_snapshots"]] == ["2025-11-23", "2025-11-30", "2025-12-07", "2025-12-14", "2025-12-21"]
+    assert not stats_snapshots.refresh_snapshots(data, TODAY)
+
+    timeline = build_xp_timeline(data, TODAY)
+    for day in range(0, 40, 3):
+        d = datetime.date(2025, 11, 18) + datetime.timedelta(days=day)
+        assert stats_snapshots.get_stats_as_of(data, d)["total_xp"] == timeline.period_total(None, d)
+
+    as_of = stats_snapshots.get_stats_as_of(data, datetime.date(2025, 12, 10))
+    assert as_of["streaks"] == {"Read": 21, "Run": 2}
+    assert stats_snapshots.xp_between(data, datetime.date(2025, 12, 1), datetime.date(2025, 12, 7)) == timeline.period_total(
+        datetime.date(2025, 12, 1), datetime.date(2025, 12, 7)
+    )
+
+
+def test_editing_history_invalidates_later_snapshots_only():
+    data = _sample_data()
+    stats_snapshots.refresh_snapshots(data, TODAY)
+    data["completions"]["2025-12-09"].remove("Read")
+    assert len(stats_snapshots.valid_snapshots(data)) == 3
+    timeline = build_xp_timeline(data, TODAY)
+    assert stats_snapshots.get_stats_as_of(data, TODAY)["total_xp"] == timeline.period_total(None, TODAY)
+    assert stats_snapshots.refresh_snapshots(data, TODAY)
+    assert len(stats_snapshots.valid_snapshots(data)) == 5
+
+
+def test_snapshot_job_keeps_leaderboard_rows_current(tmp_path, monkeypatch):
+    import os
+
+    import job_context
+    import leaderboard
+    import scheduler_service
+    from storage import LocalStorage
+
+    monkeypatch.chdir(tmp_path)
+    storage = LocalStorage()
+    storage.save_data("ana", _sample_data())
+    # Row stamped against an older save, as after the midnight reconcile
+    stamp = os.path.getmtime(storage._get_filename("ana")) - 100
+    os.utime(storage._get_filename("ana"), (stamp, stamp))
+    leaderboard.reconcile_leaderboard(storage)
+    monkeypatch.setattr(job_context, "get_storage", lambda: storage)
+
+    scheduler_service.job_stats_snapshots()
+
+    assert storage.load_data("ana")["stats_snapshots"]
+    assert list(storage.load_leaderboard_rows()) == ["ana"]
+
+
+def test_snapshot_job_keeps_edits_saved_during_the_sweep(monkeypatch):
+    import time
+
+    import job_context
+    import scheduler_service
+    from storage import MemoryStorage
+
+    storage = MemoryStorage({"ana": _sample_data()})
+    monkeypatch.setattr(job_context, "get_storage", lambda: storage)
+    refresh = stats_snapshots.refresh_snapshots
+
+    def _refresh_after_edit(data, today=None):
+        # Ana checks in after the sweep fetched her record
+        fresh = storage.load_data("ana")
+        fresh["completions"]["2025-12-24"] = ["Read"]
+        storage.save_data("ana", fresh)
+        return refresh(data, today)
+
+    monkeypatch.setattr(stats_snapshots, "refresh_snapshots", _refresh_after_edit)
+    scheduler_service.job_stats_snapshots()
+    saved = storage.load_data("ana")
+    assert saved["completions"]["2025-12-24"] == ["Read"]
+    assert saved["stats_snapshots"]
+
+    # Writing snapshots alone doesn't mark the user changed for the next incremental run
+    since = time.time()
+    storage.save_derived("ana", "stats_snapshots", [])
+    assert storage.list_users_modified_since(since) == []
@@ -0,0 +1,39 @@
+import datetime
+
+from synthetic_data import iter_synthetic_users, write_synthetic_users
+
+
+TODAY = datetime.date(2025, 12, 31)
+
+
+class FakeStorage:
+    def __init__(self):
+        self.saved = {}
+
+    def save_data(self, user_id, data):
+        self.saved[user_id] = data
+
+
+def test_users_depend_only_on_seed_and_index():
+    small = dict(iter_synthetic_users(3, seed=7, today=TODAY, years=0.5, tasks=5, journal_entries=2))
+    large = dict(iter_synthetic_users(10, seed=7, today=TODAY, years=0.5, tasks=5, journal_entries=2))
+    assert small["synth_00002"] == large["synth_00002"]
+    other = dict(iter_synthetic_users(3, seed=8, today=TODAY, years=0.5, tasks=5, journal_entries=2))
+    assert other["synth_00002"] != small["synth_00002"]
+
+
+def test_user_ids_do_not_depend_on_dataset_size():
+    small = iter_synthetic_users(10, today=TODAY, years=0.1, tasks=0, journal_entries=0)
+    huge = iter_synthetic_users(1_000_000, today=TODAY, years=0.1, tasks=0, journal_entries=0)
+    assert [next(small)[0] for _ in range(3)] == [next(huge)[0] for _ in range(3)] == ["synth_00000", "synth_00001", "synth_00002"]
+
+
+def test_generated_history_respects_options():
+    storage = FakeStorage()
+    assert write_synthetic_users(storage, 2, today=TODAY, years=1, habits=4, tasks=12, journal_entries=3) == 2
+    data = storage.saved["synth_00000"]
+    assert len(data["habits"]) == 4 and len(data["tasks"]) == 12
+    assert len(data["journal_entries"]["Reflections"]) == 3
+    dates = sorted(data["completions"])
+    assert dates[0] >= "2025-01-01" and dates[-1] <= TODAY.isoformat()
+    assert all(t["completed_at"][:10] <= TODAY.isoformat() for t in data["tasks"] if t["status"] == "Done")
@@ -0,0 +1,97 @@
+import datetime
+
+from xp_timeline import build_xp_timeline, get_xp_timeline, perfect_day_flags, rolling_habit_metrics, PERFECT_DAY_BONUS
+
+
+TODAY = datetime.date(2025, 12, 10)
+
+
+def _sample_data():
+    return {
+        "habits": {
+            "Read": {"xp": 10, "active": True},
+            "Run": {"xp": 20, "active": True},
+            "Old": {"xp": 5, "active": False},
+        },
+        "completions": {
+            "2025-12-01": ["Read", "Run"],
+            "2025-12-02": ["Read"],
+            "2025-12-03": ["Read", "Old"],
+            "2025-12-05": ["Read", "Run"],
+            "2025-12-20": ["Read"],  # future-dated entries are ignored
+        },
+        "tasks": [
+            {"title": "a", "status": "Done", "completed_at": "2025-12-02T10:00:00", "xp": 30},
+            {"title": "b", "status": "Done", "xp": 7},  # no date: all-time only
+            {"title": "c", "status": "Todo", "completed_at": "2025-12-02T10:00:00", "xp": 99},
+        ],
+    }
+
+
+def test_streak_bonus_and_perfect_days():
+    timeline = build_xp_timeline(_sample_data(), TODAY)
+    # Read: 10, 11 (day 2), 12 (day 3), 10 (streak reset on 12-05)
+    assert timeline.series_total("habit", datetime.date(2025, 12, 1), datetime.date(2025, 12, 3)) == 10 + 20 + 11 + 12 + 5
+    assert timeline.day_values(datetime.date(2025, 12, 5))["habit"] == 10 + 20
+    # Perfect days need every active habit: 12-01 and 12-05
+    assert timeline.series_total("bonus") == 2 * PERFECT_DAY_BONUS
+    assert timeline.series_total("completions") == 7
+
+
+def test_period_totals_are_prefix_lookups():
+    timeline = build_xp_timeline(_sample_data(), TODAY)
+    week = timeline.period_total(datetime.date(2025, 12, 1), datetime.date(2025, 12, 7))
+    assert week == (10 + 20 + 11 + 12 + 5 + 10 + 20) + 30 + 2 * PERFECT_DAY_BONUS
+    assert timeline.total_xp == week + 7
+    # Ranges outside the history clamp to zero
+    assert timeline.period_total(datetime.date(2024, 1, 1), datetime.date(2024, 12, 31)) == 0
+    assert timeline.period_total(datetime.date(2025, 12, 6), datetime.date(2025, 12, 4)) == 0
+
+
+def test_cached_timeline_tracks_data_changes():
+    data = _sample_data()
+    first = get_xp_timeline(data, TODAY)
+    assert get_xp_timeline(data, TODAY) is first
+    data["completions"]["2025-12-06"] = ["Read"]
+    assert get_xp_timeline(data, TODAY).total_xp == first.total_xp + 11
+
+
+def test_perfect_days_follow_habit_active_ranges():
+    data = _sample_data()
+    # Run was archived on 12-03 and restored on 12-05; Old only counted on 12-03
+    data["habits"]["Run"]["active_ranges"] = [[None, "2025-12-03"], ["2025-12-05", None]]
+    data["habits"]["Old"]["active_ranges"] = [["2025-12-03", "2025-12-04"]]
+    flags = perfect_day_flags(data["habits"], data["completions"], datetime.date(2025, 12, 1), 5)
+    assert flags == [True, False, True, False, True]
+    timeline = build_xp_timeline(data, TODAY)
+    assert timeline.series_total("bonus") == 3 * PERFECT_DAY_BONUS
+
+
+def test_future_only_check_ins_replay_no_days():
+    # Every completion is after today: the replay span is negative
+    data = _sample_data()
+    data["completions"] = {"2025-12-20": ["Read", "Run"]}
+    assert perfect_day_flags(data["habits"], data["completions"], datetime.date(2025, 12, 20), -9) == []
+    build_xp_timeline(data, TODAY)
+
+
+def test_daily_window_pads_and_splits_by_habit():
+    timeline = build_xp_timeline(_sample_data(), TODAY)
+    window = timeline.daily_window("completions", datetime.date(2025, 11, 30), datetime.date(2025, 12, 3))
+    assert window == [0, 2, 1, 2]
+    assert timeline.daily_window("xp", datetime.date(2025, 12, 2), datetime.date(2025, 12, 2)) == [11 + 30]
+    assert timeline.daily_window("habit", datetime.date(2025, 12, 1), datetime.date(2025, 12, 3), habit="Read") == [10, 11, 12]
+    assert timeline.daily_window("habit", datetime.date(2026, 1, 1), datetime.date(2026, 1, 2), habit="Read") == [0, 0]
+    assert timeline.daily_window("habit", datetime.date(2025, 12, 1), datetime.date(2025, 12, 2), habit="Nope") == [0, 0]
+
+
+def test_rolling_metrics_respect_windows_and_active_days():
+    data = _sample_data()
+    data["habits"]["Run"]["active_ranges"] = [["2025-12-05", None]]
+    metrics = rolling_habit_metrics(data, TODAY, windows=(7, 30))
+    # 7 days = 12-04..12-10: Read once (12-05), Run once in its 6 active days
+    assert metrics["Read"][7] == {"completion_rate": 0.14, "completions": 1, "xp": 10, "active_days": 7}
+    assert metrics["Run"][7]["active_days"] == 6 and metrics["Run"][7]["completions"] == 1
+    assert metrics["Read"][30]["completions"] == 4 and metrics["Read"][30]["xp"] == 10 + 11 + 12 + 10
+    assert metrics["Run"][30]["completion_rate"] == round(2 / 6, 2)
+    assert metrics["Old"][30]["active_days"] == 0 and metrics["Old"][30]["completion_rate"] == 0.0
@@ -15,6 +15,7 @@ except Exception:
 import streamlit.components.v1 as components
 from storage import get_storage, validate_email
 from email_utils import send_email
+from app_config import get_setting
 import notifications
 from coaching_emails import get_gemini_client, get_gemini_status
 import urllib.parse
@@ -36,6 +37,30 @@ from onboarding import (
 from goals_recommendation import generate_goal_recommendations, generate_goal_recommendations_gemini
 import ai_chat
 import coaching_engine
+from xp_timeline import (
+    get_xp_timeline,
+    perfect_day_flags,
+    mark_habit_active,
+    mark_habit_archived,
+    XP_PER_LEVEL,
+    PERFECT_DAY_BONUS,
+    rolling_habit_metrics,
+    ROLLING_WINDOWS,
+)
+import leaderboard
+import analytics
+import stats_snapshots
+import admin_analytics
+import stats_equivalence
+from badges import (
+    BADGES_DEF,
+    badge_metrics,
+    qualifying_badges,
+    evaluate_badges,
+    earned_badge_ids,
+    get_earned_badges,
+    queue_badge_events,
+)
 
 # === OPTION 3: IMPORT & INITIALIZE SCHEDULER ===
 try:
@@ -117,8 +142,6 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
-XP_PER_LEVEL = 200
-
 # Rank thresholds
 RANKS = {
     1: "🌱 Novice",
@@ -244,26 +267,21 @@ def load_data() -> Dict[str, Any]:
     return get_storage().load_data(get_user_id())
 
 def save_data(data: Dict[str, Any]) -> None:
-    get_storage().save_data(get_user_id(), data)
+    storage = get_storage()
+    user_id = get_user_id()
+    storage.save_data(user_id, data)
+    # Keep this user's materialized leaderboard row in step with their XP
+    leaderboard.update_leaderboard_entry(user_id, data, storage)
 
 # --- Core Logic ---
 
-BADGES_DEF = {
-    "week_streak": {"name": "🔥 On Fire", "desc": "7 Day Streak on any habit", "icon": "🔥"},
-    "month_streak": {"name": "⚡ Unstoppable", "desc": "30 Day Streak on any habit", "icon": "⚡"},
-    "habit_master": {"name": "🧘 Grandmaster", "desc": "Reach Level 3 on a habit", "icon": "🧘"},
-    "perfect_week": {"name": "🌟 Perfectionist", "desc": "7 Perfect Days", "icon": "🌟"},
-    "task_force": {"name": "📋 Task Force", "desc": "Complete 10 Missions", "icon": "📋"},
-    "veteran": {"name": "⚔️ Veteran", "desc": "Reach Level 10 Profile", "icon": "⚔️"}
-}
-
 def get_date_str(offset: int = 0) -> str:
     d = datetime.date.today() + datetime.timedelta(days=offset)
     return d.isoformat()
 
-def get_week_range(week_offset: int = 0):
+def get_week_range(week_offset: int = 0, today: Optional[datetime.date] = None):
     """Get start and end dates for a week (Monday to Sunday)"""
-    today = datetime.date.today()
+    today = today or datetime.date.today()
     # Calculate the start of the current week (Monday)
     start_of_week = today - datetime.timedelta(days=today.weekday())
     # Apply week offset
@@ -271,7 +289,8 @@ def get_week_range(week_offset: int = 0):
     end_of_week = start_of_week + datetime.timedelta(days=6)
     return start_of_week, end_of_week
 
-def calculate_stats(data: Dict[str, Any]):
+def calculate_stats(data: Dict[str, Any], today: Optional[datetime.date] = None):
+    today = today or datetime.date.today()
     habits = data.get("habits", {})
     completions = data.get("completions", {})
     tasks = data.get("tasks", [])
@@ -280,18 +299,16 @@ def calculate_stats(data: Dict[str, Any]):
     global_xp = 0
     perfect_days_count = 0
     
-    # Active habits count (approximation for perfect day logic)
-    active_habits = [h for h, d in habits.items() if d.get("active", True)]
-    active_count = len(active_habits)
-
     # 1. Historical XP Calculation (Habits)
     all_dates = sorted(list(completions.keys()))
     temp_streaks = {h: 0 for h in habits}
     
     if all_dates:
         start_date = datetime.date.fromisoformat(all_dates[0])
-        end_date = datetime.date.today()
+        end_date = today
         delta = datetime.timedelta(days=1)
+        # Perfect days: per-day completion bitmask vs. the habits active that day
+        perfect_days = perfect_day_flags(habits, completions, start_date, (end_date - start_date).days + 1)
         
         current_d = start_date
         while current_d <= end_date:
@@ -323,26 +340,18 @@ def calculate_stats(data: Dict[str, Any]):
                 else:
                     temp_streaks[habit] = 0
             
-            # Perfect Day Bonus (All active habits completed)
-            # Logic: Ensure ALL active habits are in the completion list for this day
-            if active_count > 0:
-                # Get set of active habit names
-                active_habit_names = {h for h, d in habits.items() if d.get("active", True)}
-                # Get set of completed habits for this day
-                completed_today = set(days_completed)
-
-                # Check if all active habits are completed
-                if active_habit_names.issubset(completed_today):
-                    global_xp += 50 # Bonus XP for perfect day
-                    perfect_days_count += 1
+            # Perfect Day Bonus (All habits active on that day completed)
+            if perfect_days[(current_d - start_date).days]:
+                global_xp += PERFECT_DAY_BONUS
+                perfect_days_count += 1
 
             current_d += delta
 
     # 2. Display Streak Calculation (Backward check)
-    today_str = get_date_str(0)
+    today_str = today.isoformat()
     for habit in habits:
         streak = 0
-        check_date = datetime.date.today()
+        check_date = today
         while True:
             d_str = check_date.isoformat()
             completed_on_date = habit in completions.get(d_str, [])
@@ -368,27 +377,25 @@ def calculate_stats(data: Dict[str, Any]):
             global_xp += task.get("xp", 0)
             completed_tasks_count += 1
 
-    # 4. Badges Calculation
-    earned_badges = []
-
-    # Streak Badges
-    max_streak = 0
-    for h in habits:
-        s = habit_stats[h]['streak']
-        if s > max_streak: max_streak = s
-        if habit_stats[h]['level'] >= 3:
-            earned_badges.append("habit_master")
+    # 4. Badges Calculation (rules live in BADGES_DEF)
+    profile_level = calculate_level(global_xp)[0]
+    earned_badges = qualifying_badges(badge_metrics(habit_stats, perfect_days_count, completed_tasks_count, profile_level))
 
-    if max_streak >= 7: earned_badges.append("week_streak")
-    if max_streak >= 30: earned_badges.append("month_streak")
+    return global_xp, habit_stats, earned_badges
 
-    if perfect_days_count >= 7: earned_badges.append("perfect_week")
-    if completed_tasks_count >= 10: earned_badges.append("task_force")
+def get_badge_metrics(data: Dict[str, Any], habit_stats: Dict[str, Dict[str, Any]], global_xp: int) -> Dict[str, int]:
+    """Badge rule inputs from already-computed stats (perfect days come from the cached XP timeline)."""
+    timeline = get_xp_timeline(data)
+    perfect_days = timeline.series_total("bonus") // PERFECT_DAY_BONUS
+    tasks_done = sum(1 for t in data.get("tasks", []) if t.get("status") == "Done")
+    return badge_metrics(habit_stats, perfect_days, tasks_done, calculate_level(global_xp)[0])
 
-    # Profile Level Badge (calculated outside, but we can check xp)
-    # We'll handle veteran in the main loop or pass level in
-
-    return global_xp, habit_stats, list(set(earned_badges))
+def get_stats_shadow_sample_rate() -> float:
+    """Fraction of page loads that shadow-check calculate_stats against the fast engine (0 = off)."""
+    try:
+        return float(get_setting("stats_shadow_sample_rate") or 0)
+    except Exception:
+        return 0.0
 
 def calculate_level(total_xp: int):
     level = 1 + (total_xp // XP_PER_LEVEL)
@@ -403,105 +410,64 @@ def get_rank(level: int) -> str:
             current_rank = title
     return current_rank
 
-def get_weekly_stats(data: Dict[str, Any], week_offset: int = 0):
-    """Calculate stats for a specific week"""
-    start_date, end_date = get_week_range(week_offset)
-    habits = data.get("habits", {})
-    completions = data.get("completions", {})
-    
-    weekly_data = {}
-    total_weekly_xp = 0
-    
-    # Initialize daily data
+def get_weekly_stats(data: Dict[str, Any], week_offset: int = 0, today: Optional[datetime.date] = None):
+    """Calculate stats for a specific week from the user's XP timeline."""
+    start_date, end_date = get_week_range(week_offset, today)
+    timeline = get_xp_timeline(data, today)
+
     daily_stats = {}
     current_date = start_date
     while current_date <= end_date:
-        date_str = current_date.isoformat()
-        day_name = current_date.strftime("%a")
-        daily_stats[date_str] = {"day_name": day_name, "xp": 0, "habits_completed": 0}
+        day = timeline.day_values(current_date)
+        daily_stats[current_date.isoformat()] = {
+            "day_name": current_date.strftime("%a"),
+            "xp": day["habit"] + day["task"] + day["bonus"],
+            "habits_completed": day["completions"],
+        }
         current_date += datetime.timedelta(days=1)
-    
-    # Calculate daily XP from habits
-    for habit, details in habits.items():
-        if not details.get("active", True):
-            continue
-        base_xp = details['xp']
-        
-        current_date = start_date
-        while current_date <= end_date:
-            date_str = current_date.isoformat()
-            if habit in completions.get(date_str, []):
-                daily_stats[date_str]["xp"] += base_xp
-                daily_stats[date_str]["habits_completed"] += 1
-                total_weekly_xp += base_xp
-            current_date += datetime.timedelta(days=1)
-    
-    # Calculate daily XP from tasks (completed during that week)
-    tasks = data.get("tasks", [])
-    for task in tasks:
-        if task.get("status") == "Done" and task.get("completed_at"):
-            completed_date = task["completed_at"][:10]
-            if start_date.isoformat() <= completed_date <= end_date.isoformat():
-                daily_stats[completed_date]["xp"] += task.get("xp", 0)
-                total_weekly_xp += task.get("xp", 0)
-    
+
+    total_weekly_xp = timeline.period_total(start_date, end_date)
     return daily_stats, total_weekly_xp, start_date, end_date
 
-def get_leaderboard_stats(time_period: str = "all_time") -> List[tuple]:
-    """Calculate XP for all users for a given time period.
+def get_heatmap_grid(data: Dict[str, Any], weeks: int = 53, habit: Optional[str] = None, metric: str = "xp"):
+    """Calendar heatmap grid (7 weekday rows x `weeks` columns) ending this week.
+
+    One slice of the cached XP timeline's daily array; days after today are None.
+    Returns (grid, first_monday).
+    """
+    today = datetime.date.today()
+    first_monday = today - datetime.timedelta(days=today.weekday(), weeks=weeks - 1)
+    values = get_xp_timeline(data).daily_window(metric, first_monday, today, habit=habit)
+    values += [None] * (weeks * 7 - len(values))
+    grid = [values[weekday::7] for weekday in range(7)]
+    return grid, first_monday
+
+def get_leaderboard_stats(time_period: str = "all_time", limit: Optional[int] = None, offset: int = 0) -> List[tuple]:
+    """Return leaderboard standings for a given time period.
     Returns list of (user_id, total_xp) sorted by XP descending.
     time_period: "all_time", "week", "month", "year"
+    limit/offset select a top-K page; limit=None returns everyone.
+
+    Reads the materialized per-user rows kept by `leaderboard`; users without
+    a row yet are scored once and backfilled.
     """
-    users = get_existing_users()
-    leaderboard = []
-    
-    now = datetime.date.today()
-    if time_period == "week":
-        start_date = now - datetime.timedelta(days=now.weekday())
-    elif time_period == "month":
-        start_date = now.replace(day=1)
-    elif time_period == "year":
-        start_date = now.replace(month=1, day=1)
-    else:  # all_time
-        start_date = None
-    
-    for user_id in users:
-        storage = get_storage()
-        user_data = storage.load_data(user_id)
-        prefs = user_data.get("preferences", {})
-        if prefs.get("private_mode"):
-            continue
-        global_xp, _, _ = calculate_stats(user_data)
-        
-        # If filtering by time period, recalculate XP for that period only
-        if start_date:
-            habits = user_data.get("habits", {})
-            completions = user_data.get("completions", {})
-            tasks = user_data.get("tasks", [])
-            period_xp = 0
-            
-            # Calculate habit XP for period
-            for date_str in completions.keys():
-                date_obj = datetime.date.fromisoformat(date_str)
-                if date_obj >= start_date:
-                    for habit_name in completions[date_str]:
-                        if habit_name in habits:
-                            period_xp += habits[habit_name].get("xp", 0)
-            
-            # Calculate task XP for period
-            for task in tasks:
-                if task.get("status") == "Done" and task.get("completed_at"):
-                    completed_date = datetime.date.fromisoformat(task["completed_at"][:10])
-                    if completed_date >= start_date:
-                        period_xp += task.get("xp", 0)
-            
-            global_xp = period_xp
-        
-        leaderboard.append((user_id, global_xp))
-    
-    # Sort by XP descending
-    leaderboard.sort(key=lambda x: x[1], reverse=True)
-    return leaderboard
+    return leaderboard.get_leaderboard(time_period, get_storage(), get_existing_users(), limit=limit, offset=offset)
+
+
+def get_leaderboard_page(
+    time_period: str = "all_time",
+    limit: int = 10,
+    offset: int = 0,
+    viewer: Optional[str] = None,
+    force_refresh: bool = False,
+) -> Dict[str, Any]:
+    """Top-K page of standings with level/progress/email precomputed, plus the viewer's rank.
+
+    Served from the per-period stale-while-revalidate cache; standings older
+    than the TTL are refreshed in the background. `force_refresh` recomputes now.
+    """
+    standings = leaderboard.get_cached_standings(time_period, get_storage(), get_existing_users, force=force_refresh)
+    return leaderboard.page_from_standings(standings, limit=limit, offset=offset, viewer=viewer)
 
 
 def _obstacle_hint(obstacle: str) -> str:
@@ -1148,6 +1114,8 @@ def add_new_habit(name: str, xp: int, goal: str, description: str = "", context:
     data = load_data()
     if name and name not in data["habits"]:
         data["habits"][name] = {"xp": xp, "active": True, "goal": goal, "description": description, "context": context, "cadence": cadence}
+        # Only counts towards perfect days from today on
+        data["habits"][name]["active_ranges"] = [[get_date_str(0), None]]
         save_data(data)
         st.success(f"Added habit: {name}")
     elif name in data["habits"]:
@@ -1158,14 +1126,14 @@ def add_new_habit(name: str, xp: int, goal: str, description: str = "", context:
 def archive_habit(name: str):
     data = load_data()
     if name in data["habits"]:
-        data["habits"][name]["active"] = False
+        mark_habit_archived(data["habits"][name])
         save_data(data)
         st.success(f"Archived: {name}")
 
 def restore_habit(name: str):
     data = load_data()
     if name in data["habits"]:
-        data["habits"][name]["active"] = True
+        mark_habit_active(data["habits"][name])
         save_data(data)
         st.success(f"Restored: {name}")
 
@@ -1982,7 +1950,7 @@ def main():
     
         # === OPTION 3: INITIALIZE BACKGROUND SCHEDULER ===
         if 'scheduler_initialized' not in st.session_state:
-            if scheduler_service:
+            if scheduler_service and scheduler_service.in_app_scheduler_enabled():
                 try:
                     scheduler_service.init_scheduler()
                     st.session_state['scheduler_initialized'] = True
@@ -2172,6 +2140,7 @@ def main():
     today_str = get_date_str(0)
     
     global_xp, habit_stats, earned_badges = calculate_stats(data)
+    stats_equivalence.shadow_check(data, (global_xp, habit_stats, earned_badges), get_stats_shadow_sample_rate())
     current_level, xp_in_level, level_progress = calculate_level(global_xp)
     current_rank = get_rank(current_level)
     # Milestone prompt
@@ -2185,8 +2154,17 @@ def main():
         data.setdefault("rewards", {})["last_prompted"] = hit
         save_data(data)
 
-    if current_level >= 10 and "veteran" not in earned_badges:
-        earned_badges.append("veteran")
+    # Badges: persisted with timestamps; only rules whose inputs moved are re-checked
+    badge_state_before = dict(data.get("badge_state", {}))
+    new_badges = evaluate_badges(data, get_badge_metrics(data, habit_stats, global_xp))
+    if new_badges or data.get("badge_state") != badge_state_before:
+        save_data(data)
+    for badge_id in new_badges:
+        st.success(f"🏆 Badge unlocked: {BADGES_DEF[badge_id]['name']}")
+    if new_badges:
+        # Email goes out on the scheduler so a slow SMTP server doesn't block the page
+        queue_badge_events(get_user_id(), new_badges)
+    earned_badges = earned_badge_ids(data)
 
     # --- Celebration Logic ---
     if 'previous_level' not in st.session_state:
@@ -2426,9 +2404,11 @@ def main():
             st.info("No badges yet. Keep training!")
         else:
             cols = st.columns(4)
-            for i, badge_id in enumerate(earned_badges):
+            for i, earned in enumerate(get_earned_badges(data)):
+                badge_id = earned["id"]
                 if badge_id in BADGES_DEF:
                     badge = BADGES_DEF[badge_id]
+                    earned_on = f"Earned {earned['earned_at'][:10]}" if earned.get("earned_at") else ""
                     with cols[i % 4]:
                         st.markdown(
                             f"""
@@ -2436,6 +2416,7 @@ def main():
                                 <div style="font-size: 3em;">{badge['icon']}</div>
                                 <div style="font-weight: bold; margin-top: 5px;">{badge['name']}</div>
                                 <div style="font-size: 0.8em; color: gray;">{badge['desc']}</div>
+                                <div style="font-size: 0.7em; color: gray;">{earned_on}</div>
                             </div>
                             """,
                             unsafe_allow_html=True
@@ -3064,16 +3045,28 @@ def main():
         
         st.divider()
         
-        # Get weekly stats
+        # Get weekly stats (memoized per data revision and week)
         week_offset = st.session_state.get("week_offset", 0)
-        daily_stats, total_weekly_xp, week_start, week_end = get_weekly_stats(data, week_offset)
+        week_start, week_end = get_week_range(week_offset)
+        weekly_report = analytics.get_weekly_report(data, week_offset, week_start, week_end)
+        daily_df = weekly_report["daily"]
+        total_weekly_xp = weekly_report["total_xp"]
         
+        # Career stats as of the end of a past week (snapshot + short replay)
+        if week_offset < 0:
+            as_of = stats_snapshots.get_stats_as_of(data, week_end)
+            best_streak = max(as_of["streaks"].values(), default=0)
+            st.caption(
+                f"As of {week_end.strftime('%b %d, %Y')}: Level {as_of['level']} · "
+                f"{as_of['total_xp']} XP · best streak {best_streak} days"
+            )
+
         # Summary Cards
         summary_col1, summary_col2, summary_col3 = st.columns(3)
         with summary_col1:
             st.metric("📈 Weekly XP", total_weekly_xp)
         with summary_col2:
-            days_active = len([d for d in daily_stats.values() if d["xp"] > 0])
+            days_active = int((daily_df["XP"] > 0).sum())
             st.metric("🔥 Active Days", f"{days_active}/7")
         with summary_col3:
             avg_daily_xp = total_weekly_xp // 7 if total_weekly_xp > 0 else 0
@@ -3086,70 +3079,64 @@ def main():
         
         # Daily XP Chart
         with chart_col1:
-            chart_data = []
-            for date_str in sorted(daily_stats.keys()):
-                day_info = daily_stats[date_str]
-                chart_data.append({
-                    "Day": day_info["day_name"] + " " + date_str.split("-")[2],
-                    "XP": day_info["xp"]
-                })
-            
-            df_daily = pd.DataFrame(chart_data)
-            fig_daily = px.bar(
-                df_daily,
-                x="Day",
-                y="XP",
-                title="Daily XP Earned",
-                color="XP",
-                color_continuous_scale="Viridis"
-            )
-            fig_daily.update_layout(height=400, showlegend=False)
-            st.plotly_chart(fig_daily, use_container_width=True)
+            st.plotly_chart(weekly_report["fig_daily"], use_container_width=True)
         
         # Habits Completion Rate
         with chart_col2:
-            active_habits = [h for h, d in data["habits"].items() if d.get("active", True)]
-            if active_habits:
-                habit_completions = {h: 0 for h in active_habits}
-                for date_str in daily_stats.keys():
-                    completed_habits = []
-                    # Get habits completed on this date
-                    if date_str in data["completions"]:
-                        for h in data["completions"][date_str]:
-                            if h in habit_completions:
-                                habit_completions[h] += 1
-                
-                habit_chart_data = [{"Habit": h, "Completions": habit_completions[h]} for h in active_habits]
-                df_habits = pd.DataFrame(habit_chart_data)
-                fig_habits = px.bar(
-                    df_habits,
-                    x="Habit",
-                    y="Completions",
-                    title="Habit Completion Rate (This Week)",
-                    color="Completions",
-                    color_continuous_scale="RdYlGn"
-                )
-                fig_habits.update_layout(height=400, showlegend=False)
-                st.plotly_chart(fig_habits, use_container_width=True)
+            if weekly_report["fig_habits"] is not None:
+                st.plotly_chart(weekly_report["fig_habits"], use_container_width=True)
         
         st.divider()
         
         # Detailed Daily Breakdown
         st.subheader("📅 Daily Breakdown")
-        breakdown_data = []
-        for date_str in sorted(daily_stats.keys()):
-            day_info = daily_stats[date_str]
-            breakdown_data.append({
-                "Date": date_str,
-                "Day": day_info["day_name"],
-                "XP": day_info["xp"],
-                "Habits Completed": day_info["habits_completed"]
-            })
-        
-        df_breakdown = pd.DataFrame(breakdown_data)
-        st.dataframe(df_breakdown, use_container_width=True, hide_index=True)
+        st.dataframe(daily_df, use_container_width=True, hide_index=True)
+
+        st.divider()
+
+        # Rolling consistency
+        st.subheader("📐 Consistency (last 7 / 30 / 90 days)")
+        consistency_df = analytics.consistency_table(data)
+        if consistency_df.empty:
+            st.info("Add a habit to start tracking consistency.")
+        else:
+            st.dataframe(
+                consistency_df,
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    f"{n}d Rate": st.column_config.ProgressColumn(f"{n}d Rate", format="%d%%", min_value=0, max_value=100)
+                    for n in ROLLING_WINDOWS
+                },
+            )
         
         st.divider()
+
+        # Year Heatmap
+        st.subheader("🗓️ Year Heatmap")
+        heat_col1, heat_col2 = st.columns(2)
+        with heat_col1:
+            heat_habit = st.selectbox("Habit", ["All habits"] + list(data["habits"].keys()), key="heatmap_habit")
+        with heat_col2:
+            heat_metric = st.radio("Show", ["XP", "Completions"], horizontal=True, key="heatmap_metric")
+        grid, first_monday = get_heatmap_grid(
+            data,
+            habit=None if heat_habit == "All habits" else heat_habit,
+            metric="xp" if heat_metric == "XP" else "completions",
+        )
+        week_labels = [(first_monday + datetime.timedelta(weeks=w)).strftime("%b %d") for w in range(len(grid[0]))]
+        fig_heat = px.imshow(
+            grid,
+            x=week_labels,
+            y=["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"],
+            color_continuous_scale="Greens",
+            labels={"x": "Week of", "y": "", "color": heat_metric},
+            aspect="auto",
+        )
+        fig_heat.update_layout(height=260, margin=dict(l=0, r=0, t=10, b=0))
+        st.plotly_chart(fig_heat, use_container_width=True)
+
+        st.divider()
         
         # Data Export
         st.subheader("📥 Export Data")
@@ -3212,7 +3199,8 @@ def main():
                         context = {
                             "profile": profile,
                             "stats": {"level": current_level, "total_xp": global_xp},
-                            "habits": data.get("habits", {})
+                            "habits": data.get("habits", {}),
+                            "consistency": rolling_habit_metrics(data),
                         }
                         response = ai_chat.get_ai_response(prompt, context)
                         st.write(response)
@@ -3263,61 +3251,95 @@ def main():
             st.session_state['lb_period'] = period_select
         
         period = st.session_state.get('lb_period', 'all_time')
-        
-        # Get leaderboard
-        leaderboard = get_leaderboard_stats(period)
-        
-        if not leaderboard:
+        if st.session_state.get('lb_page_period') != period:
+            st.session_state['lb_page_period'] = period
+            st.session_state['lb_page'] = 0
+
+        page_size = st.selectbox("Players per page", [10, 25, 50], key="lb_page_size")
+        page_num = st.session_state.get('lb_page', 0)
+
+        force_refresh = False
+        if st.session_state.get('admin_authenticated', False):
+            force_refresh = st.button("🔄 Refresh standings now (admin)", key="lb_force_refresh")
+
+        # Get one page of the leaderboard (plus the signed-in user's rank)
+        lb_page = get_leaderboard_page(
+            period,
+            limit=page_size,
+            offset=page_num * page_size,
+            viewer=st.session_state.get('authenticated_user'),
+            force_refresh=force_refresh,
+        )
+        entries = lb_page["entries"]
+        total_players = lb_page["total"]
+        computed_ago = int(time.time() - lb_page.get("computed_at", time.time()))
+        st.caption(f"Standings computed {computed_ago} s ago")
+
+        if not total_players:
             st.info("No users or XP data yet.")
         else:
             # Display leaderboard
             st.subheader(f"Top Players ({period.replace('_', ' ').title()})")
+
+            if lb_page.get("stale_users"):
+                st.caption(f"⏳ {len(lb_page['stale_users'])} player(s) are still being scored; standings may be incomplete.")
+
+            viewer_entry = lb_page.get("viewer")
+            if viewer_entry:
+                st.caption(f"Your rank: **#{viewer_entry['rank']}** of {total_players} · {viewer_entry['xp']:,} XP")
+            elif st.session_state.get('authenticated_user'):
+                st.caption("You're not on this leaderboard (private mode).")
             
             # Create leaderboard display
             medals = ["🥇", "🥈", "🥉"]
             
-            for rank, (user_id, xp) in enumerate(leaderboard, 1):
+            for entry in entries:
+                rank = entry["rank"]
                 medal = medals[rank - 1] if rank <= 3 else f"{rank}️⃣"
                 
-                # Get user level
-                user_storage = get_storage()
-                user_data = user_storage.load_data(user_id)
-                _, _, level_progress = calculate_level(xp)
-                user_level, _, _ = calculate_level(xp)
-                
                 # Display rank
                 with st.container():
                     col1, col2, col3, col4 = st.columns([1, 2, 1, 1])
                     with col1:
                         st.markdown(f"# {medal}")
                     with col2:
-                        st.write(f"**{user_id}**")
+                        st.write(f"**{entry['user_id']}**")
                     with col3:
-                        st.metric("Level", user_level)
+                        st.metric("Level", entry["level"])
                     with col4:
-                        st.metric("XP", f"{xp:,}")
+                        st.metric("XP", f"{entry['xp']:,}")
                     
                     # Progress bar
-                    st.progress(level_progress)
+                    st.progress(entry["level_progress"])
+
+            # Pagination
+            last_page = max((total_players - 1) // page_size, 0)
+            nav_prev, nav_label, nav_next = st.columns([1, 2, 1])
+            with nav_prev:
+                if st.button("⬅️ Previous", key="lb_prev", disabled=page_num <= 0):
+                    st.session_state['lb_page'] = page_num - 1
+                    st.rerun()
+            with nav_label:
+                st.caption(f"Page {page_num + 1} of {last_page + 1}")
+            with nav_next:
+                if st.button("Next ➡️", key="lb_next", disabled=page_num >= last_page):
+                    st.session_state['lb_page'] = page_num + 1
+                    st.rerun()
             
             # Detailed table
             st.divider()
             st.subheader("Detailed Standings")
             
-            table_data = []
-            for rank, (user_id, xp) in enumerate(leaderboard, 1):
-                user_storage = get_storage()
-                user_data = user_storage.load_data(user_id)
-                user_level, _, _ = calculate_level(xp)
-                user_email = user_storage.get_user_email(user_id)
-                
-                table_data.append({
-                    "Rank": rank,
-                    "Player": user_id,
-                    "Email": user_email or "-",
-                    "Level": user_level,
-                    "Total XP": f"{xp:,}"
-                })
+            table_data = [
+                {
+                    "Rank": entry["rank"],
+                    "Player": entry["user_id"],
+                    "Email": entry["email"] or "-",
+                    "Level": entry["level"],
+                    "Total XP": f"{entry['xp']:,}"
+                }
+                for entry in entries
+            ]
             
             df_leaderboard = pd.DataFrame(table_data)
             st.dataframe(df_leaderboard, use_container_width=True, hide_index=True)
@@ -3328,13 +3350,11 @@ def main():
             
             col1, col2, col3 = st.columns(3)
             with col1:
-                st.metric("Total Players", len(leaderboard))
+                st.metric("Total Players", total_players)
             with col2:
-                top_xp = leaderboard[0][1] if leaderboard else 0
-                st.metric("Top Player XP", f"{top_xp:,}")
+                st.metric("Top Player XP", f"{lb_page['top_xp']:,}")
             with col3:
-                avg_xp = sum([xp for _, xp in leaderboard]) // len(leaderboard) if leaderboard else 0
-                st.metric("Average XP", f"{avg_xp:,}")
+                st.metric("Average XP", f"{lb_page['average_xp']:,}")
 
     # === TAB 9: ABOUT & FAQ ===
     with tab_about:
@@ -3488,6 +3508,7 @@ Taglines to remember:
                                     files_to_delete = glob.glob(f"xp_data_{user}.json")
                                     if user == "default":
                                         files_to_delete += glob.glob("xp_data.json")
+                                    leaderboard.remove_leaderboard_entry(user, storage)
                                     for file in files_to_delete:
                                         try:
                                             os.remove(file)
@@ -3586,6 +3607,34 @@ Taglines to remember:
                         else:
                             st.error("Failed to send personalized coaching")
 
+        # === USER ANALYTICS ===
+        st.divider()
+        st.subheader("📈 User Analytics")
+        refresh_analytics = st.button("🔄 Recompute analytics now", key="admin_analytics_refresh")
+        try:
+            report = admin_analytics.get_admin_analytics(get_storage(), refresh=refresh_analytics)
+            st.caption(f"Computed {report['computed_at']} · refreshed hourly by the scheduler")
+            retention = report["retention"]
+            m1, m2, m3, m4, m5 = st.columns(5)
+            m1.metric("Users", report["total_users"])
+            m2.metric("DAU", report["dau"][-1]["users"])
+            m3.metric("WAU", report["wau"][-1]["users"])
+            m4.metric("D7 retention", f"{retention['d7']:.0%}" if retention["d7"] is not None else "—")
+            m5.metric("D30 retention", f"{retention['d30']:.0%}" if retention["d30"] is not None else "—")
+
+            chart_col1, chart_col2 = st.columns(2)
+            with chart_col1:
+                st.caption("Daily active users (30 days)")
+                st.bar_chart(pd.DataFrame(report["dau"]).set_index("date")["users"])
+            with chart_col2:
+                st.caption("Drip campaign funnel")
+                st.bar_chart(pd.DataFrame(report["drip_funnel"]).set_index("stage")["users"])
+
+            st.caption("Signup cohorts (week of first activity) and D1/D7/D30 retention")
+            st.dataframe(pd.DataFrame(report["cohorts"]), use_container_width=True, hide_index=True)
+        except Exception as e:
+            st.error(f"Failed to compute user analytics: {e}")
+
         # === SCHEDULER STATUS UI ===
         st.divider()
         st.subheader("⏰ Background Scheduler Status")
@@ -3595,6 +3644,11 @@ Taglines to remember:
                 status = scheduler_service.get_scheduler_status()
                 scheduler_running = "🟢 Running" in status.get("status", "")
                 st.write(f"**Scheduler Status:** {status.get('status', 'Unknown')}")
+                leader = status.get("leader")
+                if leader:
+                    lease = leader.get("lease") or {}
+                    role = "this process" if leader.get("is_leader") else f"this process ({leader.get('owner') or 'not contending'}) is passive"
+                    st.caption(f"Leader: {lease.get('owner', 'none')} — {role}")
                 
                 jobs = status.get("jobs", [])
                 if jobs:
@@ -3605,6 +3659,43 @@ Taglines to remember:
                         st.write(f"  • **{job_id}** — Next run: {next_run}")
                 else:
                     st.info("No jobs scheduled")
+
+                # Sweeps running in this process (a separate worker's show up in the run history when done)
+                for sweep in status.get("sweeps", []):
+                    done = sweep["processed"] + sweep["failed"]
+                    label = f"{sweep['job']}: {done}" + (f"/{sweep['total']}" if sweep["total"] else "") + f" users, {sweep['failed']} failed"
+                    if sweep["cancelled"]:
+                        label += " (cancelling)"
+                    st.progress(min(done / sweep["total"], 1.0) if sweep["total"] else 0.0, text=label)
+                    if not sweep["cancelled"] and st.button(f"⏹️ Cancel {sweep['job']}", key=f"cancel_sweep_{sweep['job']}"):
+                        from job_context import cancel_runs
+                        cancel_runs(sweep["job"])
+                        st.rerun()
+
+                # Run history (shared job store, so it includes runs from a separate worker)
+                history = scheduler_service.get_job_history(limit=200)
+                if history:
+                    runs_df = pd.DataFrame(history)
+                    st.write("**Recent Runs:**")
+                    st.dataframe(
+                        runs_df[[
+                            "job_id", "started_at", "duration_seconds", "status", "users_scanned", "users_skipped",
+                            "users_notified", "storage_reads", "emails_sent", "email_failures", "gemini_calls", "errors",
+                        ]].head(25),
+                        use_container_width=True,
+                        hide_index=True,
+                    )
+                    runs_df["started_at"] = pd.to_datetime(runs_df["started_at"])
+                    st.caption("Throughput trend: users scanned per second, per job (a falling line means a sweep is scaling badly)")
+                    throughput = runs_df.dropna(subset=["users_per_second"]).pivot_table(
+                        index="started_at", columns="job_id", values="users_per_second"
+                    )
+                    if not throughput.empty:
+                        st.line_chart(throughput)
+                    st.caption("Run duration (seconds), per job")
+                    st.line_chart(runs_df.pivot_table(index="started_at", columns="job_id", values="duration_seconds"))
+                else:
+                    st.caption("No job runs recorded yet.")
                 
                 # Manual job trigger buttons (for testing)
                 st.write("**Manual Job Triggers (for testing):**")
@@ -0,0 +1,384 @@
+"""
+XP Timeline
+Per-user daily XP series backed by cumulative prefix sums.
+"""
+
+import datetime
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+XP_PER_LEVEL = 200
+PERFECT_DAY_BONUS = 50
+
+# Series tracked per day. "completions" counts habit check-ins, not XP.
+XP_SERIES = ("habit", "task", "bonus")
+ALL_SERIES = XP_SERIES + ("completions",)
+
+# Rolling consistency windows, in days (ending today).
+ROLLING_WINDOWS = (7, 30, 90)
+
+_TIMELINE_CACHE_SIZE = 64
+_timeline_cache: "OrderedDict[tuple, XPTimeline]" = OrderedDict()
+_timeline_cache_lock = threading.Lock()
+
+
+def _prefix(values: List[int]) -> List[int]:
+    """Return cumulative sums with a leading zero (len = len(values) + 1)."""
+    out = [0] * (len(values) + 1)
+    running = 0
+    for i, v in enumerate(values):
+        running += v
+        out[i + 1] = running
+    return out
+
+
+def streak_xp(base_xp: int, streak: int) -> int:
+    """XP earned for one completion on day `streak` of a streak (10% per extra day)."""
+    bonus_multiplier = 0.1 * (streak - 1)
+    if bonus_multiplier < 0:
+        bonus_multiplier = 0
+    return int(base_xp * (1 + bonus_multiplier))
+
+
+def parse_date(value: Any) -> Optional[datetime.date]:
+    try:
+        return datetime.date.fromisoformat(str(value)[:10])
+    except (TypeError, ValueError):
+        return None
+
+
+def mark_habit_active(details: Dict[str, Any], on: Optional[datetime.date] = None) -> None:
+    """Flag a habit active and open a new active range starting `on`.
+
+    Habits carry `active_ranges`, a list of half-open [since, until) ISO
+    date pairs (None = unbounded). Legacy habits without ranges are treated
+    as active (or archived) for their whole history, per their `active` flag.
+    """
+    on = on or datetime.date.today()
+    ranges = details.get("active_ranges")
+    if ranges is None:
+        ranges = [[None, None]] if details.get("active", True) else []
+    if not any(until is None for _, until in ranges):
+        ranges.append([on.isoformat(), None])
+    details["active_ranges"] = ranges
+    details["active"] = True
+
+
+def mark_habit_archived(details: Dict[str, Any], on: Optional[datetime.date] = None) -> None:
+    """Flag a habit archived and close its open active range at `on` (exclusive)."""
+    on = on or datetime.date.today()
+    ranges = details.get("active_ranges")
+    if ranges is None:
+        # Legacy habit: it was active for all history we know about
+        ranges = [[None, None]] if details.get("active", True) else []
+    for r in ranges:
+        if r[1] is None:
+            r[1] = on.isoformat()
+    details["active_ranges"] = [r for r in ranges if not (r[0] and r[1] and r[0] >= r[1])]
+    details["active"] = False
+
+
+def habit_bit_positions(habits: Dict[str, Any]) -> Dict[str, int]:
+    """Map each habit to its own bit (habit i -> 1 << i)."""
+    return {habit: 1 << i for i, habit in enumerate(habits)}
+
+
+def active_habit_masks(habits: Dict[str, Any], bits: Dict[str, int], start: datetime.date, days: int) -> List[int]:
+    """Per-day bitmask of habits that were active, for `days` days from `start`.
+
+    Range boundaries are applied as XOR toggles, so the cost is one pass
+    over the days plus one entry per range rather than per habit-day.
+    """
+    # Check-ins dated after `today` give a negative span: no days to replay
+    days = max(days, 0)
+    toggles = [0] * (days + 1)
+
+    def _clamp(d: Optional[datetime.date], default: int) -> int:
+        if d is None:
+            return default
+        return min(max((d - start).days, 0), days)
+
+    for habit, details in habits.items():
+        bit = bits[habit]
+        ranges = details.get("active_ranges")
+        if ranges is None:
+            if details.get("active", True):
+                toggles[0] ^= bit
+            continue
+        spans = []
+        for since, until in ranges:
+            lo = _clamp(parse_date(since) if since else None, 0)
+            hi = _clamp(parse_date(until) if until else None, days)
+            if lo < hi:
+                spans.append([lo, hi])
+        # Merge overlapping spans so each toggle pair is balanced
+        spans.sort()
+        merged: List[List[int]] = []
+        for lo, hi in spans:
+            if merged and lo <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], hi)
+            else:
+                merged.append([lo, hi])
+        for lo, hi in merged:
+            toggles[lo] ^= bit
+            toggles[hi] ^= bit
+
+    masks = [0] * days
+    mask = 0
+    for i in range(days):
+        mask ^= toggles[i]
+        masks[i] = mask
+    return masks
+
+
+def completion_masks(completions: Dict[str, List[str]], bits: Dict[str, int], start: datetime.date, days: int) -> List[int]:
+    """Per-day bitmask of completed habits (unknown habit names are ignored)."""
+    masks = [0] * days
+    for date_str, done in completions.items():
+        d = parse_date(date_str)
+        # Only canonical ISO keys ever match a replayed day
+        if d is None or d.isoformat() != date_str:
+            continue
+        idx = (d - start).days
+        if 0 <= idx < days:
+            mask = 0
+            for habit in done:
+                mask |= bits.get(habit, 0)
+            masks[idx] = mask
+    return masks
+
+
+def perfect_day_flags(habits: Dict[str, Any], completions: Dict[str, List[str]], start: datetime.date, days: int) -> List[bool]:
+    """For each day from `start`, whether every habit active that day was completed."""
+    bits = habit_bit_positions(habits)
+    active = active_habit_masks(habits, bits, start, days)
+    done = completion_masks(completions, bits, start, days)
+    return [a != 0 and done[i] & a == a for i, a in enumerate(active)]
+
+
+class XPTimeline:
+    """Daily XP for one user, stored as prefix sums anchored at `start`.
+
+    Day i covers `start + i days`. Lookups outside the covered range are
+    clamped, so querying a period before the first activity returns 0.
+    """
+
+    def __init__(
+        self,
+        start: datetime.date,
+        daily: Dict[str, List[int]],
+        undated_task_xp: int = 0,
+        habit_daily: Optional[Dict[str, Dict[str, List[int]]]] = None,
+    ):
+        self.start = start
+        self.days = len(daily.get("habit", []))
+        self.undated_task_xp = undated_task_xp
+        self._daily = {name: daily.get(name, [0] * self.days) for name in ALL_SERIES}
+        self._prefix = {name: _prefix(values) for name, values in self._daily.items()}
+        # Combined daily XP for heatmaps (a habit's own XP is its "habit" series)
+        self._daily["xp"] = [sum(day) for day in zip(*(self._daily[name] for name in XP_SERIES))]
+        # Per-habit daily "habit" XP and "completions", for heatmaps
+        self._habit_daily = habit_daily or {}
+
+    @property
+    def end(self) -> datetime.date:
+        return self.start + datetime.timedelta(days=max(self.days - 1, 0))
+
+    def _index(self, d: datetime.date) -> int:
+        """Clamp a date to a prefix index in [0, days]."""
+        idx = (d - self.start).days
+        if idx < 0:
+            return 0
+        if idx > self.days:
+            return self.days
+        return idx
+
+    def series_total(self, name: str, start: Optional[datetime.date] = None, end: Optional[datetime.date] = None) -> int:
+        """Sum of one series over the inclusive range [start, end]."""
+        prefix = self._prefix[name]
+        lo = 0 if start is None else self._index(start)
+        hi = self.days if end is None else self._index(end + datetime.timedelta(days=1))
+        if hi <= lo:
+            return 0
+        return prefix[hi] - prefix[lo]
+
+    def period_total(self, start: Optional[datetime.date] = None, end: Optional[datetime.date] = None) -> int:
+        """Total XP (habits + tasks + perfect-day bonus) over [start, end]."""
+        return sum(self.series_total(name, start, end) for name in XP_SERIES)
+
+    @property
+    def total_xp(self) -> int:
+        """All-time XP, including Done tasks without a completion date."""
+        return self.period_total() + self.undated_task_xp
+
+    def daily_window(self, name: str, start: datetime.date, end: datetime.date, habit: Optional[str] = None) -> List[int]:
+        """Daily values of one series (or "xp", all XP combined) for every day in [start, end], zero-padded.
+
+        With `habit`, returns that habit's own "habit" XP or "completions".
+        Serves calendar heatmaps with a single list slice.
+        """
+        n = (end - start).days + 1
+        if n <= 0:
+            return []
+        if habit is None:
+            values = self._daily[name]
+        else:
+            values = self._habit_daily.get(habit, {}).get("habit" if name == "xp" else name, [])
+        offset = (start - self.start).days
+        lo = max(offset, 0)
+        hi = min(offset + n, len(values))
+        if hi <= lo:
+            return [0] * n
+        return [0] * (lo - offset) + values[lo:hi] + [0] * (offset + n - hi)
+
+    def day_values(self, d: datetime.date) -> Dict[str, int]:
+        """Per-series values for a single day."""
+        return {name: self.series_total(name, d, d) for name in ALL_SERIES}
+
+
+def build_xp_timeline(data: Dict[str, Any], today: Optional[datetime.date] = None) -> XPTimeline:
+    """Build a user's XP timeline in a single pass over their history.
+
+    Habit XP follows `calculate_stats`: history is replayed from the first
+    completion date through today, streaks reset on any missed day and
+    the perfect-day bonus applies when every habit active that day is done.
+    """
+    today = today or datetime.date.today()
+    habits = data.get("habits", {}) or {}
+    completions = data.get("completions", {}) or {}
+    tasks = data.get("tasks", []) or []
+
+    day_keys = []
+    for date_str in sorted(completions.keys()):
+        d = parse_date(date_str)
+        # Only canonical ISO keys ever match a replayed day
+        if d is not None and d.isoformat() == date_str and d <= today:
+            day_keys.append((d, date_str))
+
+    dated_tasks = []
+    undated_task_xp = 0
+    for task in tasks:
+        if task.get("status") != "Done":
+            continue
+        xp = task.get("xp", 0)
+        completed_on = parse_date(task.get("completed_at")) if task.get("completed_at") else None
+        if completed_on is None:
+            undated_task_xp += xp
+        else:
+            dated_tasks.append((completed_on, xp))
+
+    anchors = [d for d, _ in day_keys[:1]] + [d for d, _ in dated_tasks]
+    start = min(anchors) if anchors else today
+    end = max([today] + [d for d, _ in dated_tasks])
+    n = (end - start).days + 1
+    daily = {name: [0] * n for name in ALL_SERIES}
+
+    # Habit XP: walk each day's check-ins; consecutive days extend the streak.
+    last_done: Dict[str, int] = {}
+    streaks: Dict[str, int] = {}
+    habit_daily: Dict[str, Dict[str, List[int]]] = {}
+    perfect = perfect_day_flags(habits, completions, start, n)
+    for d, date_str in day_keys:
+        idx = (d - start).days
+        done_today = completions.get(date_str, [])
+        for habit in set(done_today):
+            details = habits.get(habit)
+            if details is None:
+                continue
+            streak = streaks.get(habit, 0) + 1 if last_done.get(habit) == idx - 1 else 1
+            streaks[habit] = streak
+            last_done[habit] = idx
+            earned = streak_xp(details.get("xp", 0), streak)
+            daily["habit"][idx] += earned
+            daily["completions"][idx] += 1
+            per_habit = habit_daily.get(habit)
+            if per_habit is None:
+                per_habit = habit_daily[habit] = {"habit": [0] * n, "completions": [0] * n}
+            per_habit["habit"][idx] += earned
+            per_habit["completions"][idx] += 1
+        if perfect[idx]:
+            daily["bonus"][idx] += PERFECT_DAY_BONUS
+
+    for d, xp in dated_tasks:
+        daily["task"][(d - start).days] += xp
+
+    return XPTimeline(start, daily, undated_task_xp, habit_daily)
+
+
+def data_revision(data: Dict[str, Any]) -> str:
+    """Cheap content fingerprint of the fields that affect XP."""
+    payload = json.dumps(
+        [data.get("habits", {}), data.get("completions", {}), data.get("tasks", [])],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def get_xp_timeline(data: Dict[str, Any], today: Optional[datetime.date] = None) -> XPTimeline:
+    """Return a cached timeline for `data`, rebuilding only when its content changed."""
+    today = today or datetime.date.today()
+    key = (data_revision(data), today.isoformat())
+    with _timeline_cache_lock:
+        timeline = _timeline_cache.get(key)
+        if timeline is not None:
+            _timeline_cache.move_to_end(key)
+            return timeline
+    timeline = build_xp_timeline(data, today)
+    with _timeline_cache_lock:
+        _timeline_cache[key] = timeline
+        if len(_timeline_cache) > _TIMELINE_CACHE_SIZE:
+            _timeline_cache.popitem(last=False)
+    return timeline
+
+
+def rolling_habit_metrics(
+    data: Dict[str, Any],
+    today: Optional[datetime.date] = None,
+    windows: tuple = ROLLING_WINDOWS,
+) -> Dict[str, Dict[int, Dict[str, Any]]]:
+    """Completion rate and XP per habit over the last N days, for each N in `windows`.
+
+    One pass over the longest window per habit builds prefix sums of
+    completions, XP and active days; every window is then a difference of
+    two prefix entries. The rate's denominator only counts days the habit
+    was active (see `active_ranges`) since the user's first activity, so a
+    habit added last week isn't penalised for the weeks before it existed.
+
+    Returns {habit: {N: {"completion_rate", "completions", "xp", "active_days"}}}.
+    """
+    today = today or datetime.date.today()
+    habits = data.get("habits", {}) or {}
+    if not habits:
+        return {}
+    longest = max(windows)
+    start = today - datetime.timedelta(days=longest - 1)
+    timeline = get_xp_timeline(data, today)
+    bits = habit_bit_positions(habits)
+    active = active_habit_masks(habits, bits, start, longest)
+    # Nothing was tracked before the user's first activity
+    for i in range(min(max((timeline.start - start).days, 0), longest)):
+        active[i] = 0
+
+    metrics: Dict[str, Dict[int, Dict[str, Any]]] = {}
+    for habit in habits:
+        bit = bits[habit]
+        done = _prefix(timeline.daily_window("completions", start, today, habit=habit))
+        xp = _prefix(timeline.daily_window("habit", start, today, habit=habit))
+        active_days = _prefix([1 if mask & bit else 0 for mask in active])
+        per_window = {}
+        for n in windows:
+            lo = longest - n
+            completions = done[longest] - done[lo]
+            days = active_days[longest] - active_days[lo]
+            per_window[n] = {
+                "completion_rate": round(min(completions / days, 1.0), 2) if days else 0.0,
+                "completions": completions,
+                "xp": xp[longest] - xp[lo],
+                "active_days": days,
+            }
+        metrics[habit] = per_window
+    return metrics